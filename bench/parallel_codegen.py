@@ -0,0 +1,61 @@
+"""Parallel C++ code generation benchmark (compiler.py --jobs).
+
+Generates a synthetic program (the "large" preset is about 110k lines),
+runs the front end once, then times CodeGenerator.generate serially and
+with each requested number of worker processes. Every parallel result must
+be byte-identical to the serial one.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from synth import PRESETS, generate
+from compiler import process_includes
+from lors.src.lexer import Lexer
+from lors.src.parser import Parser
+from lors.src.codegen import CodeGenerator
+
+def best_time(ast, jobs: int, repeat: int):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = CodeGenerator(jobs=jobs).generate(ast)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Lors parallel code generation benchmark")
+    arg_parser.add_argument("--size", choices=sorted(PRESETS), default="large")
+    arg_parser.add_argument("--jobs", default=f"2,{os.cpu_count() or 1}", help="comma-separated worker counts")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="lors_codegen_") as workdir:
+        source = generate(workdir, "synth", **PRESETS[args.size])
+        with open(source) as f:
+            code = process_includes(f.read(), workdir)
+    ast = Parser(Lexer(code).tokenize()).parse()
+    print(f"{args.size}: {code.count(chr(10)) + 1} lines, {len(ast.declarations)} declarations, "
+          f"{os.cpu_count()} cores")
+
+    serial, expected = best_time(ast, 1, args.repeat)
+    print(f"jobs=1   {serial * 1000:8.1f} ms")
+    failed = False
+    for jobs in sorted({int(j) for j in args.jobs.split(",") if int(j) > 1}):
+        elapsed, out = best_time(ast, jobs, args.repeat)
+        same = out == expected
+        failed |= not same
+        print(f"jobs={jobs:<3} {elapsed * 1000:8.1f} ms  x{serial / elapsed:.2f}  "
+              f"{'identical' if same else 'OUTPUT DIFFERS'}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Aggregate `perf script` samples by Lors source line and algorithm.
+
+Build the program with `compiler.py -g` (so its debug info points at the .lr
+and incorporated files through #line directives), profile it, then:
+
+  perf record -g ./prog args...
+  perf script | python3 bench/perf_lines.py ./prog
+
+Each sample is charged to its innermost frame that lies in Lors source;
+samples in the C++ prelude or the standard library thus count against the
+Lors line that called into them. Frames are resolved from their symbol and
+offset (which do not depend on where a PIE binary was loaded) with nm and
+addr2line.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from collections import Counter
+
+# "  55d0c0a01234 algo_3+0x44 (/path/prog)": one frame of a -g call chain
+FRAME = re.compile(r"^\s+([0-9a-fA-F]+)\s+(.+?)\s+\(([^()]*)\)\s*$")
+# "prog 1234 100.5:  250000 cycles:u:  55d0c0a01234 algo_3+0x44 (/path/prog)":
+# a sample recorded without call chains carries its frame after the event
+HEADER = re.compile(r":\s+\d+\s+\S+:\s+([0-9a-fA-F]+)\s+(.+?)\s+\(([^()]*)\)\s*$")
+SYMBOL = re.compile(r"^(.*)\+0x([0-9a-fA-F]+)$")
+LORS_SUFFIXES = (".lr", ".inc")
+
+def parse_samples(lines):
+    """Yield each sample as its list of (symbol, dso) frames, innermost first."""
+    frames = []
+    for line in lines:
+        if not line.strip():
+            if frames:
+                yield frames
+            frames = []
+            continue
+        if not line[0].isspace():
+            # A new sample header; perf separates -g samples by blank lines,
+            # but samples without call chains are one line each
+            if frames:
+                yield frames
+            frames = []
+            match = HEADER.search(line)
+        else:
+            match = FRAME.match(line)
+        if match:
+            frames.append((match.group(2), match.group(3)))
+    if frames:
+        yield frames
+
+def symbol_addresses(binary: str) -> dict:
+    """Demangled symbol name (with and without its parameter list) -> address."""
+    out = subprocess.run(["nm", "-C", "--defined-only", binary], capture_output=True, text=True, check=True).stdout
+    addresses = {}
+    for line in out.splitlines():
+        parts = line.split(" ", 2)
+        if len(parts) == 3 and parts[1] in "tTwW":
+            address = int(parts[0], 16)
+            addresses.setdefault(parts[2], address)
+            addresses.setdefault(parts[2].split("(")[0], address)
+    return addresses
+
+def resolve(binary: str, addresses: list) -> dict:
+    """address -> (file, line) via one addr2line run."""
+    if not addresses:
+        return {}
+    out = subprocess.run(["addr2line", "-e", binary] + [hex(a) for a in addresses],
+                         capture_output=True, text=True, check=True).stdout.splitlines()
+    locations = {}
+    for address, location in zip(addresses, out):
+        path, _, line = location.rpartition(":")
+        line = line.split(" ")[0]
+        locations[address] = (path, int(line)) if line.isdigit() else None
+    return locations
+
+def algorithm_name(symbol: str) -> str:
+    return symbol.split("(")[0]
+
+def aggregate(samples, binary: str):
+    symbols = symbol_addresses(binary)
+    name = os.path.basename(binary)
+
+    def frame_address(symbol, dso):
+        if os.path.basename(dso) != name:
+            return None
+        match = SYMBOL.match(symbol)
+        if not match:
+            return None
+        base = symbols.get(match.group(1), symbols.get(algorithm_name(match.group(1))))
+        return None if base is None else base + int(match.group(2), 16)
+
+    resolved_samples = []
+    pending = set()
+    for frames in samples:
+        resolved = [(algorithm_name(SYMBOL.sub(r"\1", s)), frame_address(s, d)) for s, d in frames]
+        pending.update(a for _, a in resolved if a is not None)
+        resolved_samples.append(resolved)
+    # addr2line reports the line after a call's return address; step back
+    # one byte so caller frames land on the call itself
+    locations = resolve(binary, sorted(pending | {a - 1 for a in pending}))
+
+    by_line = Counter()
+    algo_self = Counter()
+    algo_inclusive = Counter()
+    unattributed = 0
+    for resolved in resolved_samples:
+        in_lors = []
+        for depth, (algo, address) in enumerate(resolved):
+            if address is None:
+                continue
+            location = locations.get(address if depth == 0 else address - 1)
+            if location and location[0].endswith(LORS_SUFFIXES):
+                in_lors.append((location, algo))
+        if not in_lors:
+            unattributed += 1
+            continue
+        by_line[in_lors[0]] += 1
+        algo_self[in_lors[0][1]] += 1
+        # Recursive frames count once per sample
+        for algo in {algo for _, algo in in_lors}:
+            algo_inclusive[algo] += 1
+    return by_line, algo_self, algo_inclusive, unattributed, len(resolved_samples)
+
+def source_text(path: str, line: int, cache: dict) -> str:
+    if path not in cache:
+        try:
+            with open(path) as f:
+                cache[path] = f.read().split("\n")
+        except OSError:
+            cache[path] = []
+    lines = cache[path]
+    return lines[line - 1].strip() if 0 < line <= len(lines) else ""
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Aggregate perf script samples by Lors source line")
+    arg_parser.add_argument("binary", help="program built with compiler.py -g")
+    arg_parser.add_argument("script", nargs="?", default="-", help="perf script output (default: stdin)")
+    arg_parser.add_argument("--top", type=int, default=20)
+    arg_parser.add_argument("--json", action="store_true", help="print the full aggregation as JSON")
+    args = arg_parser.parse_args()
+
+    stream = sys.stdin if args.script == "-" else open(args.script)
+    by_line, algo_self, algo_inclusive, unattributed, total = aggregate(parse_samples(stream), args.binary)
+    if stream is not sys.stdin:
+        stream.close()
+
+    if args.json:
+        json.dump({"samples": total, "unattributed": unattributed,
+                   "lines": [{"file": loc[0], "line": loc[1], "algorithm": algo, "samples": n}
+                             for (loc, algo), n in by_line.most_common()],
+                   "algorithms": [{"name": algo, "self": algo_self[algo], "inclusive": n}
+                                  for algo, n in algo_inclusive.most_common()]}, sys.stdout, indent=2)
+        print()
+        return
+
+    if not total:
+        print("No samples found.")
+        return
+    cache = {}
+    print(f"{total} samples, {unattributed} outside Lors source")
+    print(f"\n{'samples':>8} {'%':>6}  {'location':<32} {'algorithm':<24} source")
+    for ((path, line), algo), n in by_line.most_common(args.top):
+        location = f"{os.path.basename(path)}:{line}"
+        print(f"{n:>8} {100 * n / total:>5.1f}%  {location:<32} {algo:<24} {source_text(path, line, cache)}")
+
+    print(f"\n{'algorithm':<32} {'self %':>8} {'inclusive %':>12}")
+    for algo, n in algo_inclusive.most_common(args.top):
+        print(f"{algo:<32} {100 * algo_self[algo] / total:>7.1f}% {100 * n / total:>11.1f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Runtime benchmark: how fast are the programs each backend produces?
+
+Builds every kernel in bench/kernels with every available backend and
+optimisation profile, runs each binary several times and reports the median
+and standard deviation of the run time plus the binary size.
+
+Backends:
+  cpp       compiler.py (C++ through g++), at each --profiles level
+  llvm      compiler.py --backend llvm (LLVM IR through clang or llc), at
+            each --profiles level
+  twin      ./twin (C++ through g++, fixed flags)
+  lors_lw   ./lors_lw (LLVM IR) through clang, or llc + cc when clang is
+            missing, at each --profiles level
+
+Outputs of all backends are compared with the first successful build so a
+backend that is fast but wrong is visible.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+def build_cpp(source, workdir, level, bin_dir, backend="cpp"):
+    cmd = [sys.executable, os.path.join(REPO_DIR, "compiler.py"), "--backend", backend, f"-O{level}", source]
+    if subprocess.run(cmd, cwd=workdir, capture_output=True).returncode != 0:
+        return None
+    return os.path.splitext(source)[0]
+
+def build_llvm(source, workdir, level, bin_dir):
+    return build_cpp(source, workdir, level, bin_dir, backend="llvm")
+
+def build_twin(source, workdir, level, bin_dir):
+    twin = os.path.join(bin_dir, "twin")
+    if subprocess.run([twin, os.path.basename(source)], cwd=workdir, capture_output=True).returncode != 0:
+        return None
+    exe = os.path.splitext(source)[0]
+    return exe if os.path.exists(exe) else None
+
+def build_lors_lw(source, workdir, level, bin_dir):
+    lors_lw = os.path.join(bin_dir, "lors_lw")
+    if subprocess.run([lors_lw, os.path.basename(source)], cwd=workdir, capture_output=True).returncode != 0:
+        return None
+    base = os.path.splitext(source)[0]
+    if shutil.which("clang"):
+        steps = [["clang", f"-O{level}", base + ".ll", "-o", base, "-lm"]]
+    else:
+        steps = [["llc", f"-O{level}", "-filetype=obj", base + ".ll", "-o", base + ".o"],
+                 ["cc", "-no-pie", base + ".o", "-o", base, "-lm"]]
+    for step in steps:
+        if subprocess.run(step, cwd=workdir, capture_output=True).returncode != 0:
+            return None
+    return base
+
+def available_backends(profiles, bin_dir):
+    """(label, builder, level) for every backend that can run here."""
+    backends = [(f"cpp -O{level}", build_cpp, level) for level in profiles]
+    if shutil.which("clang") or shutil.which("llc"):
+        backends += [(f"llvm -O{level}", build_llvm, level) for level in profiles]
+    if os.access(os.path.join(bin_dir, "twin"), os.X_OK):
+        backends.append(("twin", build_twin, "0"))
+    if os.access(os.path.join(bin_dir, "lors_lw"), os.X_OK) and (shutil.which("clang") or shutil.which("llc")):
+        backends += [(f"lors_lw -O{level}", build_lors_lw, level) for level in profiles]
+    return backends
+
+def time_runs(exe, workdir, repeat):
+    times = []
+    output = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([exe], cwd=workdir, capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            return None, None
+        output = proc.stdout
+    return times, output
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Lors runtime benchmark across backends")
+    arg_parser.add_argument("--kernels", default=os.path.join(BENCH_DIR, "kernels", "*.lr"))
+    arg_parser.add_argument("--profiles", default="0,2", help="optimisation levels, e.g. 0,2")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    arg_parser.add_argument("--bin-dir", default=REPO_DIR, help="where twin and lors_lw live")
+    arg_parser.add_argument("--output", default="bench_runtime.json")
+    args = arg_parser.parse_args()
+
+    bin_dir = os.path.abspath(args.bin_dir)
+    backends = available_backends(args.profiles.split(","), bin_dir)
+    kernels = sorted(glob.glob(args.kernels))
+    results = {}
+
+    print(f"{'kernel':<16} {'backend':<14} {'median s':>10} {'stddev s':>10} {'size KB':>9}  status")
+    for kernel in kernels:
+        name = os.path.splitext(os.path.basename(kernel))[0]
+        results[name] = {}
+        reference = None
+        for label, builder, level in backends:
+            with tempfile.TemporaryDirectory(prefix=f"lors_rt_{name}_") as workdir:
+                source = os.path.join(workdir, os.path.basename(kernel))
+                shutil.copy(kernel, source)
+                exe = builder(source, workdir, level, bin_dir)
+                if exe is None:
+                    entry = {"status": "build failed"}
+                else:
+                    times, output = time_runs(exe, workdir, args.repeat)
+                    if times is None:
+                        entry = {"status": "run failed"}
+                    else:
+                        if reference is None:
+                            reference = output
+                        entry = {
+                            "status": "ok" if output == reference else "output differs",
+                            "median_s": statistics.median(times),
+                            "stddev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+                            "binary_bytes": os.path.getsize(exe),
+                        }
+            results[name][label] = entry
+            if "median_s" in entry:
+                print(f"{name:<16} {label:<14} {entry['median_s']:>10.4f} {entry['stddev_s']:>10.4f} "
+                      f"{entry['binary_bytes'] / 1024:>9.1f}  {entry['status']}")
+            else:
+                print(f"{name:<16} {label:<14} {'-':>10} {'-':>10} {'-':>9}  {entry['status']}")
+
+    with open(args.output, "w") as f:
+        json.dump({"repeat": args.repeat, "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Generate synthetic Lors programs for compiler throughput benchmarks.
+
+Programs only use the core language (datum, algorithm, structure, verify,
+cycle, incorporate) so every compiler in the repo can build them.
+"""
+import os
+import argparse
+
+# Size presets used by throughput.py
+PRESETS = {
+    "small": dict(algorithms=50, nesting=3, expr_terms=8, struct_fields=8, includes=2),
+    "medium": dict(algorithms=400, nesting=5, expr_terms=24, struct_fields=32, includes=8),
+    "large": dict(algorithms=2000, nesting=8, expr_terms=48, struct_fields=96, includes=24),
+}
+
+def algorithm_source(index: int, nesting: int, expr_terms: int, struct_name: str) -> str:
+    lines = [f"algorithm algo_{index}(a : whole, b : whole) -> whole", "begin"]
+    lines.append(f"    datum acc : whole = {index % 7};")
+    lines.append(f"    datum probe : {struct_name};")
+    lines.append("    probe.f0 = a;")
+
+    # Long left-associative expression
+    terms = []
+    for t in range(expr_terms):
+        operand = ("a", "b", "acc", str(t + 1))[t % 4]
+        op = ("+", "-", "*", "+")[t % 4] if t else ""
+        terms.append(f"{op} {operand}" if op else operand)
+    lines.append(f"    acc = acc + ({' '.join(terms)}) % 1000;")
+
+    # Deeply nested verify chain
+    indent = "    "
+    for depth in range(nesting):
+        lines.append(f"{indent}verify (acc > {depth * 3} and a != {depth}) then")
+        indent += "    "
+        lines.append(f"{indent}acc = acc - {depth + 1};")
+    for depth in reversed(range(nesting)):
+        indent = indent[:-4]
+        lines.append(f"{indent}otherwise")
+        lines.append(f"{indent}    acc = acc + {depth};")
+        lines.append(f"{indent}conclude")
+
+    lines.append("    datum i : whole = 0;")
+    lines.append("    cycle (i < b) do")
+    lines.append("        acc = acc + i % 3 + probe.f0;")
+    lines.append("        i = i + 1;")
+    lines.append("    conclude")
+    lines.append("    result acc % 100000;")
+    lines.append("end")
+    return "\n".join(lines)
+
+def struct_source(name: str, fields: int) -> str:
+    lines = [f"structure {name}", "begin"]
+    for f in range(max(fields, 1)):
+        kind = ("whole", "precise", "series", "state")[f % 4] if f else "whole"
+        lines.append(f"    datum f{f} : {kind};")
+    lines.append("end")
+    return "\n".join(lines)
+
+def generate(out_dir: str, name: str, algorithms: int, nesting: int, expr_terms: int,
+             struct_fields: int, includes: int) -> str:
+    """Write <name>.lr plus its .inc files into out_dir and return the .lr path."""
+    os.makedirs(out_dir, exist_ok=True)
+    parts = max(includes, 1)
+    per_part = [[] for _ in range(parts)]
+    for index in range(algorithms):
+        per_part[index % parts].append(index)
+
+    for part, indices in enumerate(per_part):
+        struct_name = f"Record{part}"
+        chunks = [f"// Synthetic part {part}", struct_source(struct_name, struct_fields),
+                  f"datum counter_{part} : whole = {part};"]
+        chunks += [algorithm_source(i, nesting, expr_terms, struct_name) for i in indices]
+        with open(os.path.join(out_dir, f"{name}_part{part}.inc"), "w") as f:
+            f.write("\n\n".join(chunks) + "\n")
+
+    main = [f'incorporate "{name}_part{part}.inc"' for part in range(parts)]
+    main += ["", "algorithm genesis() -> whole", "begin", "    datum total : whole = 0;"]
+    for index in range(algorithms):
+        main.append(f"    total = total + algo_{index}({index % 5}, {index % 3});")
+    main += ["    reveal(total);", "    result 0;", "end", ""]
+    path = os.path.join(out_dir, f"{name}.lr")
+    with open(path, "w") as f:
+        f.write("\n".join(main))
+    return path
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Generate a synthetic Lors program")
+    arg_parser.add_argument("out_dir")
+    arg_parser.add_argument("--name", default="synth")
+    arg_parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    for key in PRESETS["small"]:
+        arg_parser.add_argument(f"--{key.replace('_', '-')}", type=int, dest=key,
+                                help=f"override the preset's {key}")
+    args = arg_parser.parse_args()
+
+    params = dict(PRESETS[args.preset])
+    for key in params:
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    path = generate(args.out_dir, args.name, **params)
+    with open(path) as f:
+        lines = sum(1 for _ in f)
+    for part in range(max(params["includes"], 1)):
+        with open(os.path.join(args.out_dir, f"{args.name}_part{part}.inc")) as f:
+            lines += sum(1 for _ in f)
+    print(f"{path} ({lines} lines)")
+
+if __name__ == "__main__":
+    main()
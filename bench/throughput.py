@@ -0,0 +1,170 @@
+"""Compiler throughput benchmark.
+
+Generates synthetic programs (see synth.py) and measures how long each Lors
+compiler takes on them:
+
+  python    compiler.py, per phase, via --time-phases-json
+  bootstrap ./lors_bootstrap (front end + g++)
+  twin      ./twin (front end + g++)
+  lors_lw   ./lors_lw (front end to LLVM IR) followed by llc when available
+
+Results are written as JSON. With --baseline, every timing is compared with a
+previous results file and the run fails if any got slower than --threshold.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synth import PRESETS, generate
+
+COMPILERS = ["python", "bootstrap", "twin", "lors_lw"]
+
+def _wait_with_rusage(proc):
+    # Popen.communicate() reaps the child through waitpid; reap it ourselves
+    # first with wait4 so its resource usage is not lost.
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.lors_rusage = usage.ru_maxrss
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+def run_child(cmd, cwd):
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    stdout = proc.stdout.read()
+    proc.stdout.close()
+    _wait_with_rusage(proc)
+    return proc.returncode, time.perf_counter() - start, proc.lors_rusage, stdout
+
+def measure_python(source, workdir):
+    code, wall, rss, stdout = run_child(
+        [sys.executable, os.path.join(REPO_DIR, "compiler.py"), "--time-phases-json", source], workdir)
+    if code != 0:
+        return {"status": "failed"}
+    report = json.loads(stdout)
+    result = {"status": "ok", "total_s": wall, "peak_rss_kb": rss}
+    for phase in report["phases"]:
+        result[f"{phase['phase']}_s"] = phase["wall_s"]
+        if "peak_py_mem_bytes" in phase:
+            result[f"{phase['phase']}_peak_py_mem_bytes"] = phase["peak_py_mem_bytes"]
+    return result
+
+def measure_native(binary, source, workdir):
+    code, wall, rss, _ = run_child([binary, os.path.basename(source)], workdir)
+    if code != 0:
+        return {"status": "failed"}
+    return {"status": "ok", "total_s": wall, "peak_rss_kb": rss}
+
+def measure_lors_lw(binary, source, workdir):
+    result = measure_native(binary, source, workdir)
+    if result["status"] != "ok":
+        return result
+    result["front_end_s"] = result.pop("total_s")
+    ll_file = os.path.splitext(source)[0] + ".ll"
+    if shutil.which("llc"):
+        code, wall, _, _ = run_child(["llc", "-filetype=obj", ll_file, "-o", ll_file[:-3] + ".o"], workdir)
+        # lors_lw does not produce verifiable IR for every program
+        result["llc_s"] = wall if code == 0 else None
+    return result
+
+def measure(compiler, source, workdir, bin_dir):
+    if compiler == "python":
+        return measure_python(source, workdir)
+    binary = os.path.join(bin_dir, {"bootstrap": "lors_bootstrap"}.get(compiler, compiler))
+    if not os.access(binary, os.X_OK):
+        return {"status": "missing"}
+    if compiler == "lors_lw":
+        return measure_lors_lw(binary, source, workdir)
+    return measure_native(binary, source, workdir)
+
+def median_of(runs):
+    """Combine repeated runs: median of every numeric metric."""
+    ok = [r for r in runs if r["status"] == "ok"]
+    if not ok:
+        return runs[0]
+    merged = {"status": "ok", "runs": len(ok)}
+    for key in ok[0]:
+        values = [r[key] for r in ok if isinstance(r.get(key), (int, float))]
+        if values and key != "status":
+            merged[key] = statistics.median(values)
+    return merged
+
+def compare(results, baseline, threshold):
+    """Return a list of human-readable regressions against the baseline."""
+    regressions = []
+    for size, per_compiler in results["results"].items():
+        for compiler, metrics in per_compiler.items():
+            old = baseline.get("results", {}).get(size, {}).get(compiler)
+            if not old or metrics.get("status") != "ok" or old.get("status") != "ok":
+                continue
+            for key, value in metrics.items():
+                if not key.endswith("_s") or not isinstance(old.get(key), (int, float)):
+                    continue
+                # Ignore noise on phases that take only a few milliseconds
+                if old[key] > 0.005 and value > old[key] * (1 + threshold):
+                    regressions.append(f"{size}/{compiler}/{key}: {old[key]:.4f}s -> {value:.4f}s "
+                                       f"(+{(value / old[key] - 1) * 100:.1f}%)")
+    return regressions
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Lors compiler throughput benchmark")
+    arg_parser.add_argument("--sizes", default="small,medium", help="comma-separated presets from synth.py")
+    arg_parser.add_argument("--compilers", default=",".join(COMPILERS))
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--bin-dir", default=REPO_DIR, help="where lors_bootstrap, twin and lors_lw live")
+    arg_parser.add_argument("--output", default="bench_output.json")
+    arg_parser.add_argument("--baseline", help="previous results to compare against")
+    arg_parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown (0.10 = 10%%)")
+    args = arg_parser.parse_args()
+
+    sizes = args.sizes.split(",")
+    compilers = args.compilers.split(",")
+    for size in sizes:
+        if size not in PRESETS:
+            arg_parser.error(f"unknown size '{size}' (choose from {', '.join(PRESETS)})")
+
+    results = {"meta": {"python": platform.python_version(), "machine": platform.machine(),
+                        "repeat": args.repeat, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+               "results": {}}
+    for size in sizes:
+        results["results"][size] = {}
+        for compiler in compilers:
+            runs = []
+            for _ in range(args.repeat):
+                # Fresh directory per run so no compiler sees another's outputs
+                with tempfile.TemporaryDirectory(prefix=f"lors_bench_{size}_") as workdir:
+                    source = generate(workdir, "synth", **PRESETS[size])
+                    runs.append(measure(compiler, source, workdir, os.path.abspath(args.bin_dir)))
+                if runs[-1]["status"] != "ok":
+                    break
+            metrics = median_of(runs)
+            results["results"][size][compiler] = metrics
+            summary = ", ".join(f"{k}={v:.3f}" for k, v in metrics.items() if k.endswith("_s") and v is not None)
+            print(f"{size:<8} {compiler:<10} {metrics['status']:<8} {summary}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions over {args.threshold * 100:.0f}%:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
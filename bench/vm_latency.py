@@ -0,0 +1,104 @@
+"""Startup-to-first-output latency: compiler.py --run against compile-then-run.
+
+For each program the clock starts when compiler.py is launched and stops at
+the first byte the program writes to stdout (or at its exit if it prints
+nothing). The compiled path includes building the binary with the chosen
+backend; the VM path compiles to bytecode and runs in the same process.
+Both are also timed to completion, which shows where the interpreter's
+slower execution outweighs the build it saves. Programs with a golden
+output must print the same thing both ways.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from run_tests import discover
+
+COMPILER = os.path.join(REPO_DIR, "compiler.py")
+
+def timed_run(cmd: list, cwd: str, stdin: str) -> tuple:
+    """(seconds to the first byte of stdout, seconds to exit, stdout, exit status)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    proc.stdin.write(stdin.encode())
+    proc.stdin.close()
+    first = proc.stdout.read(1)
+    first_s = time.perf_counter() - start
+    rest = proc.stdout.read()
+    status = proc.wait()
+    total_s = time.perf_counter() - start
+    return (first_s if first else total_s), total_s, (first + rest).decode(errors="replace"), status
+
+def measure(test, backend: str, repeat: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="lors_latency_")
+    try:
+        source_dir = os.path.dirname(test.path)
+        for entry in os.listdir(source_dir):
+            if entry.endswith((".lr", ".inc")):
+                os.symlink(os.path.join(source_dir, entry), os.path.join(workdir, entry))
+        source = os.path.basename(test.path)
+        exe = "./" + os.path.splitext(source)[0]
+        firsts, totals = [], []
+        for _ in range(repeat):
+            if backend == "vm":
+                first_s, total_s, out, status = timed_run(
+                    [sys.executable, COMPILER, "--run", source] + test.args, workdir, test.stdin)
+            else:
+                start = time.perf_counter()
+                build = subprocess.run([sys.executable, COMPILER, "--backend", backend, source],
+                                       cwd=workdir, capture_output=True, text=True)
+                build_s = time.perf_counter() - start
+                if build.returncode != 0:
+                    return {"error": "build failed"}
+                first_s, total_s, out, status = timed_run([exe] + test.args, workdir, test.stdin)
+                first_s += build_s
+                total_s += build_s
+            firsts.append(first_s)
+            totals.append(total_s)
+        return {"first": statistics.median(firsts), "total": statistics.median(totals), "out": out,
+                "status": status}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Lors VM startup latency against the compiled path")
+    arg_parser.add_argument("tests", nargs="*", help="programs or directories (default: lors/examples and lors/tests)")
+    arg_parser.add_argument("--backend", choices=["cpp", "llvm"], default="cpp", help="compiled path to compare with")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per program; the median is reported")
+    args = arg_parser.parse_args()
+
+    tests = [t for t in discover(args.tests) if t.backends is None or "vm" in t.backends]
+    print(f"{'program':<40} {'first output (ms)':>28}   {'to exit (ms)':>22}")
+    print(f"{'':<40} {args.backend:>9} {'vm':>9} {'ratio':>8}   {args.backend:>9} {'vm':>9}")
+    ratios = []
+    failed = False
+    for test in tests:
+        compiled = measure(test, args.backend, args.repeat)
+        vm = measure(test, "vm", args.repeat)
+        name = os.path.relpath(test.path, REPO_DIR)
+        if "error" in compiled or "error" in vm:
+            print(f"{name:<40} {compiled.get('error') or vm.get('error')}")
+            continue
+        same = test.expected is None or (compiled["out"] == vm["out"] and compiled["status"] == vm["status"])
+        failed |= not same
+        ratio = compiled["first"] / vm["first"]
+        ratios.append(ratio)
+        print(f"{name:<40} {compiled['first'] * 1000:9.0f} {vm['first'] * 1000:9.0f} {ratio:7.1f}x   "
+              f"{compiled['total'] * 1000:9.0f} {vm['total'] * 1000:9.0f}{'' if same else '  OUTPUT DIFFERS'}")
+    if ratios:
+        print(f"\nfirst output {statistics.median(ratios):.1f}x sooner with --run (median of {len(ratios)}; "
+              f"range {min(ratios):.1f}x-{max(ratios):.1f}x)")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
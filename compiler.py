@@ -1,103 +1,460 @@
 import sys
 import os
+import json
+import time
+import shutil
+import hashlib
+import resource
+import argparse
+import tempfile
 import subprocess
+import tracemalloc
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from lors.src.lexer import Lexer
 from lors.src.parser import Parser
 from lors.src.codegen import CodeGenerator
+from lors.src.llvm_codegen import LLVMCodeGenerator
+from lors.src.runtime import C_RUNTIME
+from lors.src.ast_nodes import Program, FunctionDeclaration, StructDeclaration, VariableDeclaration
+from lors.src.analysis import walk
+from lors.src.loader import SourceLoader
+from lors.src.modules import generate_modules, PRELUDE_HEADER
+from lors.src.fold import fold_pure_calls
+from lors.src.hoist import hoist_invariants
+from lors.src.prune import prune_unreachable
+from lors.src.tailcall import loop_tail_calls
+from lors.src.vm import compile_program, VM, LorsRuntimeError
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 compiler <script>.lr")
-        sys.exit(1)
+class PhaseTimer:
+    """Wall/CPU time of each compiler phase (--time-phases)."""
 
-    input_file = sys.argv[1]
-    if not input_file.endswith(".lr"):
-        print("Error: Input file must have .lr extension")
-        sys.exit(1)
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.phases = []
 
-    if not os.path.exists(input_file):
-        print(f"Error: File '{input_file}' not found")
-        sys.exit(1)
+    @contextmanager
+    def phase(self, name: str):
+        # Callers may attach counts (tokens, nodes, bytes) to the record
+        record = {"phase": name}
+        if not self.enabled:
+            yield record
+            return
+
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            # Subprocesses (g++) are charged to the phase that waited on them
+            child_cpu = ((children_after.ru_utime + children_after.ru_stime)
+                         - (children_before.ru_utime + children_before.ru_stime))
+            record["wall_s"] = time.perf_counter() - wall_start
+            record["cpu_s"] = time.process_time() - cpu_start + child_cpu
+            self.phases.append(record)
+
+    def add_memory(self, peaks: dict):
+        for record in self.phases:
+            if record["phase"] in peaks:
+                record["peak_py_mem_bytes"] = peaks[record["phase"]]
+
+    def report(self, fmt: str):
+        if not self.enabled:
+            return
+        total = {"wall_s": sum(p["wall_s"] for p in self.phases),
+                 "cpu_s": sum(p["cpu_s"] for p in self.phases)}
+        if fmt == "json":
+            print(json.dumps({"phases": self.phases, "total": total}, indent=2))
+            return
 
-    # 1. Read Source
+        fixed = ("phase", "wall_s", "cpu_s", "peak_py_mem_bytes")
+        print(f"{'phase':<12} {'wall ms':>10} {'cpu ms':>10} {'peak py mem':>12}  details", file=sys.stderr)
+        for p in self.phases:
+            details = ", ".join(f"{k}={v}" for k, v in p.items() if k not in fixed)
+            mem = f"{p['peak_py_mem_bytes'] / 1024:.0f} KB" if "peak_py_mem_bytes" in p else "-"
+            print(f"{p['phase']:<12} {p['wall_s'] * 1000:>10.2f} {p['cpu_s'] * 1000:>10.2f} {mem:>12}  {details}",
+                  file=sys.stderr)
+        print(f"{'total':<12} {total['wall_s'] * 1000:>10.2f} {total['cpu_s'] * 1000:>10.2f}", file=sys.stderr)
+
+class MemoryTracer:
+    """Peak traced Python memory of each phase; phase() is used as PhaseTimer's is."""
+
+    def __init__(self):
+        self.peaks = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        tracemalloc.reset_peak()
+        yield {}
+        self.peaks[name] = tracemalloc.get_traced_memory()[1]
+
+def trace_front_end_memory(input_file: str, options) -> dict:
+    """Peak traced Python memory of each front-end phase.
+
+    The front end is re-run under tracemalloc rather than measured during the
+    timed run, because tracing allocations slows lexing and parsing several
+    times over and would distort the reported times. It runs the same passes
+    as build, so the peaks describe the program that was built.
+    """
+    tracer = MemoryTracer()
+    tracemalloc.start()
     try:
-        # Get absolute path of input file to resolve includes correctly relative to it
-        abs_input_path = os.path.abspath(input_file)
-        input_dir = os.path.dirname(abs_input_path)
-
-        with open(abs_input_path, 'r') as f:
-            source_code = f.read()
-
-        # Preprocessor: Handle incorporate
-        def process_includes(code, base_dir):
-            lines = code.split('\n')
-            processed_lines = []
-            for line in lines:
-                if line.strip().startswith("incorporate"):
-                    # Format: incorporate "file.inc"
-                    try:
-                        # Extract filename
-                        parts = line.strip().split('"')
-                        if len(parts) >= 2:
-                            inc_path = parts[1]
-
-                            # Search strategy:
-                            # 1. Relative to the file currently being processed (base_dir)
-                            # 2. Relative to CWD (fallback)
-
-                            candidates = [
-                                os.path.join(base_dir, inc_path),
-                                inc_path
-                            ]
-
-                            found_content = None
-                            found_path = None
-
-                            for candidate in candidates:
-                                if os.path.exists(candidate):
-                                    found_path = os.path.abspath(candidate)
-                                    with open(candidate, 'r') as inc_f:
-                                        found_content = inc_f.read()
-                                    break
-
-                            if found_content is not None:
-                                # Recursively process the included content,
-                                # using its directory as the new base_dir
-                                new_base = os.path.dirname(found_path)
-                                processed_lines.append(process_includes(found_content, new_base))
-                            else:
-                                # Error
-                                print(f"Error: Could not find included file: '{inc_path}'")
-                                print(f"  Searched in: {base_dir}")
-                                print(f"  And CWD: {os.getcwd()}")
-                                sys.exit(1)
-                        else:
-                            # Malformed incorporate? Keep as is or error.
-                            processed_lines.append(line)
-                    except Exception as e:
-                        print(f"Preprocessor Error: {e}")
+        with tracer.phase("preprocess"):
+            abs_input_path = os.path.abspath(input_file)
+            with open(abs_input_path, 'r') as f:
+                line_map = [] if options.debug else None
+                source_code = process_includes(f.read(), os.path.dirname(abs_input_path), abs_input_path, line_map)
+        with tracer.phase("lex"):
+            tokens = Lexer(source_code, line_map).tokenize()
+        with tracer.phase("parse"):
+            ast = Parser(tokens).parse()
+        optimise(ast, input_file, options, tracer, quiet=True)
+        with tracer.phase("codegen"):
+            make_generator(options).generate(ast)
+    finally:
+        tracemalloc.stop()
+    return tracer.peaks
+
+# Preprocessor: Handle incorporate
+def process_includes(code, base_dir, path=None, line_map=None):
+    # line_map, if given, receives the (path, line) of every output line
+    lines = code.split('\n')
+    processed_lines = []
+    for number, line in enumerate(lines, 1):
+        if line.strip().startswith("incorporate"):
+            # Format: incorporate "file.inc"
+            try:
+                # Extract filename
+                parts = line.strip().split('"')
+                if len(parts) >= 2:
+                    inc_path = parts[1]
+
+                    # Search strategy:
+                    # 1. Relative to the file currently being processed (base_dir)
+                    # 2. Relative to CWD (fallback)
+
+                    candidates = [
+                        os.path.join(base_dir, inc_path),
+                        inc_path
+                    ]
+
+                    found_content = None
+                    found_path = None
+
+                    for candidate in candidates:
+                        if os.path.exists(candidate):
+                            found_path = os.path.abspath(candidate)
+                            with open(candidate, 'r') as inc_f:
+                                found_content = inc_f.read()
+                            break
+
+                    if found_content is not None:
+                        # Recursively process the included content,
+                        # using its directory as the new base_dir
+                        new_base = os.path.dirname(found_path)
+                        processed_lines.append(process_includes(found_content, new_base, found_path, line_map))
+                    else:
+                        # Error
+                        print(f"Error: Could not find included file: '{inc_path}'")
+                        print(f"  Searched in: {base_dir}")
+                        print(f"  And CWD: {os.getcwd()}")
                         sys.exit(1)
                 else:
+                    # Malformed incorporate? Keep as is or error.
                     processed_lines.append(line)
-            return '\n'.join(processed_lines)
+                    if line_map is not None:
+                        line_map.append((path, number))
+            except Exception as e:
+                print(f"Preprocessor Error: {e}")
+                sys.exit(1)
+        else:
+            processed_lines.append(line)
+            if line_map is not None:
+                line_map.append((path, number))
+    return '\n'.join(processed_lines)
 
-        source_code = process_includes(source_code, input_dir)
+# The generated code uses C++17 (inline variables, std::string_view, ...)
+CXX_STANDARD = "-std=c++17"
 
-    except Exception as e:
+# Frame pointers let perf record call graphs without DWARF unwinding
+DEBUG_FLAGS = ["-g", "-fno-omit-frame-pointer"]
+
+def report_removed(input_file: str, removed: list, verbose: bool):
+    """Count the declarations prune_unreachable dropped; --verbose also names them."""
+    counts = []
+    for kind, node_type in (("algorithm", FunctionDeclaration), ("structure", StructDeclaration),
+                            ("global", VariableDeclaration)):
+        # A prototype and its definition are one algorithm
+        names = list(dict.fromkeys(d.name for d in removed if isinstance(d, node_type)))
+        if not names:
+            continue
+        plural = "s" if len(names) > 1 else ""
+        counts.append(f"{len(names)} {kind}{plural}")
+        if verbose:
+            print(f"{input_file}: removed {len(names)} unreachable {kind}{plural}: {', '.join(names)}",
+                  file=sys.stderr)
+    if counts and not verbose:
+        print(f"{input_file}: removed {', '.join(counts)} unreachable from genesis (-v to list them)",
+              file=sys.stderr)
+
+def make_generator(options):
+    if options.backend == "llvm":
+        return LLVMCodeGenerator()
+    return CodeGenerator(instrument=options.instrument, jobs=options.jobs or 1, trace_alloc=options.trace_alloc,
+                         line_directives=options.debug)
+
+def find_tool(*names):
+    for name in names:
+        path = shutil.which(name)
+        if path:
+            return path
+    return None
+
+def runtime_object(cc: str) -> str:
+    """Object file of the LLVM backend's C runtime, compiled once per version."""
+    digest = hashlib.sha1(C_RUNTIME.encode()).hexdigest()[:12]
+    obj = os.path.join(tempfile.gettempdir(), f"lors_runtime_{digest}.o")
+    if not os.path.exists(obj):
+        src = obj[:-2] + f"_{os.getpid()}.c"
+        with open(src, 'w') as f:
+            f.write(C_RUNTIME)
+        tmp_obj = src[:-2] + ".o"
+        try:
+            subprocess.run([cc, "-std=c11", "-O2", "-fPIC", "-c", src, "-o", tmp_obj],
+                           check=True, capture_output=True, text=True)
+            # Atomic so concurrent builds never link a half-written object
+            os.replace(tmp_obj, obj)
+        finally:
+            os.remove(src)
+    return obj
+
+def llvm_commands(ir_file: str, output_bin: str, opt_level: str) -> list:
+    """clang when available, otherwise llc plus the system C compiler."""
+    clang = find_tool("clang", "clang-14")
+    if clang:
+        return [[clang, f"-O{opt_level}", ir_file, runtime_object(clang), "-o", output_bin, "-lm"]]
+    llc = find_tool("llc", "llc-14")
+    cc = find_tool("cc", "gcc")
+    if not llc or not cc:
+        raise FileNotFoundError("the LLVM backend needs clang, or llc and a C compiler")
+    base = os.path.splitext(ir_file)[0]
+    commands = []
+    opt = find_tool("opt", "opt-14")
+    if opt and opt_level != "0":
+        # llc only optimises code generation; opt runs the IR pipeline clang would
+        commands.append([opt, f"-O{opt_level}", ir_file, "-o", base + ".bc"])
+        ir_file = base + ".bc"
+    llc_level = "2" if opt_level == "s" else opt_level
+    commands.append([llc, f"-O{llc_level}", "-filetype=obj", "-relocation-model=pic", ir_file, "-o", base + ".o"])
+    commands.append([cc, base + ".o", runtime_object(cc), "-o", output_bin, "-lm"])
+    return commands
+
+def write_if_changed(path: str, text: str) -> bool:
+    # Unchanged files keep their mtime, so their objects stay up to date
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            if f.read() == text:
+                return False
+    with open(path, 'w') as f:
+        f.write(text)
+    return True
+
+def build_modules(input_file, options, loader, timer) -> bool:
+    """--modules: one object per source file in <program>.build/, then link.
+
+    An object is recompiled only when it is older than its source or any
+    header, and stale objects are compiled in parallel (--jobs).
+    """
+    root_dir = os.path.dirname(os.path.abspath(input_file))
+    base_name = os.path.splitext(input_file)[0]
+    build_dir = f"{base_name}.build"
+    try:
+        with timer.phase("load"):
+            loader.load(input_file)
+            pairs = loader.file_declarations(input_file)
+        if not options.no_fold:
+            with timer.phase("fold") as phase:
+                # The pairs share their declaration objects, so this rewrites them in place
+                phase["calls_folded"] = fold_pure_calls(Program([decl for _, decl in pairs]))
+        if not options.no_prune:
+            with timer.phase("prune") as phase:
+                removed = prune_unreachable(Program([decl for _, decl in pairs]))
+                phase["removed"] = len(removed)
+            dead = {id(decl) for decl in removed}
+            pairs = [(path, decl) for path, decl in pairs if id(decl) not in dead]
+            report_removed(input_file, removed, options.verbose)
+        if not options.no_tail_calls:
+            with timer.phase("tailcalls") as phase:
+                phase["tail_calls"] = loop_tail_calls(Program([decl for _, decl in pairs]))
+        if not options.no_hoist:
+            with timer.phase("hoist") as phase:
+                phase["hoisted"] = hoist_invariants(Program([decl for _, decl in pairs]))
+        with timer.phase("codegen") as phase:
+            prelude, modules, flags = generate_modules(pairs, root_dir, options.debug)
+            phase["modules"] = len(modules)
+    except (OSError, UnicodeDecodeError) as e:
         print(f"Error reading file: {e}")
-        sys.exit(1)
+        return False
+    except SyntaxError as e:
+        print(f"Compilation Error: {e}")
+        return False
+
+    flags = [CXX_STANDARD] + flags
+    if options.opt_level:
+        flags.append(f"-O{options.opt_level}")
+    if options.debug:
+        flags += DEBUG_FLAGS
+    with timer.phase("write"):
+        os.makedirs(build_dir, exist_ok=True)
+        headers = [os.path.join(build_dir, PRELUDE_HEADER)]
+        write_if_changed(headers[0], prelude)
+        for module in modules:
+            headers.append(os.path.join(build_dir, f"{module.name}.h"))
+            write_if_changed(headers[-1], module.header_text())
+        for module in modules:
+            write_if_changed(os.path.join(build_dir, f"{module.name}.cpp"), module.source_text(modules, flags))
+
+    newest_header = max(os.path.getmtime(h) for h in headers)
+    objects = []
+    stale = []
+    for module in modules:
+        source = os.path.join(build_dir, f"{module.name}.cpp")
+        obj = os.path.join(build_dir, f"{module.name}.o")
+        objects.append(obj)
+        if not os.path.exists(obj) or os.path.getmtime(obj) < max(os.path.getmtime(source), newest_header):
+            stale.append(["g++", "-c", source, "-o", obj] + flags)
+
+    with timer.phase("backend") as phase:
+        phase["compiled"] = len(stale)
+        with ThreadPoolExecutor(max_workers=options.jobs or os.cpu_count() or 1) as pool:
+            results = list(pool.map(lambda cmd: subprocess.run(cmd, capture_output=True, text=True), stale))
+        failed = [r for r in results if r.returncode != 0]
+        if not failed:
+            link = subprocess.run(["g++"] + objects + ["-o", base_name] + flags, capture_output=True, text=True)
+            failed = [link] if link.returncode != 0 else []
+
+    if failed:
+        print(f"C++ Backend Failed for {input_file}:")
+        for result in failed:
+            print(result.stderr)
+        return False
+    timer.report(options.time_phases)
+    return True
+
+def parse_args(argv):
+    arg_parser = argparse.ArgumentParser(prog="compiler.py", description="Lors to C++ compiler")
+    arg_parser.add_argument("inputs", nargs="*", metavar="input_file", help="Lors program(s) (.lr)")
+    arg_parser.add_argument("--backend", choices=["cpp", "llvm"], default="cpp",
+                            help="cpp: emit C++ and build with g++; llvm: emit LLVM IR and build with clang (or llc)")
+    arg_parser.add_argument("-O", dest="opt_level", choices=["0", "1", "2", "3", "s"],
+                            help="optimisation level for the backend (default: -O0 for cpp, -O2 for llvm)")
+    arg_parser.add_argument("-g", dest="debug", action="store_true",
+                            help="debug info pointing at the .lr source lines (#line), for gdb and perf")
+    arg_parser.add_argument("--no-fold", dest="no_fold", action="store_true",
+                            help="do not evaluate calls of pure algorithms with constant arguments at compile time")
+    arg_parser.add_argument("--no-prune", dest="no_prune", action="store_true",
+                            help="keep algorithms, structures and globals that genesis never reaches")
+    arg_parser.add_argument("--no-tail-calls", dest="no_tail_calls", action="store_true",
+                            help="keep self tail calls ('result f(...)' inside f) as calls instead of loops")
+    arg_parser.add_argument("--no-hoist", dest="no_hoist", action="store_true",
+                            help="do not move loop-invariant expressions out of cycle loops (C++ backend)")
+    arg_parser.add_argument("-v", "--verbose", action="store_true",
+                            help="name the declarations the optimisation passes removed")
+    arg_parser.add_argument("--instrument", action="store_true",
+                            help="profile every algorithm; the binary reports call counts and times at exit")
+    arg_parser.add_argument("--trace-alloc", dest="trace_alloc", action="store_true",
+                            help="count heap allocations per algorithm; the binary prints the top ones at exit "
+                                 "(LORS_ALLOC_TOP sets how many, default 10)")
+    arg_parser.add_argument("--time-phases", dest="time_phases", action="store_const", const="text",
+                            help="report time and memory per compiler phase on stderr")
+    arg_parser.add_argument("--time-phases-json", dest="time_phases", action="store_const", const="json",
+                            help="same as --time-phases, as JSON on stdout")
+    arg_parser.add_argument("-j", "--jobs", type=int,
+                            help="processes for C++ code generation (default 1) and for --modules compiles (default: all cores)")
+    arg_parser.add_argument("--modules", action="store_true",
+                            help="compile each incorporated file separately and link; only changed files recompile")
+    arg_parser.add_argument("--watch", action="store_true",
+                            help="build the programs, then rebuild them whenever they or their incorporates change")
+    arg_parser.add_argument("--run", metavar="input_file",
+                            help="run the program in the bytecode VM, without a C++ toolchain; "
+                                 "the arguments after it are passed to the program")
+    # Everything after the program given to --run is its own command line
+    program_args = []
+    if "--run" in argv:
+        end = argv.index("--run") + 2
+        argv, program_args = argv[:end], argv[end:]
+    options = arg_parser.parse_args(argv)
+    options.program_args = program_args
+    return options
+
+def build(input_file, options, loader=None) -> bool:
+    """Compile one program to a binary; prints errors and returns False on failure.
+
+    With a SourceLoader the front end reuses its cached tokens and trees
+    instead of preprocessing, lexing and parsing from scratch.
+    """
+    timer = PhaseTimer(options.time_phases is not None)
+    if not input_file.endswith(".lr"):
+        print("Error: Input file must have .lr extension")
+        return False
+
+    if not os.path.exists(input_file):
+        print(f"Error: File '{input_file}' not found")
+        return False
+
+    if options.modules:
+        return build_modules(input_file, options, loader or SourceLoader(), timer)
+
+    if loader is None:
+        # 1. Read Source
+        try:
+            with timer.phase("preprocess") as phase:
+                # Get absolute path of input file to resolve includes correctly relative to it
+                abs_input_path = os.path.abspath(input_file)
+                input_dir = os.path.dirname(abs_input_path)
+
+                with open(abs_input_path, 'r') as f:
+                    source_code = f.read()
+
+                # -g: remember where each line came from, for #line directives
+                line_map = [] if options.debug else None
+                source_code = process_includes(source_code, input_dir, abs_input_path, line_map)
+                phase["source_bytes"] = len(source_code)
+
+        except Exception as e:
+            print(f"Error reading file: {e}")
+            return False
 
     # 2. Compile (Lex -> Parse -> CodeGen)
     try:
-        lexer = Lexer(source_code)
-        tokens = lexer.tokenize()
+        if loader is not None:
+            with timer.phase("load") as phase:
+                ast = loader.load(input_file)
+        else:
+            with timer.phase("lex") as phase:
+                lexer = Lexer(source_code, line_map)
+                tokens = lexer.tokenize()
+                phase["tokens"] = len(tokens)
 
-        parser = Parser(tokens)
-        ast = parser.parse()
+            with timer.phase("parse") as phase:
+                parser = Parser(tokens)
+                ast = parser.parse()
+        if timer.enabled:
+            # Counted outside the phase so the walk is not billed to the parser
+            phase["ast_nodes"] = sum(1 for _ in walk(ast))
 
-        codegen = CodeGenerator()
-        cpp_code = codegen.generate(ast)
+        optimise(ast, input_file, options, timer)
 
+        with timer.phase("codegen") as phase:
+            codegen = make_generator(options)
+            out_code = codegen.generate(ast)
+            phase["ir_bytes" if options.backend == "llvm" else "cpp_bytes"] = len(out_code)
+
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Error reading file: {e}")
+        return False
     except Exception as e:
         # Print without stack trace for cleaner user output if it's a syntax error
         # but with stack trace if it's a bug
@@ -107,31 +464,220 @@ def main():
             import traceback
             traceback.print_exc()
             print(f"Internal Compiler Error: {e}")
-        sys.exit(1)
+        return False
 
-    # 3. Write C++ Output
+    # 3. Write C++ (or LLVM IR) Output
     base_name = os.path.splitext(input_file)[0]
-    cpp_file = f"{base_name}.cpp"
+    out_file = f"{base_name}.ll" if options.backend == "llvm" else f"{base_name}.cpp"
 
-    with open(cpp_file, 'w') as f:
-        f.write(cpp_code)
+    with timer.phase("write"):
+        with open(out_file, 'w') as f:
+            f.write(out_code)
 
-    # 4. Invoke g++
+    # 4. Invoke g++ (or clang / llc)
     output_bin = base_name
 
-    cmd = ["g++", cpp_file, "-o", output_bin]
+    if options.backend == "llvm":
+        commands = llvm_commands(out_file, output_bin, options.opt_level or "2")
+        intermediates = [out_file, f"{base_name}.bc", f"{base_name}.o"]
+    else:
+        cmd = ["g++", CXX_STANDARD, out_file, "-o", output_bin] + sorted(codegen.compile_flags)
+        if options.opt_level:
+            cmd.append(f"-O{options.opt_level}")
+        if options.debug:
+            cmd += DEBUG_FLAGS
+        commands = [cmd]
+        intermediates = [out_file]
 
     # print(f"Compiling {input_file} -> {output_bin}...")
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    with timer.phase("backend") as phase:
+        for cmd in commands:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                break
+        if result.returncode == 0:
+            phase["binary_bytes"] = os.path.getsize(output_bin)
 
     if result.returncode != 0:
-        print(f"C++ Backend Failed for {input_file}:")
+        backend = "LLVM" if options.backend == "llvm" else "C++"
+        print(f"{backend} Backend Failed for {input_file}:")
         print(result.stderr)
-        sys.exit(1)
+        return False
 
     # Clean up
-    if os.path.exists(cpp_file):
-        os.remove(cpp_file)
+    for path in intermediates:
+        if os.path.exists(path):
+            os.remove(path)
+
+    if timer.enabled:
+        timer.add_memory(trace_front_end_memory(input_file, options))
+    timer.report(options.time_phases)
+    return True
+
+def optimise(ast: Program, input_file: str, options, timer, quiet: bool = False):
+    """The passes build runs between parsing and code generation, in place."""
+    # The profile counts calls, so --instrument keeps them all
+    if not options.no_fold and not options.instrument:
+        with timer.phase("fold") as phase:
+            phase["calls_folded"] = fold_pure_calls(ast)
+
+    # After folding, which can leave algorithms without callers
+    if not options.no_prune:
+        with timer.phase("prune") as phase:
+            removed = prune_unreachable(ast)
+            phase["removed"] = len(removed)
+        if not quiet:
+            report_removed(input_file, removed, options.verbose)
+
+    if not options.no_tail_calls:
+        with timer.phase("tailcalls") as phase:
+            phase["tail_calls"] = loop_tail_calls(ast)
+
+    # opt's own LICM covers the LLVM backend
+    if not options.no_hoist and options.backend == "cpp":
+        with timer.phase("hoist") as phase:
+            phase["hoisted"] = hoist_invariants(ast)
+
+def run(input_file, options) -> int:
+    """--run: compile to bytecode and run it in the VM; returns the exit status."""
+    timer = PhaseTimer(options.time_phases is not None)
+    if not input_file.endswith(".lr") or not os.path.exists(input_file):
+        print(f"Error: '{input_file}' is not a Lors program (.lr)")
+        return 1
+    try:
+        with timer.phase("preprocess"):
+            abs_input_path = os.path.abspath(input_file)
+            with open(abs_input_path, 'r') as f:
+                source_code = process_includes(f.read(), os.path.dirname(abs_input_path))
+        with timer.phase("lex"):
+            tokens = Lexer(source_code).tokenize()
+        with timer.phase("parse"):
+            ast = Parser(tokens).parse()
+        if not options.no_fold:
+            with timer.phase("fold") as phase:
+                phase["calls_folded"] = fold_pure_calls(ast)
+        if not options.no_prune:
+            with timer.phase("prune") as phase:
+                removed = prune_unreachable(ast)
+                phase["removed"] = len(removed)
+            report_removed(input_file, removed, options.verbose)
+        if not options.no_tail_calls:
+            with timer.phase("tailcalls") as phase:
+                phase["tail_calls"] = loop_tail_calls(ast)
+        with timer.phase("bytecode") as phase:
+            module = compile_program(ast)
+            phase["instructions"] = sum(len(f.code) // 2 for f in module.functions)
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Error reading file: {e}")
+        return 1
+    except SyntaxError as e:
+        print(f"Compilation Error: {e}")
+        return 1
+
+    # argv[0] as if the compiled binary had been started from the shell
+    program = os.path.splitext(input_file)[0]
+    if not os.path.dirname(program):
+        program = os.path.join(".", program)
+    argv = [os.fsencode(a).decode("latin-1") for a in [program] + options.program_args]
+    # The report goes to stderr before the program's output starts
+    timer.report(options.time_phases)
+    try:
+        status = VM(module, argv).run()
+    except LorsRuntimeError as e:
+        print(e, file=sys.stderr)
+        status = 1
+    return status
+
+def snapshot(paths) -> dict:
+    # A missing file (deleted, or mid-save) reads as None and so as a change
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+def watch(targets, options, poll=0.2, settle=0.3):
+    """Rebuild each target whenever a file it incorporates changes.
+
+    Files are polled (the standard library has no inotify binding); a burst
+    of saves is coalesced by waiting until nothing changed for `settle`
+    seconds. Unchanged files keep their tokens and trees in the loader.
+    """
+    loader = SourceLoader()
+    deps = {}
+
+    def rebuild(target):
+        start = time.perf_counter()
+        ok = build(target, options, loader)
+        elapsed = (time.perf_counter() - start) * 1000
+        total = loader.reused + loader.loaded
+        status = "rebuilt" if ok else "failed to build"
+        print(f"[watch] {status} {target} in {elapsed:.0f} ms (reused {loader.reused}/{total} files)", flush=True)
+        found = loader.dependencies(target)
+        if not ok:
+            # A failed load may not have reached every incorporate; keep watching the old ones
+            found |= deps.get(target, set())
+        deps[target] = found
+
+    for target in targets:
+        rebuild(target)
+    mtimes = snapshot(set().union(*deps.values()))
+    print(f"[watch] watching {len(mtimes)} files for {len(targets)} program(s); Ctrl-C to stop", flush=True)
+
+    try:
+        while True:
+            time.sleep(poll)
+            current = snapshot(mtimes)
+            if current == mtimes:
+                continue
+            # Debounce: wait for the editor (or a checkout) to finish writing
+            while True:
+                time.sleep(settle)
+                settled = snapshot(mtimes)
+                if settled == current:
+                    break
+                current = settled
+            changed = {path for path in current if current[path] != mtimes[path]}
+            for target in targets:
+                if deps[target] & changed:
+                    rebuild(target)
+            mtimes = snapshot(set().union(*deps.values()))
+    except KeyboardInterrupt:
+        print("\n[watch] stopped")
+
+def main():
+    options = parse_args(sys.argv[1:])
+    for flag, enabled in (("--instrument", options.instrument), ("--trace-alloc", options.trace_alloc)):
+        if enabled and options.backend != "cpp":
+            print(f"Error: {flag} is only supported by the C++ backend")
+            sys.exit(1)
+        if enabled and options.modules:
+            print(f"Error: {flag} cannot be combined with --modules")
+            sys.exit(1)
+    for flag, enabled in (("--modules", options.modules), ("-g", options.debug)):
+        if enabled and options.backend != "cpp":
+            print(f"Error: {flag} is only supported by the C++ backend")
+            sys.exit(1)
+    if options.run:
+        if options.inputs or options.watch or options.modules:
+            print("Usage: python3 compiler [options] --run <script>.lr [program arguments]")
+            sys.exit(1)
+        sys.exit(run(options.run, options))
+    if options.watch:
+        if not options.inputs:
+            print("Usage: python3 compiler --watch [options] <script>.lr...")
+            sys.exit(1)
+        options.time_phases = None
+        watch(options.inputs, options)
+        return
+
+    if len(options.inputs) != 1:
+        print("Usage: python3 compiler [options] <script>.lr")
+        sys.exit(1)
+    if not build(options.inputs[0], options):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
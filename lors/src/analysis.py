@@ -0,0 +1,591 @@
+from dataclasses import fields, is_dataclass
+from lors.src.ast_nodes import *
+
+# Intrinsics that modify their first argument in place
+MUTATING_INTRINSICS = {"append", "put", "remove", "scale", "axpy"}
+
+# Field names per node class; dataclasses.fields() is too slow to call per node
+_FIELD_NAMES = {}
+
+def field_names(node: ASTNode) -> tuple:
+    names = _FIELD_NAMES.get(type(node))
+    if names is None:
+        names = tuple(f.name for f in fields(node)) if is_dataclass(node) else ()
+        _FIELD_NAMES[type(node)] = names
+    return names
+
+def iter_children(node: ASTNode):
+    """Yield the direct AST children of a node, in field order."""
+    for name in field_names(node):
+        value = getattr(node, name)
+        if isinstance(value, ASTNode):
+            yield value
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, ASTNode):
+                    yield item
+
+def walk(node: ASTNode):
+    """Pre-order traversal over a node and all of its descendants."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current is None:
+            continue
+        yield current
+        children = list(iter_children(current))
+        stack.extend(reversed(children))
+
+def root_name(node: ASTNode) -> Optional[str]:
+    """Name of the variable at the base of an access chain (a[i].b.c -> a)."""
+    while isinstance(node, MemberAccess):
+        node = node.object
+    if isinstance(node, Identifier):
+        return node.name
+    if isinstance(node, ArrayAccess):
+        return node.array_name
+    if isinstance(node, MatrixAccess):
+        return node.matrix_name
+    return None
+
+def assigned_names(node: ASTNode) -> set:
+    """Names of every variable written inside a subtree.
+
+    Covers plain, element and member assignments as well as intrinsics that
+    mutate their first argument (append, put, ...).
+    """
+    names = set()
+    for child in walk(node):
+        if isinstance(child, (Assignment, ArrayAssignment, MatrixAssignment)):
+            names.add(child.name)
+        elif isinstance(child, MemberAssignment):
+            name = root_name(child.object)
+            if name:
+                names.add(name)
+        elif isinstance(child, FunctionCall) and child.name in MUTATING_INTRINSICS:
+            if child.arguments:
+                name = root_name(child.arguments[0])
+                if name:
+                    names.add(name)
+    return names
+
+def resized_names(node: ASTNode) -> set:
+    """Names of sequences that may be reallocated inside a subtree.
+
+    Unlike assigned_names, element and member writes are not included since
+    they leave the storage (and any iterator into it) intact.
+    """
+    names = set()
+    for child in walk(node):
+        if isinstance(child, Assignment):
+            names.add(child.name)
+        elif isinstance(child, FunctionCall) and child.name in MUTATING_INTRINSICS:
+            if child.arguments and isinstance(child.arguments[0], Identifier):
+                names.add(child.arguments[0].name)
+    return names
+
+def declared_names(node: ASTNode) -> set:
+    """Names of the variables declared (datum) inside a subtree."""
+    return {child.name for child in walk(node) if isinstance(child, VariableDeclaration)}
+
+def algorithm_names(program: Program) -> set:
+    """Names of every algorithm the program declares.
+
+    A call resolves to the algorithm of its name before any intrinsic, so an
+    intrinsic only applies to names missing here.
+    """
+    return {d.name for d in program.declarations if isinstance(d, FunctionDeclaration)}
+
+def called_names(node: ASTNode) -> set:
+    """Names of every algorithm or intrinsic called inside a subtree."""
+    return {child.name for child in walk(node) if isinstance(child, FunctionCall)}
+
+def read_names(node: ASTNode) -> set:
+    """Names of every variable read inside a subtree."""
+    names = set()
+    for child in walk(node):
+        if isinstance(child, Identifier):
+            names.add(child.name)
+        elif isinstance(child, ArrayAccess):
+            names.add(child.array_name)
+        elif isinstance(child, MatrixAccess):
+            names.add(child.matrix_name)
+    return names
+
+def global_uses(program: Program, used_names) -> dict:
+    """Map each algorithm to the globals used_names finds in it or its callees."""
+    global_names = {d.name for d in program.declarations if isinstance(d, VariableDeclaration)}
+    functions = {d.name: d for d in program.declarations
+                 if isinstance(d, FunctionDeclaration) and d.body is not None}
+
+    uses = {}
+    calls = {}
+    for name, func in functions.items():
+        local_names = declared_names(func.body) | {p.name for p in func.params}
+        uses[name] = (used_names(func.body) - local_names) & global_names
+        calls[name] = called_names(func.body) & functions.keys()
+
+    # Propagate through the call graph until nothing changes
+    changed = True
+    while changed:
+        changed = False
+        for name in functions:
+            for callee in calls[name]:
+                if not uses[callee] <= uses[name]:
+                    uses[name] |= uses[callee]
+                    changed = True
+    return uses
+
+def global_writes(program: Program) -> dict:
+    """Map each algorithm to the globals it writes, directly or via its callees."""
+    return global_uses(program, assigned_names)
+
+def global_reads(program: Program) -> dict:
+    """Map each algorithm to the globals it reads, directly or via its callees."""
+    return global_uses(program, read_names)
+
+def check_for_each(node: ForEachStatement, writes: dict):
+    """Reject 'cycle each' bodies that would invalidate the iteration.
+
+    writes maps each algorithm to the globals it writes (see global_writes):
+    an algorithm called from the body may resize a global being iterated.
+    """
+    if node.index_name and node.index_name in assigned_names(node.body):
+        raise SyntaxError(f"Loop index '{node.index_name}' cannot be assigned inside 'cycle each'")
+    if not isinstance(node.iterable, Identifier):
+        return
+    name = node.iterable.name
+    if name in resized_names(node.body):
+        raise SyntaxError(f"Sequence '{name}' cannot be resized while iterating over it")
+    for callee in sorted(called_names(node.body)):
+        if name in writes.get(callee, ()):
+            raise SyntaxError(f"Sequence '{name}' cannot be resized while iterating over it: "
+                              f"'{callee}' writes it")
+
+def check_parallel_races(node: ParallelForStatement, writes: dict, variable_type):
+    """Reject 'cycle parallel' bodies whose iterations could race.
+
+    writes maps each algorithm to the globals it writes (see global_writes)
+    and variable_type gives the declared type of a variable by name.
+    """
+    # Iterations may only write their own locals, the reduction targets
+    # and sequence elements (or matrix rows) indexed directly by the loop
+    # variable. A catalog insert and a sequence<state> bit write touch
+    # storage shared with other elements, so those are races too.
+    body_locals = declared_names(node.body)
+    reduced = {r.name for r in node.reductions}
+    for name in reduced & body_locals:
+        raise SyntaxError(f"Reduction variable '{name}' must be declared outside 'cycle parallel'")
+    private = body_locals | reduced
+
+    def separate_elements(name: str) -> bool:
+        container = variable_type(name)
+        return container is not None and (container.name == "matrix" or (
+            container.name == "sequence" and container.subtype is not None and container.subtype.name != "state"))
+
+    def owned_element(target: ASTNode) -> bool:
+        while isinstance(target, MemberAccess):
+            target = target.object
+        return (isinstance(target, ArrayAccess) and isinstance(target.index, Identifier)
+                and target.index.name == node.var_name and separate_elements(target.array_name))
+
+    def race(name: str):
+        raise SyntaxError(f"Data race in 'cycle parallel': '{name}' is shared between iterations "
+                          f"(declare it inside the loop or add it to 'reduce')")
+
+    # Control cannot leave the loop from inside an iteration
+    for child in walk(node.body):
+        if isinstance(child, ReturnStatement):
+            raise SyntaxError("'result' cannot be used inside 'cycle parallel'")
+        if isinstance(child, FunctionCall) and child.name == "exit_program" and child.name not in writes:
+            raise SyntaxError("exit_program() cannot be called inside 'cycle parallel'")
+    check_reductions(node)
+
+    for child in walk(node.body):
+        if isinstance(child, Assignment):
+            if child.name == node.var_name:
+                raise SyntaxError(f"Loop variable '{node.var_name}' cannot be assigned inside 'cycle parallel'")
+            if child.name not in private:
+                race(child.name)
+        elif isinstance(child, (ArrayAssignment, MatrixAssignment)):
+            # Each iteration owns the element (or matrix row) it indexes
+            index = child.index if isinstance(child, ArrayAssignment) else child.row
+            owned = isinstance(index, Identifier) and index.name == node.var_name
+            if child.name not in private and not (owned and separate_elements(child.name)):
+                race(child.name)
+        elif isinstance(child, MemberAssignment):
+            name = root_name(child.object)
+            if name not in private and not owned_element(child.object):
+                race(name)
+        elif isinstance(child, FunctionCall):
+            if child.name in MUTATING_INTRINSICS and child.arguments:
+                name = root_name(child.arguments[0])
+                if name not in private:
+                    race(name)
+            for name in sorted(writes.get(child.name, ())):
+                raise SyntaxError(f"Data race in 'cycle parallel': '{child.name}' writes global '{name}'")
+
+    # What is left are writes of owned elements, so an iteration may only
+    # read the element it owns (or the size, which no iteration changes)
+    written = set()
+    for child in walk(node.body):
+        if isinstance(child, (ArrayAssignment, MatrixAssignment)):
+            written.add(child.name)
+        elif isinstance(child, MemberAssignment):
+            written.add(root_name(child.object))
+    written -= private
+    if not written:
+        return
+    sizes = {id(child.arguments[0]) for child in walk(node.body) if isinstance(child, FunctionCall)
+             and child.name in ("length", "rows", "cols") and len(child.arguments) == 1}
+    for child in walk(node.body):
+        if isinstance(child, ArrayAccess):
+            name, index = child.array_name, child.index
+        elif isinstance(child, MatrixAccess):
+            name, index = child.matrix_name, child.row
+        elif isinstance(child, Identifier) and id(child) not in sizes:
+            name, index = child.name, None
+        else:
+            continue
+        if name in written and not (isinstance(index, Identifier) and index.name == node.var_name):
+            raise SyntaxError(f"Data race in 'cycle parallel': '{name}' is read at elements "
+                              f"other iterations write (index it by '{node.var_name}' only)")
+
+def check_reductions(node: ParallelForStatement):
+    """Reject uses of a reduction variable other than its reduction's update.
+
+    Each iteration works on its own copy of the variable, combined at the
+    end with the reduction's operator, so only updates of that form give
+    the result of a serial run: 'x = x + e' (or 'x = e + x', 'x = x - e')
+    for sum, and 'verify (e < x) then x = e; conclude' for min ('e > x'
+    for max). There is no other read or write of x, and e does not use x.
+    """
+    operators = {r.name: r.operator for r in node.reductions}
+    if not operators:
+        return
+    # The condition guarding each assignment directly inside a 'verify'
+    guards = {}
+    for child in walk(node.body):
+        if isinstance(child, IfStatement):
+            for stmt in child.then_branch.statements:
+                guards[id(stmt)] = child.condition
+
+    def uses(expr: ASTNode, name: str) -> bool:
+        return any(isinstance(n, Identifier) and n.name == name for n in walk(expr))
+
+    def is_name(expr: ASTNode, name: str) -> bool:
+        return isinstance(expr, Identifier) and expr.name == name
+
+    def update_reads(stmt: Assignment, operator: str) -> Optional[list]:
+        """The reads of x that belong to the update form, or None if it is not one."""
+        x, value = stmt.name, stmt.value
+        if operator == "sum":
+            if not isinstance(value, BinaryOp) or value.left is None:
+                return None
+            if value.operator == "+" and is_name(value.right, x) and not uses(value.left, x):
+                return [value.right]
+            if value.operator in ("+", "-") and is_name(value.left, x) and not uses(value.right, x):
+                return [value.left]
+            return None
+        if uses(value, x):
+            return None
+        condition = guards.get(id(stmt))
+        if not isinstance(condition, BinaryOp) or condition.left is None:
+            return None
+        below, above = (("<", "<="), (">", ">=")) if operator == "min" else ((">", ">="), ("<", "<="))
+        if condition.operator in below and condition.left == value and is_name(condition.right, x):
+            return [condition.right]
+        if condition.operator in above and is_name(condition.left, x) and condition.right == value:
+            return [condition.left]
+        return None
+
+    allowed = set()
+    for child in walk(node.body):
+        if isinstance(child, Assignment) and child.name in operators:
+            operator = operators[child.name]
+            reads = update_reads(child, operator)
+            if reads is None:
+                form = {"sum": f"{child.name} = {child.name} + ...",
+                        "min": f"verify (... < {child.name}) then {child.name} = ...; conclude",
+                        "max": f"verify (... > {child.name}) then {child.name} = ...; conclude"}[operator]
+                raise SyntaxError(f"Reduction variable '{child.name}' of 'reduce {operator}' can only be "
+                                  f"updated as '{form}' inside 'cycle parallel'")
+            allowed.update(id(read) for read in reads)
+    for child in walk(node.body):
+        if isinstance(child, Identifier) and child.name in operators and id(child) not in allowed:
+            raise SyntaxError(f"Reduction variable '{child.name}' cannot be read inside 'cycle parallel' "
+                              f"except to update it")
+
+def check_dispatch(node: DispatchExpression, functions: dict, writes: dict, reads: dict):
+    """Reject 'dispatch' of anything but an algorithm that leaves globals alone.
+
+    functions maps algorithm names to their declarations, and writes and
+    reads map each algorithm to the globals it writes and reads (see
+    global_writes and global_reads).
+    """
+    func = functions.get(node.name)
+    if func is None or node.name == "genesis":
+        raise SyntaxError(f"'dispatch' needs an algorithm, '{node.name}' is not one")
+    if len(node.arguments) != len(func.params):
+        raise SyntaxError(f"'{node.name}' expects {len(func.params)} argument(s), got {len(node.arguments)}")
+    # The task runs alongside its caller, which may be using the global
+    for name in sorted(writes.get(node.name, ())):
+        raise SyntaxError(f"Cannot dispatch '{node.name}': it writes global '{name}'")
+    # ... or changing it while the task reads it
+    for name in sorted(reads.get(node.name, ())):
+        for algorithm, written in writes.items():
+            if name in written:
+                raise SyntaxError(f"Cannot dispatch '{node.name}': it reads global '{name}', "
+                                  f"which '{algorithm}' writes")
+
+def check_views(program: Program):
+    """Reject views that could outlive the series they refer to.
+
+    A view is only held in a variable or parameter: it cannot be returned,
+    stored in a structure, sequence or catalog, or written through (it can
+    be set to refer to another series). It refers to a series
+    variable, a literal or a substring of one, never a temporary, and not
+    to a series that may reallocate or be destroyed while the view exists:
+    a local its algorithm writes or that is declared in a block nested
+    inside the view's, or a global any algorithm writes.
+    """
+    for node in walk(program):
+        if isinstance(node, TypeNode) and node.name in ("sequence", "catalog") and "view" in (
+                getattr(node.subtype, "name", None), getattr(node.value_subtype, "name", None)):
+            raise SyntaxError("A view cannot be stored in a sequence or catalog; use series")
+        elif isinstance(node, StructDeclaration):
+            for field in node.fields:
+                if field.var_type.name == "view":
+                    raise SyntaxError(f"Field '{field.name}' of '{node.name}' cannot be a view; use series")
+        elif isinstance(node, FunctionDeclaration) and node.return_type.name == "view":
+            raise SyntaxError(f"Algorithm '{node.name}' cannot return a view; return a series")
+
+    global_types = {d.name: d.var_type for d in program.declarations if isinstance(d, VariableDeclaration)}
+    writes = None
+
+    def lookup(name: str, scopes: list) -> tuple:
+        """(depth of the block declaring name, its type); depth -1 is global."""
+        for depth in range(len(scopes) - 1, -1, -1):
+            if name in scopes[depth]:
+                return depth, scopes[depth][name]
+        return -1, global_types.get(name)
+
+    def check_source(node: ASTNode, view: str, func: Optional[FunctionDeclaration], scopes: list):
+        nonlocal writes
+        if isinstance(node, FunctionCall) and node.name == "substring" and len(node.arguments) == 3:
+            check_source(node.arguments[0], view, func, scopes)
+            return
+        if isinstance(node, Literal) and node.value_type == "series":
+            return
+        if not isinstance(node, (Identifier, MemberAccess, ArrayAccess)):
+            raise SyntaxError("A view must refer to a series variable, a literal or a substring of one, "
+                              "not to a temporary value")
+        name = root_name(node)
+        depth, source_type = lookup(name, scopes)
+        # A series declared in a nested block is destroyed when the block ends
+        if depth > lookup(view, scopes)[0]:
+            raise SyntaxError(f"View '{view}' would outlive '{name}', which is declared in a nested block")
+        if source_type is not None and source_type.name == "view":
+            return
+        if depth >= 0:
+            if name in assigned_names(func.body):
+                raise SyntaxError(f"Cannot take a view of '{name}' in '{func.name}', which writes it")
+            return
+        if writes is None:
+            writes = global_writes(program)
+        for algorithm, written in writes.items():
+            if name in written:
+                raise SyntaxError(f"Cannot take a view of global '{name}', which '{algorithm}' writes")
+
+    def visit(node: ASTNode, func: FunctionDeclaration, scopes: list, bound: tuple = ()):
+        if isinstance(node, Block):
+            # Loop variables belong to the body they are bound in
+            scopes.append(dict.fromkeys(bound))
+            for stmt in node.statements:
+                visit(stmt, func, scopes)
+            scopes.pop()
+        elif isinstance(node, VariableDeclaration):
+            scopes[-1][node.name] = node.var_type
+            if node.var_type.name == "view" and node.initializer:
+                check_source(node.initializer, node.name, func, scopes)
+        elif isinstance(node, Assignment):
+            target_type = lookup(node.name, scopes)[1]
+            if target_type is not None and target_type.name == "view":
+                check_source(node.value, node.name, func, scopes)
+        elif isinstance(node, (ArrayAssignment, FunctionCall)):
+            if isinstance(node, ArrayAssignment):
+                name = node.name
+            elif node.name in MUTATING_INTRINSICS and node.arguments:
+                name = root_name(node.arguments[0])
+            else:
+                return
+            target_type = lookup(name, scopes)[1]
+            if target_type is not None and target_type.name == "view":
+                raise SyntaxError(f"View '{name}' is read-only; copy it into a series to change it")
+        elif isinstance(node, ForEachStatement):
+            visit(node.body, func, scopes, (node.item_name, node.index_name))
+        elif isinstance(node, ParallelForStatement):
+            visit(node.body, func, scopes, (node.var_name,))
+        else:
+            for child in iter_children(node):
+                visit(child, func, scopes)
+
+    for decl in program.declarations:
+        if isinstance(decl, VariableDeclaration) and decl.var_type.name == "view" and decl.initializer:
+            check_source(decl.initializer, decl.name, None, [])
+        elif isinstance(decl, FunctionDeclaration) and decl.body is not None:
+            visit(decl.body, decl, [{p.name: p.param_type for p in decl.params}])
+
+# Parameter types a memoised algorithm's cache can be keyed on
+MEMO_KEY_TYPES = {"whole", "precise", "state", "series", "view"}
+
+def check_memoised(func: FunctionDeclaration, pure: set):
+    """Reject 'memoised' on an algorithm whose results cannot be cached.
+
+    pure is the set of pure algorithms (see pure_algorithms).
+    """
+    if func.name not in pure:
+        raise SyntaxError(f"Algorithm '{func.name}' cannot be memoised: its result must depend only on "
+                          f"its arguments (no globals, input, output or impure calls)")
+    if func.return_type.name == "void":
+        raise SyntaxError(f"Algorithm '{func.name}' cannot be memoised: it returns nothing")
+    for param in func.params:
+        if param.param_type.name not in MEMO_KEY_TYPES:
+            raise SyntaxError(f"Algorithm '{func.name}' cannot be memoised: parameter '{param.name}' must be "
+                              f"whole, precise, state or series to key the cache")
+
+def memo_target(node: FunctionCall, memoised: list) -> str:
+    """The algorithm memo_hits(f) / memo_misses(f) reads the counters of."""
+    if len(node.arguments) != 1 or not isinstance(node.arguments[0], Identifier) \
+            or node.arguments[0].name not in memoised:
+        raise SyntaxError(f"{node.name}() needs the name of a memoised algorithm")
+    return node.arguments[0].name
+
+def memoised_algorithms(program: Program) -> list:
+    """Names of the memoised algorithms, in declaration order."""
+    return [d.name for d in program.declarations if isinstance(d, FunctionDeclaration) and d.memoised]
+
+# Intrinsics without side effects beyond their (by-value) arguments.
+# reveal, inquire, the file/argument/environment functions and exit_program
+# are deliberately absent.
+PURE_INTRINSICS = {
+    "length", "char_at", "substring", "ascii", "character", "to_upper", "to_lower", "reverse",
+    "to_string", "to_integer", "to_precise",
+    "is_digit", "is_alpha", "is_alnum", "is_space", "is_upper", "is_lower",
+    "root", "power", "absolute", "sine", "cosine", "tangent",
+    "sequence", "catalog", "append", "put", "get", "has", "remove", "size", "keys",
+    "sum", "dot", "scale", "axpy", "elementwise_add", "elementwise_mul",
+    "min_of", "max_of", "mean", "variance",
+    "zeros", "identity", "matmul", "transpose", "solve", "rows", "cols",
+}
+
+# Types of values a constexpr algorithm may take, return and declare (C++17)
+CONSTEXPR_TYPES = {"whole", "precise", "state"}
+
+def constant_argument(node: ASTNode) -> bool:
+    if isinstance(node, BinaryOp) and node.operator == "-" and node.left is None:
+        node = node.right
+    return isinstance(node, Literal)
+
+def pure_algorithms(program: Program, constant_calls: dict = None) -> set:
+    """Algorithms whose result depends only on their arguments.
+
+    A pure algorithm performs no I/O, neither reads nor writes globals, and
+    only calls pure intrinsics, structure constructors and pure algorithms.
+    If given, constant_calls is filled with the names each algorithm body
+    calls with literal arguments only.
+    """
+    global_names = {d.name for d in program.declarations if isinstance(d, VariableDeclaration)}
+    struct_names = {d.name for d in program.declarations if isinstance(d, StructDeclaration)}
+    functions = {d.name: d for d in program.declarations if isinstance(d, FunctionDeclaration) and d.body is not None}
+    intrinsics = PURE_INTRINSICS - algorithm_names(program)
+
+    calls = {}
+    for name, func in functions.items():
+        # One walk per body: large programs have thousands of algorithms
+        local_names = {p.name for p in func.params}
+        used = set()
+        called = set()
+        constant = set()
+        effects = False
+        for child in walk(func.body):
+            if isinstance(child, VariableDeclaration):
+                local_names.add(child.name)
+            elif isinstance(child, Identifier):
+                used.add(child.name)
+            elif isinstance(child, (Assignment, ArrayAssignment, MatrixAssignment)):
+                used.add(child.name)
+            elif isinstance(child, (ArrayAccess, MatrixAccess)):
+                used.add(root_name(child))
+            elif isinstance(child, FunctionCall):
+                called.add(child.name)
+                if all(constant_argument(arg) for arg in child.arguments):
+                    constant.add(child.name)
+            elif isinstance(child, (InquireExpression, DispatchExpression)):
+                # Reads input, or starts work that outlives the call
+                effects = True
+        if constant_calls is not None:
+            constant_calls[name] = constant
+        if name == "genesis" or effects or (used - local_names) & global_names:
+            continue
+        called = called - intrinsics - struct_names
+        if called - functions.keys():
+            continue
+        calls[name] = called
+
+    # Drop algorithms that call an impure one until nothing changes
+    pure = set(calls)
+    changed = True
+    while changed:
+        changed = False
+        for name in list(pure):
+            if not calls[name] <= pure:
+                pure.discard(name)
+                changed = True
+    return pure
+
+def constexpr_algorithms(program: Program, pure: set) -> set:
+    """Pure algorithms that are also valid C++17 constexpr functions.
+
+    Only whole/precise/state values, initialised locals, plain control flow
+    and calls to other such algorithms qualify.
+    """
+    functions = {d.name: d for d in program.declarations
+                 if isinstance(d, FunctionDeclaration) and d.body is not None and d.name in pure}
+    allowed = (Block, VariableDeclaration, Assignment, IfStatement, WhileStatement, ReturnStatement,
+               ExpressionStatement, BinaryOp, Literal, Identifier, FunctionCall, TypeNode)
+
+    calls = {}
+    for name, func in functions.items():
+        # A memoised algorithm updates its cache, so it is never constexpr
+        if func.memoised:
+            continue
+        types = [func.return_type] + [p.param_type for p in func.params]
+        if any(t.name not in CONSTEXPR_TYPES for t in types):
+            continue
+        called = set()
+        for node in walk(func.body):
+            if not isinstance(node, allowed):
+                break
+            if isinstance(node, VariableDeclaration):
+                if node.var_type.name not in CONSTEXPR_TYPES or node.initializer is None:
+                    break
+            elif isinstance(node, Literal) and node.value_type == "series":
+                break
+            elif isinstance(node, FunctionCall):
+                # Intrinsics (std::sqrt, ...) are not constexpr
+                if node.name in PURE_INTRINSICS and node.name not in functions:
+                    break
+                called.add(node.name)
+        else:
+            calls[name] = called
+
+    eligible = set(calls)
+    changed = True
+    while changed:
+        changed = False
+        for name in list(eligible):
+            if not calls[name] <= eligible:
+                eligible.discard(name)
+                changed = True
+    return eligible
@@ -4,7 +4,11 @@ from enum import Enum
 
 # Base class for all AST nodes
 class ASTNode:
-    pass
+    # Source position of declarations and statements, set by the parser.
+    # Plain class attributes rather than dataclass fields, so they take no
+    # part in construction, comparison or traversal.
+    file = None
+    line = 0
 
 @dataclass
 class Program(ASTNode):
@@ -13,7 +17,8 @@ class Program(ASTNode):
 @dataclass
 class TypeNode(ASTNode):
     name: str
-    subtype: Optional['TypeNode'] = None # For arrays
+    subtype: Optional['TypeNode'] = None # For arrays (key type for catalogs)
+    value_subtype: Optional['TypeNode'] = None # For catalogs
 
 @dataclass
 class VariableDeclaration(ASTNode):
@@ -35,6 +40,12 @@ class ArrayAccess(ASTNode):
     array_name: str
     index: ASTNode
 
+@dataclass
+class MatrixAccess(ASTNode):
+    matrix_name: str
+    row: ASTNode
+    col: ASTNode
+
 @dataclass
 class MemberAccess(ASTNode):
     object: ASTNode
@@ -50,6 +61,11 @@ class FunctionDeclaration(ASTNode):
     params: List['Parameter']
     return_type: TypeNode
     body: Optional[Block] # Changed to Optional for forward declarations
+    # Set by the fold pass on pure algorithms that are valid C++ constexpr functions
+    constexpr = False
+    # 'memoised' algorithms cache their results; a capacity of 0 is unbounded
+    memoised = False
+    memo_capacity = 0
 
 @dataclass
 class Parameter(ASTNode):
@@ -67,10 +83,35 @@ class WhileStatement(ASTNode):
     condition: ASTNode
     body: Block
 
+@dataclass
+class ForEachStatement(ASTNode):
+    item_name: str
+    iterable: ASTNode
+    body: Block
+    index_name: Optional[str] = None
+
+@dataclass
+class Reduction(ASTNode):
+    operator: str # 'sum', 'min', 'max'
+    name: str
+
+@dataclass
+class ParallelForStatement(ASTNode):
+    var_name: str
+    start: ASTNode
+    end: ASTNode
+    reductions: List[Reduction]
+    body: Block
+
 @dataclass
 class ReturnStatement(ASTNode):
     value: ASTNode
 
+@dataclass
+class ContinueStatement(ASTNode):
+    # Starts the next iteration of the enclosing 'cycle'; only made by the tail call pass
+    pass
+
 @dataclass
 class ExpressionStatement(ASTNode):
     expression: ASTNode
@@ -86,6 +127,13 @@ class ArrayAssignment(ASTNode):
     index: ASTNode
     value: ASTNode
 
+@dataclass
+class MatrixAssignment(ASTNode):
+    name: str
+    row: ASTNode
+    col: ASTNode
+    value: ASTNode
+
 @dataclass
 class MemberAssignment(ASTNode):
     object: ASTNode
@@ -103,6 +151,8 @@ class BinaryOp(ASTNode):
 class Literal(ASTNode):
     value: Union[int, float, str, bool]
     value_type: str # 'whole', 'precise', 'series', 'state'
+    # Set on results of compile-time evaluation, which have the type long long
+    long_long = False
 
 @dataclass
 class Identifier(ASTNode):
@@ -116,3 +166,9 @@ class FunctionCall(ASTNode):
 @dataclass
 class InquireExpression(ASTNode):
     pass
+
+@dataclass
+class DispatchExpression(ASTNode):
+    # dispatch name(arguments): runs the algorithm on the task pool, yields a future
+    name: str
+    arguments: List[ASTNode]
@@ -1,9 +1,127 @@
+import multiprocessing
 from lors.src.ast_nodes import *
+from lors.src.analysis import *
+from lors.src.hoist import HOISTED_TYPE
+from lors.src.runtime import (INQUIRE, FILE_WRITE, FILE_READ, EXECUTE_SYSTEM, STR_REVERSE, STR_UPPER, STR_LOWER,
+                              STR_SUBSTR, LORS_VIEW, CATALOG_KEYS, NUMERIC_KERNELS, DENSE_MATRIX, TASK_POOL, LORS_MEMO,
+                              PROFILER, ALLOC_TRACER)
+
+# Standard headers in the order the prelude includes them
+HEADERS = ["<iostream>", "<string>", "<string_view>", "<vector>", "<cmath>", "<fstream>", "<cstdlib>", "<cstdio>",
+           "<sstream>", "<algorithm>", "<unordered_map>", "<cctype>", "<chrono>", "<atomic>", "<new>",
+           "<thread>", "<future>", "<mutex>", "<condition_variable>", "<deque>", "<functional>", "<memory>",
+           "<list>", "<tuple>"]
+
+# Runtime helpers in prelude order: (headers it needs, code)
+HELPERS = {
+    "inquire": ((), INQUIRE),
+    "file_write": (("<fstream>",), FILE_WRITE),
+    "file_read": (("<fstream>", "<sstream>"), FILE_READ),
+    "execute_system": (("<cstdlib>",), EXECUTE_SYSTEM),
+    "str_reverse_helper": (("<algorithm>",), STR_REVERSE),
+    "str_upper_helper": (("<cctype>",), STR_UPPER),
+    "str_lower_helper": (("<cctype>",), STR_LOWER),
+    "str_substr_helper": (("<string_view>",), STR_SUBSTR),
+    "lors_view": (("<string_view>",), LORS_VIEW),
+    "catalog_keys_helper": (("<algorithm>", "<unordered_map>", "<vector>"), CATALOG_KEYS),
+    "numeric_kernels": (("<algorithm>", "<vector>"), NUMERIC_KERNELS),
+    "dense_matrix": (("<algorithm>", "<cmath>", "<cstdlib>", "<vector>"), DENSE_MATRIX),
+    "task_pool": (("<algorithm>", "<atomic>", "<chrono>", "<condition_variable>", "<deque>", "<functional>",
+                   "<future>", "<memory>", "<mutex>", "<thread>", "<vector>"), TASK_POOL),
+    "lors_memo": (("<atomic>", "<functional>", "<list>", "<mutex>", "<tuple>", "<unordered_map>"), LORS_MEMO),
+}
+
+PROFILER_HEADERS = ("<algorithm>", "<atomic>", "<chrono>", "<cstdio>", "<cstdlib>", "<fstream>", "<vector>")
+ALLOC_TRACER_HEADERS = ("<new>",)
+
+# What the code generated for each intrinsic needs in the prelude: headers
+# (in <>) and HELPERS. Intrinsics missing here only need <iostream> and <string>.
+MATRIX_INTRINSICS = ["zeros", "identity", "matmul", "transpose", "solve", "rows", "cols"]
+INTRINSIC_NEEDS = {
+    "env_get": ("<cstdlib>",),
+    "exit_program": ("<cstdlib>",),
+    "file_exists": ("<fstream>",),
+    "file_remove": ("<cstdio>",),
+    "file_write": ("file_write",),
+    "file_read": ("file_read",),
+    "execute_system": ("execute_system",),
+    "substring": ("str_substr_helper",),
+    "to_upper": ("str_upper_helper",),
+    "to_lower": ("str_lower_helper",),
+    "reverse": ("str_reverse_helper",),
+    "keys": ("catalog_keys_helper",),
+    "await": ("task_pool",),
+    "root": ("<cmath>",),
+    "power": ("<cmath>",),
+    "absolute": ("<cmath>", "<cstdlib>"),
+    "sine": ("<cmath>",),
+    "cosine": ("<cmath>",),
+    "tangent": ("<cmath>",),
+    **{name: ("<cctype>",) for name in ["is_digit", "is_alpha", "is_alnum", "is_space", "is_upper", "is_lower"]},
+    **{name: ("numeric_kernels",) for name in ["sum", "dot", "scale", "axpy", "elementwise_add",
+                                               "elementwise_mul", "min_of", "max_of", "mean", "variance"]},
+    **{name: ("dense_matrix",) for name in MATRIX_INTRINSICS},
+}
+
+# Intrinsics whose result is a series (see call_type)
+SERIES_INTRINSICS = {"arg_value", "env_get", "file_read", "substring", "to_upper", "to_lower", "reverse",
+                     "to_string", "character"}
+
+# Below this many algorithm bodies forking workers costs more than it saves
+MIN_PARALLEL_FUNCTIONS = 64
+
+# (generator, declarations, global types per declaration) inherited by forked workers
+_shard_state = None
+
+def _generate_shard(indices):
+    codegen, declarations, scopes = _shard_state
+    results = []
+    for index in indices:
+        codegen.code = []
+        codegen.var_types = scopes[index]
+        try:
+            codegen.visit(declarations[index])
+        except Exception as e:
+            results.append((index, None, e))
+            break
+        # One string per body pickles far faster than its list of lines
+        results.append((index, "\n".join(codegen.code), None))
+    return results, codegen.compile_flags, codegen.used
 
 class CodeGenerator:
-    def __init__(self):
+    def __init__(self, instrument: bool = False, jobs: int = 1, trace_alloc: bool = False,
+                 line_directives: bool = False):
         self.code = []
         self.indent_level = 0
+        # --instrument: wrap every algorithm body in a LorsScope timer
+        self.instrument = instrument
+        # --trace-alloc: count heap allocations per algorithm, via the same scopes
+        self.trace_alloc = trace_alloc
+        self.scoped = instrument or trace_alloc
+        self.profile_ids = {}
+        # Declared types of the variables visible at the current point
+        self.var_types = {}
+        # Extra g++ flags the generated code needs (e.g. -fopenmp)
+        self.compile_flags = set()
+        # Headers and HELPERS the code visited so far needs (see emit_prelude)
+        self.used = set()
+        # Globals written and read by each algorithm; computed on first use as
+        # only 'cycle parallel' and 'dispatch' need them (see writes_by_algorithm)
+        self.program = None
+        self.global_writes = None
+        self.global_reads = None
+        self.functions = None
+        self.structs = None
+        # Pure and memoised algorithms, also computed on first use
+        self.pure = None
+        self.memoised = None
+        # Worker processes for algorithm bodies (see visit_declarations_parallel)
+        self.jobs = jobs
+        # -g: map the generated code back to the .lr lines with #line
+        self.line_directives = line_directives
+        # Emit the algorithms the fold pass marked constexpr as such; a
+        # scope object is not a literal type, so profiled builds stay plain
+        self.constexpr = not self.scoped
 
     def generate(self, node: ASTNode) -> str:
         self.visit(node)
@@ -12,87 +130,178 @@ class CodeGenerator:
     def emit(self, line: str):
         self.code.append("    " * self.indent_level + line)
 
+    def emit_block(self, text: str):
+        for line in text.strip("\n").split("\n"):
+            self.emit(line)
+        self.emit("")
+
     def visit(self, node: ASTNode):
+        if self.line_directives and node.line:
+            self.emit_line_directive(node)
         method_name = f'visit_{type(node).__name__}'
         visitor = getattr(self, method_name, self.generic_visit)
         return visitor(node)
 
+    def emit_line_directive(self, node: ASTNode):
+        if node.file is None:
+            self.emit(f"#line {node.line}")
+        else:
+            path = node.file.replace("\\", "\\\\").replace('"', '\\"')
+            self.emit(f'#line {node.line} "{path}"')
+
     def generic_visit(self, node: ASTNode):
         raise Exception(f'No visit_{type(node).__name__} method')
 
     def visit_Program(self, node: Program):
-        self.emit("#include <iostream>")
-        self.emit("#include <string>")
-        self.emit("#include <vector>")
-        self.emit("#include <cmath>")
-        self.emit("#include <fstream>")
-        self.emit("#include <cstdlib>")
-        self.emit("#include <cstdio>")
-        self.emit("#include <sstream>")
-        self.emit("#include <algorithm>")
+        self.program = node
+        check_views(node)
+        if self.scoped:
+            for decl in node.declarations:
+                if isinstance(decl, FunctionDeclaration) and decl.body is not None:
+                    self.profile_ids.setdefault(decl.name, len(self.profile_ids))
+        bodies = sum(1 for d in node.declarations if isinstance(d, FunctionDeclaration) and d.body is not None)
+        if self.jobs > 1 and bodies >= MIN_PARALLEL_FUNCTIONS and "fork" in multiprocessing.get_all_start_methods():
+            self.visit_declarations_parallel(node.declarations)
+        else:
+            for decl in node.declarations:
+                self.visit(decl)
+        # The prelude goes first but is generated last, once it is known what the program uses
+        program = self.code
+        self.code = []
+        self.emit_prelude()
+        self.code += program
+
+    def visit_declarations_parallel(self, declarations: List[ASTNode]):
+        """Generate algorithm bodies in forked workers; output matches the serial loop.
+
+        Structures, globals and prototypes are visited here in order, as they
+        update the types later declarations see; each body only needs those
+        global types, so bodies are shared out in contiguous shards and their
+        lines stitched back in declaration order.
+        """
+        global _shard_state
+        sections = [None] * len(declarations)
+        scopes = {}
+        pending = []
+        error = None
+        captured = False
+        for index, decl in enumerate(declarations):
+            if isinstance(decl, FunctionDeclaration) and decl.body is not None:
+                # visit_FunctionDeclaration copies var_types, so one dict can serve many bodies
+                scopes[index] = self.var_types
+                captured = True
+                pending.append(index)
+                continue
+            if captured and isinstance(decl, VariableDeclaration):
+                self.var_types = dict(self.var_types)
+                captured = False
+            self.code = []
+            try:
+                self.visit(decl)
+            except Exception as e:
+                error = (index, e)
+                break
+            sections[index] = "\n".join(self.code)
+
+        shard_count = max(min(len(pending), self.jobs * 4), 1)
+        shards = [pending[i * len(pending) // shard_count:(i + 1) * len(pending) // shard_count]
+                  for i in range(shard_count)]
+        _shard_state = (self, declarations, scopes)
+        try:
+            with multiprocessing.get_context("fork").Pool(self.jobs) as pool:
+                results = pool.map(_generate_shard, shards, chunksize=1)
+        finally:
+            _shard_state = None
+
+        for shard, flags, used in results:
+            self.compile_flags |= flags
+            self.used |= used
+            for index, text, e in shard:
+                if e is not None:
+                    if error is None or index < error[0]:
+                        error = (index, e)
+                else:
+                    sections[index] = text
+        if error is not None:
+            # The first failing declaration in program order, as in the serial path
+            raise error[1]
+
+        # Every declaration emits at least one line, so joining the sections
+        # reproduces the serial "\n".join(self.code) exactly
+        self.code = [text for text in sections if text is not None]
+
+    def algorithms(self) -> dict:
+        if self.functions is None:
+            self.functions = {d.name: d for d in self.program.declarations if isinstance(d, FunctionDeclaration)}
+        return self.functions
+
+    def structures(self) -> dict:
+        if self.structs is None:
+            self.structs = {d.name: d for d in self.program.declarations if isinstance(d, StructDeclaration)}
+        return self.structs
+
+    def writes_by_algorithm(self) -> dict:
+        if self.global_writes is None:
+            self.global_writes = global_writes(self.program)
+        return self.global_writes
+
+    def reads_by_algorithm(self) -> dict:
+        if self.global_reads is None:
+            self.global_reads = global_reads(self.program)
+        return self.global_reads
+
+    def pure_algorithms(self) -> set:
+        if self.pure is None:
+            self.pure = pure_algorithms(self.program)
+        return self.pure
+
+    def memoised_algorithms(self) -> list:
+        if self.memoised is None:
+            self.memoised = memoised_algorithms(self.program)
+        return self.memoised
+
+    def emit_prelude(self):
+        """Emit the headers and runtime helpers used by the code generated so far."""
+        helpers = [name for name in HELPERS if name in self.used]
+        headers = {"<iostream>", "<string>"} | {h for h in self.used if h.startswith("<")}
+        for name in helpers:
+            headers.update(HELPERS[name][0])
+        if self.scoped:
+            headers.update(PROFILER_HEADERS)
+        if self.trace_alloc:
+            headers.update(ALLOC_TRACER_HEADERS)
+        for header in HEADERS:
+            if header in headers:
+                self.emit(f"#include {header}")
         self.emit("")
         self.emit("// Generated by Lors Compiler")
         self.emit("// Globals for CLI args")
-        self.emit("int global_argc;")
-        self.emit("char** global_argv;")
-        self.emit("")
-        self.emit("struct InquireProxy {")
-        self.emit("    template<typename T>")
-        self.emit("    operator T() {")
-        self.emit("        T val;")
-        self.emit("        std::cin >> val;")
-        self.emit("        return val;")
-        self.emit("    }")
-        self.emit("};")
-        self.emit("InquireProxy inquire() { return InquireProxy(); }")
-        self.emit("")
-        self.emit("void file_write(std::string path, std::string content) {")
-        self.emit("    std::ofstream f(path);")
-        self.emit("    f << content;")
-        self.emit("    f.close();")
-        self.emit("}")
-        self.emit("")
-        self.emit("std::string file_read(std::string path) {")
-        self.emit("    std::ifstream f(path);")
-        self.emit("    std::stringstream buffer;")
-        self.emit("    buffer << f.rdbuf();")
-        self.emit("    return buffer.str();")
-        self.emit("}")
-        self.emit("")
-        self.emit("void execute_system(std::string cmd) {")
-        self.emit("    std::system(cmd.c_str());")
-        self.emit("}")
-        self.emit("")
-        self.emit("// String Library Helpers")
-        self.emit("std::string str_reverse_helper(std::string s) {")
-        self.emit("    std::string rev = s;")
-        self.emit("    std::reverse(rev.begin(), rev.end());")
-        self.emit("    return rev;")
-        self.emit("}")
-        self.emit("std::string str_upper_helper(std::string s) {")
-        self.emit("    std::string res = s;")
-        self.emit("    for(auto &c : res) c = toupper(c);")
-        self.emit("    return res;")
-        self.emit("}")
-        self.emit("std::string str_lower_helper(std::string s) {")
-        self.emit("    std::string res = s;")
-        self.emit("    for(auto &c : res) c = tolower(c);")
-        self.emit("    return res;")
-        self.emit("}")
-        self.emit("std::string str_substr_helper(std::string s, long long start, long long len) {")
-        self.emit("    if (start < 0 || start >= s.length()) return \"\";")
-        self.emit("    return s.substr(start, len);")
-        self.emit("}")
+        self.emit("inline int global_argc;")
+        self.emit("inline char** global_argv;")
         self.emit("")
+        for name in helpers:
+            self.emit_block(HELPERS[name][1])
+        if "lors_memo" in self.used:
+            for name in self.memoised_algorithms():
+                self.emit(f"inline LorsMemoStats lors_memo_stats_{name};")
+            self.emit("")
 
-        for decl in node.declarations:
-            self.visit(decl)
+        if self.scoped:
+            names = ", ".join(f'"{name}"' for name in self.profile_ids)
+            self.emit(f"static const int lors_profile_count = {max(len(self.profile_ids), 1)};")
+            self.emit(f"static const char* lors_profile_names[lors_profile_count] = {{ {names} }};")
+            self.emit_block(PROFILER)
+            if self.trace_alloc:
+                self.emit_block(ALLOC_TRACER)
 
     def visit_StructDeclaration(self, node: StructDeclaration):
         self.emit(f"struct {node.name} {{")
         self.indent_level += 1
+        outer_types = self.var_types
+        self.var_types = {}
         for field in node.fields:
             self.visit(field)
+        self.var_types = outer_types
 
         # Add constructor for convenience: Point(x, y)
         if node.fields:
@@ -112,9 +321,15 @@ class CodeGenerator:
         self.emit("")
 
     def visit_VariableDeclaration(self, node: VariableDeclaration):
+        self.var_types[node.name] = node.var_type
+        if node.var_type.name == HOISTED_TYPE:
+            # A hoisted temporary (see hoist.py) has the Lors type of its value
+            self.var_types[node.name] = self.type_of(node.initializer) or node.var_type
         cpp_type = self.map_type_node(node.var_type)
         init_val = ""
-        if node.initializer:
+        if node.initializer and node.var_type.name == "view":
+            init_val = f" = {self.view_expression(node.initializer)}"
+        elif node.initializer:
             init_val = f" = {self.visit_expression(node.initializer)}"
         self.emit(f"{cpp_type} {node.name}{init_val};")
 
@@ -124,6 +339,11 @@ class CodeGenerator:
         name = node.name
         param_str = ""
 
+        global_types = self.var_types
+        self.var_types = dict(global_types)
+        for param in node.params:
+            self.var_types[param.name] = param.param_type
+
         if node.name == "genesis":
             name = "main"
             if cpp_ret_type != "int":
@@ -135,25 +355,68 @@ class CodeGenerator:
             self.emit("    global_argv = argv;")
             # Main always has body
             self.indent_level += 1
+            if self.instrument:
+                self.emit("std::atexit(lors_profile_report);")
+            if self.trace_alloc:
+                self.emit("std::atexit(lors_alloc_report);")
+            if self.scoped:
+                self.emit_scope(node)
             self.visit(node.body)
             self.indent_level -= 1
             self.emit("}")
         else:
-            params = []
-            for param in node.params:
-                params.append(f"{self.map_type_node(param.param_type)} {param.name}")
-            param_str = ", ".join(params)
-
             if node.body is None:
                 # Forward declaration / Prototype
-                self.emit(f"{cpp_ret_type} {name}({param_str});")
+                self.emit(self.prototype(node))
+            elif node.memoised:
+                self.emit_memoised(node, cpp_ret_type)
             else:
-                self.emit(f"{cpp_ret_type} {name}({param_str}) {{")
+                params = []
+                for param in node.params:
+                    params.append(f"{self.map_type_node(param.param_type)} {param.name}")
+                param_str = ", ".join(params)
+                self.emit(f"{self.specifier(node)}{cpp_ret_type} {name}({param_str}) {{")
                 self.indent_level += 1
+                if self.scoped:
+                    self.emit_scope(node)
                 self.visit(node.body)
                 self.indent_level -= 1
                 self.emit("}")
         self.emit("")
+        self.var_types = global_types
+
+    def emit_memoised(self, node: FunctionDeclaration, cpp_ret_type: str):
+        """The body runs as a lambda, only when the cache misses."""
+        check_memoised(node, self.pure_algorithms())
+        self.used.add("lors_memo")
+        # A view argument is copied into the key, as the cache outlives it
+        keys = "".join(", std::string" if p.param_type.name == "view" else f", {self.map_type_node(p.param_type)}"
+                       for p in node.params)
+        params = ", ".join(f"{self.map_type_node(p.param_type)} {p.name}" for p in node.params)
+        memo = f"lors_memo_{node.name}"
+        self.emit(f"static LorsMemo<{cpp_ret_type}{keys}> {memo}(lors_memo_stats_{node.name}, {node.memo_capacity});")
+        self.emit(f"{cpp_ret_type} {node.name}({params}) {{")
+        self.indent_level += 1
+        if self.scoped:
+            self.emit_scope(node)
+        args = ", ".join(p.name for p in node.params)
+        self.emit(f"return {memo}.call({{{args}}}, [&]() -> {cpp_ret_type} {{")
+        self.indent_level += 1
+        self.visit(node.body)
+        self.indent_level -= 1
+        self.emit("});")
+        self.indent_level -= 1
+        self.emit("}")
+
+    def prototype(self, node: FunctionDeclaration) -> str:
+        params = ", ".join(f"{self.map_type_node(p.param_type)} {p.name}" for p in node.params)
+        return f"{self.specifier(node)}{self.map_type_node(node.return_type)} {node.name}({params});"
+
+    def specifier(self, node: FunctionDeclaration) -> str:
+        return "constexpr " if self.constexpr and node.constexpr else ""
+
+    def emit_scope(self, node: FunctionDeclaration):
+        self.emit(f"LorsScope lors_scope({self.profile_ids[node.name]});")
 
     def visit_Block(self, node: Block):
         for stmt in node.statements:
@@ -182,6 +445,70 @@ class CodeGenerator:
         self.indent_level -= 1
         self.emit("}")
 
+    def visit_ForEachStatement(self, node: ForEachStatement):
+        check_for_each(node, self.writes_by_algorithm())
+        written = assigned_names(node.body)
+
+        seq = self.visit_expression(node.iterable)
+        iterable = self.type_of(node.iterable)
+        item_type = iterable.subtype if iterable is not None and iterable.name == "sequence" else None
+        if iterable is not None and iterable.name in ("series", "view"):
+            # Characters are whole values, as with char_at
+            binding = "long long"
+            item_type = TypeNode("whole")
+            if isinstance(node.iterable, Literal):
+                # A bare literal would also yield its terminating NUL
+                seq = f"std::string({seq})"
+        elif node.item_name in written:
+            # Writes through the item update the element in place.
+            # auto&& rather than auto& so sequence<state> proxies bind too.
+            binding = "auto&&"
+        else:
+            binding = "const auto&"
+
+        if node.index_name:
+            self.emit("{")
+            self.indent_level += 1
+            self.emit(f"long long {node.index_name} = -1;")
+
+        # The item (and index) are only known inside the loop
+        outer_types = dict(self.var_types)
+        self.var_types.pop(node.item_name, None)
+        if item_type is not None:
+            self.var_types[node.item_name] = item_type
+        if node.index_name:
+            self.var_types[node.index_name] = TypeNode("whole")
+        self.emit(f"for ({binding} {node.item_name} : {seq}) {{")
+        self.indent_level += 1
+        if node.index_name:
+            self.emit(f"++{node.index_name};")
+        self.visit(node.body)
+        self.indent_level -= 1
+        self.emit("}")
+        self.var_types = outer_types
+
+        if node.index_name:
+            self.indent_level -= 1
+            self.emit("}")
+
+    def visit_ParallelForStatement(self, node: ParallelForStatement):
+        check_parallel_races(node, self.writes_by_algorithm(), self.var_types.get)
+
+        start = self.visit_expression(node.start)
+        end = self.visit_expression(node.end)
+        omp_ops = {"sum": "+", "min": "min", "max": "max"}
+        clauses = "".join(f" reduction({omp_ops[r.operator]}:{r.name})" for r in node.reductions)
+
+        # Iterations are split across cores by OpenMP; without -fopenmp the
+        # pragma is ignored and the loop simply runs serially.
+        self.compile_flags.add("-fopenmp")
+        self.emit(f"#pragma omp parallel for{clauses}")
+        self.emit(f"for (long long {node.var_name} = {start}; {node.var_name} < {end}; ++{node.var_name}) {{")
+        self.indent_level += 1
+        self.visit(node.body)
+        self.indent_level -= 1
+        self.emit("}")
+
     def visit_ReturnStatement(self, node: ReturnStatement):
         if node.value:
             val = self.visit_expression(node.value)
@@ -189,12 +516,18 @@ class CodeGenerator:
         else:
             self.emit("return;")
 
+    def visit_ContinueStatement(self, node: ContinueStatement):
+        self.emit("continue;")
+
     def visit_ExpressionStatement(self, node: ExpressionStatement):
         expr_code = self.visit_expression(node.expression)
         self.emit(f"{expr_code};")
 
     def visit_Assignment(self, node: Assignment):
-        val = self.visit_expression(node.value)
+        if node.name in self.var_types and self.var_types[node.name].name == "view":
+            val = self.view_expression(node.value)
+        else:
+            val = self.visit_expression(node.value)
         self.emit(f"{node.name} = {val};")
 
     def visit_ArrayAssignment(self, node: ArrayAssignment):
@@ -202,6 +535,12 @@ class CodeGenerator:
         val = self.visit_expression(node.value)
         self.emit(f"{node.name}[{index}] = {val};")
 
+    def visit_MatrixAssignment(self, node: MatrixAssignment):
+        row = self.visit_expression(node.row)
+        col = self.visit_expression(node.col)
+        val = self.visit_expression(node.value)
+        self.emit(f"{node.name}({row}, {col}) = {val};")
+
     def visit_MemberAssignment(self, node: MemberAssignment):
         obj = self.visit_expression(node.object)
         val = self.visit_expression(node.value)
@@ -234,8 +573,12 @@ class CodeGenerator:
             right = self.visit_expression(node.right)
             return f"(-{right})"
 
-        left = self.visit_expression(node.left)
-        right = self.visit_expression(node.right)
+        if node.operator in ("==", "!=", "<", ">", "<=", ">="):
+            left = self.read_expression(node.left)
+            right = self.read_expression(node.right)
+        else:
+            left = self.visit_expression(node.left)
+            right = self.visit_expression(node.right)
 
         op = node.operator
         if op == "and": op = "&&"
@@ -248,6 +591,8 @@ class CodeGenerator:
             return f'"{node.value}"'
         if node.value_type == 'state':
             return 'true' if node.value else 'false'
+        if node.long_long:
+            return f"{node.value}LL"
         return str(node.value)
 
     def visit_ArrayLiteral_expr(self, node: ArrayLiteral) -> str:
@@ -258,23 +603,54 @@ class CodeGenerator:
         index = self.visit_expression(node.index)
         return f"{node.array_name}[{index}]"
 
+    def visit_MatrixAccess_expr(self, node: MatrixAccess) -> str:
+        row = self.visit_expression(node.row)
+        col = self.visit_expression(node.col)
+        return f"{node.matrix_name}({row}, {col})"
+
     def visit_MemberAccess_expr(self, node: MemberAccess) -> str:
         obj = self.visit_expression(node.object)
         return f"{obj}.{node.member_name}"
 
     def visit_InquireExpression_expr(self, node: InquireExpression) -> str:
+        self.used.add("inquire")
         return "inquire()"
 
+    def visit_DispatchExpression_expr(self, node: DispatchExpression) -> str:
+        check_dispatch(node, self.algorithms(), self.writes_by_algorithm(), self.reads_by_algorithm())
+        self.used.add("task_pool")
+        self.compile_flags.add("-pthread")
+        args = "".join(f", {self.visit_expression(arg)}" for arg in node.arguments)
+        return f"lors_dispatch({node.name}{args})"
+
     def visit_Identifier_expr(self, node: Identifier) -> str:
         return node.name
 
     def visit_FunctionCall_expr(self, node: FunctionCall) -> str:
+        # An algorithm takes precedence over an intrinsic of the same name
+        if node.name in self.algorithms():
+            args = [self.visit_expression(arg) for arg in node.arguments]
+            return f"{node.name}({', '.join(args)})"
+
+        needs = INTRINSIC_NEEDS.get(node.name)
+        if needs:
+            self.used.update(needs)
         if node.name == "reveal":
             if not node.arguments:
                 return "std::cout << std::endl"
-            args_code = " << ".join([self.visit_expression(arg) for arg in node.arguments])
+            args_code = " << ".join([self.read_expression(arg) for arg in node.arguments])
             return f"std::cout << {args_code} << std::endl"
 
+        if node.name == "await":
+            if len(node.arguments) == 1:
+                return f"lors_await({self.visit_expression(node.arguments[0])})"
+
+        if node.name in ("memo_hits", "memo_misses"):
+            name = memo_target(node, self.memoised_algorithms())
+            self.used.add("lors_memo")
+            counter = "hits" if node.name == "memo_hits" else "misses"
+            return f"lors_memo_stats_{name}.{counter}.load()"
+
         # System / CLI Intrinsics
         if node.name == "arg_count":
             return "((long long)global_argc)"
@@ -305,12 +681,12 @@ class CodeGenerator:
         # String Intrinsics - Access & Length
         if node.name == "length":
             if len(node.arguments) == 1:
-                arg = self.visit_expression(node.arguments[0])
+                arg = self.read_expression(node.arguments[0])
                 return f"((long long){arg}.size())"
 
         if node.name == "char_at":
              if len(node.arguments) == 2:
-                 s = self.visit_expression(node.arguments[0])
+                 s = self.read_expression(node.arguments[0])
                  idx = self.visit_expression(node.arguments[1])
                  # Returns char code (whole)
                  return f"((long long){s}[{idx}])"
@@ -394,6 +770,82 @@ class CodeGenerator:
                  item = self.visit_expression(node.arguments[1])
                  return f"{seq}.push_back({item})"
 
+        # Catalog Intrinsics
+        if node.name == "put":
+             # put(catalog, key, value)
+             if len(node.arguments) == 3:
+                 cat = self.visit_expression(node.arguments[0])
+                 key = self.visit_expression(node.arguments[1])
+                 val = self.visit_expression(node.arguments[2])
+                 return f"{cat}.insert_or_assign({key}, {val})"
+
+        if node.name == "get":
+             if len(node.arguments) == 2:
+                 cat = self.visit_expression(node.arguments[0])
+                 key = self.visit_expression(node.arguments[1])
+                 return f"{cat}.at({key})"
+
+        if node.name == "has":
+             if len(node.arguments) == 2:
+                 cat = self.visit_expression(node.arguments[0])
+                 key = self.visit_expression(node.arguments[1])
+                 return f"({cat}.find({key}) != {cat}.end())"
+
+        if node.name == "remove":
+             if len(node.arguments) == 2:
+                 cat = self.visit_expression(node.arguments[0])
+                 key = self.visit_expression(node.arguments[1])
+                 return f"((long long){cat}.erase({key}))"
+
+        if node.name == "size":
+             if len(node.arguments) == 1:
+                 return f"((long long){self.visit_expression(node.arguments[0])}.size())"
+
+        if node.name == "keys":
+             if len(node.arguments) == 1:
+                 return f"catalog_keys_helper({self.visit_expression(node.arguments[0])})"
+
+        # Bulk numeric kernels over sequences (see runtime.NUMERIC_KERNELS): name -> (function, arity)
+        kernel_map = {
+            "sum": ("lors_sum", 1),
+            "dot": ("lors_dot", 2),
+            "scale": ("lors_scale", 2),
+            "axpy": ("lors_axpy", 3),
+            "elementwise_add": ("lors_elementwise_add", 2),
+            "elementwise_mul": ("lors_elementwise_mul", 2),
+            "min_of": ("lors_min_of", 1),
+            "max_of": ("lors_max_of", 1),
+            "mean": ("lors_mean", 1),
+            "variance": ("lors_variance", 1)
+        }
+        if node.name in kernel_map:
+            function, arity = kernel_map[node.name]
+            if len(node.arguments) == arity:
+                args = [self.kernel_argument(node.name, arg) for arg in node.arguments]
+                return f"{function}({', '.join(args)})"
+
+        # Dense matrix intrinsics (see runtime.DENSE_MATRIX)
+        matrix_map = {
+            "zeros": ("lors_zeros", 2),
+            "identity": ("lors_identity", 1),
+            "matmul": ("lors_matmul", 2),
+            "transpose": ("lors_transpose", 1),
+            "solve": ("lors_solve", 2)
+        }
+        if node.name in matrix_map:
+            function, arity = matrix_map[node.name]
+            if len(node.arguments) == arity:
+                args = [self.visit_expression(arg) for arg in node.arguments]
+                return f"{function}({', '.join(args)})"
+
+        if node.name == "rows":
+             if len(node.arguments) == 1:
+                 return f"{self.visit_expression(node.arguments[0])}.rows"
+
+        if node.name == "cols":
+             if len(node.arguments) == 1:
+                 return f"{self.visit_expression(node.arguments[0])}.cols"
+
         # Math functions mapping
         math_map = {
             "root": "std::sqrt",
@@ -408,17 +860,127 @@ class CodeGenerator:
         args = [self.visit_expression(arg) for arg in node.arguments]
         return f"{fname}({', '.join(args)})"
 
+    def view_expression(self, node: ASTNode) -> str:
+        """A value stored in a view: it must outlive the view (see check_views)."""
+        if isinstance(node, FunctionCall) and node.name == "substring" and len(node.arguments) == 3:
+            self.used.add("lors_view")
+            args = [self.view_expression(node.arguments[0])] + [self.visit_expression(a) for a in node.arguments[1:]]
+            return f"lors_substr_view({', '.join(args)})"
+        return self.visit_expression(node)
+
+    def read_expression(self, node: ASTNode) -> str:
+        """An operand that is only read: substring yields a view, valid until the end of the statement."""
+        if isinstance(node, FunctionCall) and node.name == "substring" and len(node.arguments) == 3:
+            self.used.add("lors_view")
+            args = [self.read_expression(node.arguments[0])] + [self.visit_expression(a) for a in node.arguments[1:]]
+            return f"lors_substr_view({', '.join(args)})"
+        return self.visit_expression(node)
+
+    def kernel_argument(self, name: str, node: ASTNode) -> str:
+        """An argument of a numeric kernel, whose templates cannot deduce T from a braced list."""
+        if not isinstance(node, ArrayLiteral):
+            return self.visit_expression(node)
+        if not node.elements:
+            raise SyntaxError("Cannot infer the element type of an empty sequence literal")
+        types = {getattr(self.numeric_type(e), "name", None) for e in node.elements}
+        if not types <= {"whole", "precise"}:
+            raise SyntaxError(f"{name}() needs a sequence of whole or precise values")
+        elem = TypeNode("precise" if "precise" in types else "whole")
+        cpp_elem = self.map_type_node(elem)
+        # Cast so a whole variable in a precise literal is not a narrowing error
+        elements = [self.visit_expression(e) if self.numeric_type(e).name == elem.name
+                    else f"({cpp_elem})({self.visit_expression(e)})" for e in node.elements]
+        return f"std::vector<{cpp_elem}>{{ {', '.join(elements)} }}"
+
+    def numeric_type(self, node: ASTNode) -> Optional[TypeNode]:
+        """type_of, plus the result type of arithmetic on whole and precise values."""
+        if isinstance(node, BinaryOp) and node.operator in ("+", "-", "*", "/", "%"):
+            operands = [self.numeric_type(n) for n in (node.left, node.right) if n is not None]
+            names = {getattr(t, "name", None) for t in operands}
+            if names <= {"whole", "precise"}:
+                return TypeNode("precise" if "precise" in names else "whole")
+            return None
+        return self.type_of(node)
+
+    def type_of(self, node: ASTNode) -> Optional[TypeNode]:
+        # Best-effort: None where the type is not known
+        if isinstance(node, Literal):
+            return TypeNode(node.value_type)
+        if isinstance(node, Identifier):
+            return self.var_types.get(node.name)
+        if isinstance(node, ArrayAccess):
+            container = self.var_types.get(node.array_name)
+            if container is None or container.name in ("series", "view"):
+                return None
+            return container.value_subtype if container.name == "catalog" else container.subtype
+        if isinstance(node, MemberAccess):
+            owner = self.type_of(node.object)
+            struct = self.structures().get(owner.name) if owner is not None else None
+            if struct is not None:
+                return next((f.var_type for f in struct.fields if f.name == node.member_name), None)
+            return None
+        if isinstance(node, BinaryOp):
+            if node.operator == "+" and node.left is not None and any(
+                    t is not None and t.name in ("series", "view") for t in (self.type_of(node.left),
+                                                                           self.type_of(node.right))):
+                return TypeNode("series")
+            return None
+        if isinstance(node, FunctionCall):
+            return self.call_type(node)
+        return None
+
+    def call_type(self, node: FunctionCall) -> Optional[TypeNode]:
+        """Result type of a call, for the calls that yield a series or a container."""
+        if node.name in self.algorithms():
+            return self.algorithms()[node.name].return_type
+        if node.name in self.structures():
+            return TypeNode(node.name)
+        if node.name in SERIES_INTRINSICS:
+            return TypeNode("series")
+        if node.name == "solve":
+            return TypeNode("sequence", TypeNode("precise"))
+        arg = self.type_of(node.arguments[0]) if node.arguments else None
+        if arg is None:
+            return None
+        if node.name == "keys":
+            return TypeNode("sequence", arg.subtype)
+        if node.name == "get":
+            return arg.value_subtype
+        if node.name in ("elementwise_add", "elementwise_mul"):
+            return arg
+        if node.name == "await" and arg.name == "future":
+            return arg.subtype
+        return None
+
     def map_type_node(self, type_node: TypeNode) -> str:
         if type_node.name == "sequence":
+             self.used.add("<vector>")
              subtype = self.map_type_node(type_node.subtype)
              return f"std::vector<{subtype}>"
 
+        if type_node.name == "catalog":
+             self.used.add("<unordered_map>")
+             key = self.map_type_node(type_node.subtype)
+             value = self.map_type_node(type_node.value_subtype)
+             return f"std::unordered_map<{key}, {value}>"
+
         mapping = {
             "whole": "long long",
             "precise": "double",
             "series": "std::string",
             "state": "bool",
+            "matrix": "LorsMatrix",
             "void": "void"
         }
+        if type_node.name == "view":
+            self.used.add("lors_view")
+            return "LorsView"
+
+        if type_node.name == "future":
+            self.used.add("task_pool")
+            return f"std::shared_future<{self.map_type_node(type_node.subtype)}>"
+
+        if type_node.name == "matrix":
+            self.used.add("dense_matrix")
         # If not a base type, assume it's a struct name
         return mapping.get(type_node.name, type_node.name)
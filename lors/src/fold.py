@@ -0,0 +1,296 @@
+import math
+from lors.src.ast_nodes import *
+from lors.src.analysis import (pure_algorithms, constexpr_algorithms, algorithm_names, field_names, PURE_INTRINSICS,
+                               CONSTEXPR_TYPES)
+
+# Statements and calls one folded call may execute before it is left to run time
+STEP_BUDGET = 100_000
+# ... and all folded calls of a program together (about a second of compile time)
+PROGRAM_STEP_BUDGET = 400_000
+# Nested algorithm calls (each costs a dozen Python frames)
+MAX_DEPTH = 48
+
+INT_RANGE = (-2**31, 2**31 - 1)
+LONG_RANGE = (-2**63, 2**63 - 1)
+
+MATH_FUNCTIONS = {"sine": math.sin, "cosine": math.cos, "tangent": math.tan}
+
+class CannotFold(Exception):
+    """The call is left to run time: unsupported value, undefined behaviour or over budget."""
+
+class OverBudget(CannotFold):
+    """The call ran out of steps; other calls of the same algorithm are not tried."""
+
+class Returned(Exception):
+    def __init__(self, value):
+        self.value = value
+
+class Evaluator:
+    """Runs pure algorithms with C++ semantics on whole, precise and state values.
+
+    Values are (kind, value) with kind the C++ type: "int" (a literal that
+    fits an int), "ll", "double" or "bool". Anything whose C++ result is not
+    fully defined (signed overflow, division by zero, non-finite doubles,
+    reading an uninitialised local) raises CannotFold.
+    """
+
+    def __init__(self, functions: dict, intrinsics: set, budget: int = STEP_BUDGET, over_budget: set = frozenset()):
+        self.functions = functions
+        # The intrinsics no algorithm of the program redefines
+        self.intrinsics = intrinsics
+        self.budget = budget
+        # Algorithms a previous call ran out of steps in
+        self.over_budget = over_budget
+        self.steps = 0
+        self.depth = 0
+
+    def step(self):
+        self.steps += 1
+        if self.steps > self.budget:
+            raise OverBudget("step budget exceeded")
+
+    def call(self, name: str, args: list):
+        func = self.functions[name]
+        if name in self.over_budget:
+            raise OverBudget(name)
+        if len(args) != len(func.params) or func.return_type.name not in CONSTEXPR_TYPES:
+            raise CannotFold(name)
+        if self.depth >= MAX_DEPTH:
+            raise CannotFold("too deep")
+        env = {}
+        for param, value in zip(func.params, args):
+            env[param.name] = [param.param_type.name, self.convert(value, param.param_type.name)]
+        self.depth += 1
+        try:
+            self.execute(func.body, env)
+            raise CannotFold(f"'{name}' ends without a result")
+        except Returned as result:
+            if result.value is None:
+                raise CannotFold(name)
+            return self.convert(result.value, func.return_type.name)
+        finally:
+            self.depth -= 1
+
+    def convert(self, value, type_name: str):
+        kind, v = value
+        if type_name == "precise":
+            return ("double", float(v))
+        if type_name == "state":
+            return ("bool", v != 0)
+        if type_name == "whole":
+            if kind == "double":
+                # double -> long long truncates; out of range is undefined
+                if not math.isfinite(v) or not LONG_RANGE[0] <= math.trunc(v) <= LONG_RANGE[1]:
+                    raise CannotFold("conversion out of range")
+                return ("ll", math.trunc(v))
+            return ("ll", int(v))
+        raise CannotFold(type_name)
+
+    def execute(self, node: ASTNode, env: dict):
+        self.step()
+        if isinstance(node, Block):
+            for stmt in node.statements:
+                self.execute(stmt, env)
+        elif isinstance(node, VariableDeclaration):
+            type_name = node.var_type.name
+            if type_name not in CONSTEXPR_TYPES:
+                raise CannotFold(type_name)
+            value = None if node.initializer is None else self.convert(self.evaluate(node.initializer, env), type_name)
+            env[node.name] = [type_name, value]
+        elif isinstance(node, Assignment):
+            if node.name not in env:
+                raise CannotFold(node.name)
+            env[node.name][1] = self.convert(self.evaluate(node.value, env), env[node.name][0])
+        elif isinstance(node, IfStatement):
+            if self.truth(self.evaluate(node.condition, env)):
+                self.execute(node.then_branch, env)
+            elif node.else_branch is not None:
+                self.execute(node.else_branch, env)
+        elif isinstance(node, WhileStatement):
+            while self.truth(self.evaluate(node.condition, env)):
+                self.execute(node.body, env)
+        elif isinstance(node, ReturnStatement):
+            raise Returned(None if node.value is None else self.evaluate(node.value, env))
+        elif isinstance(node, ExpressionStatement):
+            self.evaluate(node.expression, env)
+        else:
+            raise CannotFold(type(node).__name__)
+
+    def truth(self, value) -> bool:
+        return value[1] != 0
+
+    def evaluate(self, node: ASTNode, env: dict):
+        if isinstance(node, Literal):
+            if node.value_type == "whole":
+                return ("int" if INT_RANGE[0] <= node.value <= INT_RANGE[1] else "ll", node.value)
+            if node.value_type == "precise":
+                return ("double", node.value)
+            if node.value_type == "state":
+                return ("bool", node.value)
+            raise CannotFold("series")
+        if isinstance(node, Identifier):
+            slot = env.get(node.name)
+            if slot is None or slot[1] is None:
+                raise CannotFold(node.name)
+            return slot[1]
+        if isinstance(node, BinaryOp):
+            return self.binary(node, env)
+        if isinstance(node, FunctionCall):
+            args = [self.evaluate(arg, env) for arg in node.arguments]
+            if node.name in self.functions:
+                return self.call(node.name, args)
+            if node.name in self.intrinsics:
+                return self.intrinsic(node.name, args)
+        raise CannotFold(type(node).__name__)
+
+    def binary(self, node: BinaryOp, env: dict):
+        op = node.operator
+        if op == "not":
+            return ("bool", not self.truth(self.evaluate(node.right, env)))
+        if op == "-" and node.left is None:
+            kind, v = self.promote(self.evaluate(node.right, env))
+            return self.checked(kind, -v)
+        if op in ("and", "or"):
+            left = self.truth(self.evaluate(node.left, env))
+            if left == (op == "or"):
+                return ("bool", left)
+            return ("bool", self.truth(self.evaluate(node.right, env)))
+
+        (ka, a), (kb, b) = self.promote(self.evaluate(node.left, env)), self.promote(self.evaluate(node.right, env))
+        # Usual arithmetic conversions: double > long long > int
+        kind = "double" if "double" in (ka, kb) else "ll" if "ll" in (ka, kb) else "int"
+        if kind == "double":
+            a, b = float(a), float(b)
+        if op in ("==", "!=", "<", ">", "<=", ">="):
+            return ("bool", {"==": a == b, "!=": a != b, "<": a < b, ">": a > b, "<=": a <= b, ">=": a >= b}[op])
+        if op == "+":
+            return self.checked(kind, a + b)
+        if op == "-":
+            return self.checked(kind, a - b)
+        if op == "*":
+            return self.checked(kind, a * b)
+        if op in ("/", "%"):
+            if b == 0 or (kind == "double" and op == "%"):
+                raise CannotFold("division")
+            if kind == "double":
+                return self.checked(kind, a / b)
+            # C++ integer division truncates towards zero
+            quotient = abs(a) // abs(b) * (1 if (a < 0) == (b < 0) else -1)
+            return self.checked(kind, quotient if op == "/" else a - b * quotient)
+        raise CannotFold(op)
+
+    def promote(self, value):
+        # bool takes part in arithmetic as int
+        return ("int", int(value[1])) if value[0] == "bool" else value
+
+    def checked(self, kind: str, v):
+        if kind == "double":
+            if not math.isfinite(v):
+                raise CannotFold("not finite")
+            return (kind, v)
+        low, high = INT_RANGE if kind == "int" else LONG_RANGE
+        if not low <= v <= high:
+            raise CannotFold("signed overflow")
+        return (kind, v)
+
+    def intrinsic(self, name: str, args: list):
+        try:
+            if name == "absolute" and len(args) == 1:
+                kind, v = self.promote(args[0])
+                return self.checked(kind, abs(v))
+            if name == "root" and len(args) == 1:
+                return self.checked("double", math.sqrt(float(args[0][1])))
+            if name == "power" and len(args) == 2:
+                return self.checked("double", math.pow(float(args[0][1]), float(args[1][1])))
+            if name in MATH_FUNCTIONS and len(args) == 1:
+                return self.checked("double", MATH_FUNCTIONS[name](float(args[0][1])))
+        except (ValueError, OverflowError):
+            raise CannotFold(name)
+        raise CannotFold(name)
+
+def to_literal(value) -> ASTNode:
+    kind, v = value
+    if kind == "bool":
+        return Literal(v, "state")
+    negative = v < 0 or (kind == "double" and math.copysign(1.0, v) < 0)
+    if kind == "double":
+        literal = Literal(abs(v), "precise")
+    else:
+        if v == LONG_RANGE[0]:
+            raise CannotFold("no literal for the smallest long long")
+        literal = Literal(abs(v), "whole")
+        # Print as long long, the type of the call it replaces
+        literal.long_long = True
+    # A negative literal is written as a negation so that it cannot fuse
+    # with a neighbouring minus into '--'
+    return BinaryOp(None, "-", literal) if negative else literal
+
+def fold_pure_calls(program: Program) -> int:
+    """Replace calls of pure algorithms on constant arguments by their result.
+
+    Rewrites the tree in place, marks the algorithms that can be C++
+    constexpr functions and returns the number of calls folded.
+    """
+    constant_calls = {}
+    pure = pure_algorithms(program, constant_calls)
+    if not pure:
+        return 0
+    constexpr = constexpr_algorithms(program, pure)
+    for decl in program.declarations:
+        if isinstance(decl, FunctionDeclaration) and decl.name in constexpr:
+            decl.constexpr = True
+    # A memoised algorithm's calls show in its hit and miss counters, so
+    # neither it nor anything calling it is evaluated here
+    functions = {d.name: d for d in program.declarations
+                 if isinstance(d, FunctionDeclaration) and d.body is not None and d.name in pure and not d.memoised}
+    intrinsics = PURE_INTRINSICS - algorithm_names(program)
+    cache = {}
+    over_budget = set()
+    folded = 0
+    steps_left = PROGRAM_STEP_BUDGET
+
+    def fold_call(node: FunctionCall) -> ASTNode:
+        nonlocal folded, steps_left
+        if node.name not in functions or node.name in over_budget or steps_left <= 0:
+            return node
+        evaluator = Evaluator(functions, intrinsics, min(STEP_BUDGET, steps_left), over_budget)
+        try:
+            args = tuple(evaluator.evaluate(arg, {}) for arg in node.arguments)
+            key = (node.name, args)
+            if key not in cache:
+                try:
+                    cache[key] = evaluator.call(node.name, list(args))
+                except OverBudget:
+                    over_budget.add(node.name)
+                    raise
+                except (CannotFold, RecursionError):
+                    cache[key] = None
+        except CannotFold:
+            return node
+        finally:
+            steps_left -= evaluator.steps
+        if cache[key] is None:
+            return node
+        try:
+            replacement = to_literal(cache[key])
+        except CannotFold:
+            return node
+        folded += 1
+        return replacement
+
+    def rewrite(node: ASTNode) -> ASTNode:
+        # Post-order, so arguments are folded before the call that takes them
+        for name in field_names(node):
+            value = getattr(node, name)
+            if isinstance(value, ASTNode):
+                setattr(node, name, rewrite(value))
+            elif isinstance(value, list):
+                value[:] = [rewrite(item) if isinstance(item, ASTNode) else item for item in value]
+        return fold_call(node) if isinstance(node, FunctionCall) else node
+
+    for decl in program.declarations:
+        # Only bodies that call a pure algorithm on literals can change
+        if isinstance(decl, FunctionDeclaration) and not constant_calls.get(decl.name, set()) & pure:
+            continue
+        rewrite(decl)
+    return folded
@@ -0,0 +1,185 @@
+from lors.src.ast_nodes import *
+from lors.src.analysis import (walk, field_names, root_name, assigned_names, declared_names,
+                               pure_algorithms, PURE_INTRINSICS, MUTATING_INTRINSICS)
+
+EXPRESSIONS = (BinaryOp, Literal, Identifier, FunctionCall, ArrayLiteral, ArrayAccess, MatrixAccess,
+               InquireExpression, MemberAccess, DispatchExpression)
+
+# Intrinsics whose result only depends on their arguments while a loop runs.
+# env_get qualifies as nothing in a Lors program sets the environment;
+# file_exists does not, since another process may create the file a loop polls for.
+INVARIANT_INTRINSICS = (PURE_INTRINSICS - MUTATING_INTRINSICS) | {"env_get", "arg_count", "arg_value"}
+
+# Intrinsics that cannot fail or have undefined behaviour whatever their
+# arguments, so they may be evaluated before a loop that would not have
+# reached them (substring, get, to_integer, matmul, ... can throw or exit)
+SPECULATABLE_INTRINSICS = {
+    "length", "size", "has", "keys", "rows", "cols", "transpose",
+    "to_string", "to_upper", "to_lower", "reverse", "character",
+    "is_digit", "is_alpha", "is_alnum", "is_space", "is_upper", "is_lower",
+    "root", "power", "absolute", "sine", "cosine", "tangent",
+    "sum", "dot", "elementwise_add", "elementwise_mul", "min_of", "max_of", "mean", "variance",
+    "env_get", "arg_count",
+}
+
+# Not a Lors type: the C++ backend emits unknown type names as written, and
+# types the temporary as its initializer. A reference avoids copying members;
+# a call's result is kept alive.
+HOISTED_TYPE = "const auto&"
+
+class Hoister:
+    """Loop-invariant code motion for 'cycle' (WhileStatement) loops.
+
+    An expression is invariant when it reads no variable the loop writes and
+    only calls pure algorithms or invariant intrinsics. The largest such
+    expressions in the parts of the condition evaluated on every test are
+    moved into a temporary before the loop. Elsewhere in the condition and
+    in the body, which may not run at all, only expressions that are safe to
+    evaluate speculatively (no indexing, division or failing intrinsic) are
+    moved. Inner loops are handled first, so their temporaries can move
+    further out.
+    """
+
+    def __init__(self, program: Program):
+        self.program = program
+        self.global_names = {d.name for d in program.declarations if isinstance(d, VariableDeclaration)}
+        self.struct_names = {d.name for d in program.declarations if isinstance(d, StructDeclaration)}
+        self.algorithm_names = {d.name for d in program.declarations if isinstance(d, FunctionDeclaration)}
+        # Computed on first use: most loops never call an algorithm
+        self.pure = None
+        self.count = 0
+
+    def pure_algorithms(self) -> set:
+        if self.pure is None:
+            self.pure = pure_algorithms(self.program)
+        return self.pure
+
+    def block(self, block: Block):
+        statements = []
+        for stmt in block.statements:
+            for name in field_names(stmt):
+                value = getattr(stmt, name)
+                if isinstance(value, Block):
+                    self.block(value)
+            if isinstance(stmt, WhileStatement):
+                statements.extend(self.hoist(stmt))
+            statements.append(stmt)
+        block.statements = statements
+
+    def hoist(self, loop: WhileStatement) -> List[ASTNode]:
+        self.written = self.written_names(loop)
+        self.temporaries = []
+        self.loop = loop
+        loop.condition = self.rewrite(loop.condition, True)
+        self.rewrite_statements(loop.body)
+        return self.temporaries
+
+    def written_names(self, loop: WhileStatement) -> set:
+        written = assigned_names(loop) | declared_names(loop.body)
+        calls = set()
+        for child in walk(loop):
+            if isinstance(child, ForEachStatement):
+                written.add(child.item_name)
+                if child.index_name:
+                    written.add(child.index_name)
+                # A written item is bound by reference to the element
+                if child.item_name in assigned_names(child.body):
+                    written.add(root_name(child.iterable))
+            elif isinstance(child, ParallelForStatement):
+                written.add(child.var_name)
+            elif isinstance(child, FunctionCall) and child.name in self.algorithm_names:
+                calls.add(child.name)
+        # Arguments are passed by value, but an algorithm may write globals
+        if calls and calls - self.pure_algorithms():
+            written |= self.global_names
+        return written
+
+    def rewrite_statements(self, node: ASTNode):
+        if isinstance(node, ExpressionStatement):
+            # The value is discarded (and may be void): only its parts can move
+            self.rewrite_parts(node.expression, False)
+            return
+        for name in field_names(node):
+            value = getattr(node, name)
+            if isinstance(value, EXPRESSIONS):
+                setattr(node, name, self.rewrite(value, False))
+            elif isinstance(value, ASTNode):
+                self.rewrite_statements(value)
+            elif isinstance(value, list):
+                for index, item in enumerate(value):
+                    if isinstance(item, EXPRESSIONS):
+                        value[index] = self.rewrite(item, False)
+                    elif isinstance(item, ASTNode):
+                        self.rewrite_statements(item)
+
+    def rewrite(self, node: ASTNode, always_evaluated: bool) -> ASTNode:
+        """Hoist the largest invariant parts of an expression; returns its replacement."""
+        if self.worth_hoisting(node) and self.invariant(node) and (always_evaluated or self.speculatable(node)):
+            for temporary in self.temporaries:
+                # The same expression twice in one loop shares its temporary
+                if temporary.initializer == node:
+                    return Identifier(temporary.name)
+            name = f"lors_inv{self.count}"
+            self.count += 1
+            temporary = VariableDeclaration(name, TypeNode(HOISTED_TYPE), node)
+            temporary.file, temporary.line = self.loop.file, self.loop.line
+            self.temporaries.append(temporary)
+            return Identifier(name)
+        self.rewrite_parts(node, always_evaluated)
+        return node
+
+    def rewrite_parts(self, node: ASTNode, always_evaluated: bool):
+        if isinstance(node, BinaryOp) and node.operator in ("and", "or"):
+            # The right operand is short-circuited
+            node.left = self.rewrite(node.left, always_evaluated)
+            node.right = self.rewrite(node.right, False)
+            return
+        for name in field_names(node):
+            value = getattr(node, name)
+            if isinstance(value, EXPRESSIONS):
+                setattr(node, name, self.rewrite(value, always_evaluated))
+            elif isinstance(value, list):
+                value[:] = [self.rewrite(item, always_evaluated) if isinstance(item, EXPRESSIONS) else item
+                            for item in value]
+
+    def worth_hoisting(self, node: ASTNode) -> bool:
+        # Reading a variable or a constant costs no more than reading a temporary
+        return isinstance(node, (BinaryOp, FunctionCall, MemberAccess)) and any(
+            isinstance(child, (FunctionCall, MemberAccess)) for child in walk(node))
+
+    def invariant(self, node: ASTNode) -> bool:
+        for child in walk(node):
+            if isinstance(child, (InquireExpression, DispatchExpression)):
+                return False
+            if isinstance(child, FunctionCall):
+                if child.name in self.algorithm_names:
+                    if child.name not in self.pure_algorithms():
+                        return False
+                elif child.name not in self.struct_names and child.name not in INVARIANT_INTRINSICS:
+                    return False
+            name = root_name(child) if isinstance(child, (Identifier, ArrayAccess, MatrixAccess)) else None
+            if name in self.written:
+                return False
+        return True
+
+    def speculatable(self, node: ASTNode) -> bool:
+        for child in walk(node):
+            if isinstance(child, (ArrayAccess, MatrixAccess)):
+                return False
+            if isinstance(child, BinaryOp) and child.operator in ("/", "%"):
+                return False
+            if isinstance(child, FunctionCall):
+                # Algorithms may not terminate or may fail on arguments they never get
+                if child.name in self.algorithm_names:
+                    return False
+                if child.name not in SPECULATABLE_INTRINSICS and child.name not in self.struct_names:
+                    return False
+        return True
+
+def hoist_invariants(program: Program) -> int:
+    """Move loop-invariant expressions out of every 'cycle' loop; returns how many."""
+    hoister = Hoister(program)
+    for decl in program.declarations:
+        if isinstance(decl, FunctionDeclaration) and decl.body is not None:
+            hoister.block(decl.body)
+    return hoister.count
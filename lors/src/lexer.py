@@ -2,8 +2,10 @@ from lors.src.tokens import Token, TokenType
 from lors.src.ast_nodes import *
 
 class Lexer:
-    def __init__(self, source_code: str):
+    def __init__(self, source_code: str, line_map: Optional[list] = None):
         self.source = source_code
+        # (file, line) of every source line, from process_includes
+        self.line_map = line_map
         self.length = len(source_code)
         self.pos = 0
         self.line = 1
@@ -32,6 +34,8 @@ class Lexer:
             "series": TokenType.TYPE_SERIES,
             "state": TokenType.TYPE_STATE,
             "sequence": TokenType.TYPE_SEQUENCE,
+            "catalog": TokenType.TYPE_CATALOG,
+            "matrix": TokenType.TYPE_MATRIX,
             "true": TokenType.BOOLEAN_LITERAL,
             "false": TokenType.BOOLEAN_LITERAL
         }
@@ -81,6 +85,10 @@ class Lexer:
             raise SyntaxError(f"Unexpected character '{char}' at line {self.line}, column {self.column}")
 
         tokens.append(Token(TokenType.EOF, "", self.line, self.column))
+        if self.line_map:
+            for token in tokens:
+                if token.line <= len(self.line_map):
+                    token.file, token.source_line = self.line_map[token.line - 1]
         return tokens
 
     def peek(self, offset=1):
@@ -0,0 +1,1269 @@
+import struct
+from dataclasses import dataclass
+from lors.src.ast_nodes import *
+from lors.src.analysis import *
+
+# Types whose values live on the heap behind an i8* handle (see runtime.C_RUNTIME)
+HANDLE_TYPES = {"series", "sequence", "catalog", "matrix"}
+
+WHOLE = TypeNode("whole")
+PRECISE = TypeNode("precise")
+STATE = TypeNode("state")
+SERIES = TypeNode("series")
+MATRIX = TypeNode("matrix")
+VOID = TypeNode("void")
+# s[i] on a series: a whole value that reveal() prints as a character
+CHAR = TypeNode("char")
+
+NUMERIC = ("whole", "precise", "state", "char")
+
+# C runtime entry points: name -> (return type, parameter types)
+RUNTIME_FUNCTIONS = {
+    "lors_init": ("void", ["i32", "i8**"]),
+    "lors_free": ("void", ["i8*"]),
+    "lors_copy": ("i8*", ["i8*"]),
+    "lors_str_empty": ("i8*", []),
+    "lors_str_concat": ("i8*", ["i8*", "i8*"]),
+    "lors_str_cmp": ("i64", ["i8*", "i8*"]),
+    "lors_str_char_at": ("i64", ["i8*", "i64"]),
+    "lors_str_set_char": ("void", ["i8*", "i64", "i64"]),
+    "lors_str_substr": ("i8*", ["i8*", "i64", "i64"]),
+    "lors_str_upper": ("i8*", ["i8*"]),
+    "lors_str_lower": ("i8*", ["i8*"]),
+    "lors_str_reverse": ("i8*", ["i8*"]),
+    "lors_str_from_i64": ("i8*", ["i64"]),
+    "lors_str_from_f64": ("i8*", ["double"]),
+    "lors_str_from_char": ("i8*", ["i64"]),
+    "lors_str_ascii": ("i64", ["i8*"]),
+    "lors_str_to_i64": ("i64", ["i8*"]),
+    "lors_str_to_f64": ("double", ["i8*"]),
+    "lors_print_str": ("void", ["i8*"]),
+    "lors_print_i64": ("void", ["i64"]),
+    "lors_print_f64": ("void", ["double"]),
+    "lors_print_char": ("void", ["i64"]),
+    "lors_print_mat": ("void", ["i8*"]),
+    "lors_print_end": ("void", []),
+    "lors_read_i64": ("i64", []),
+    "lors_read_f64": ("double", []),
+    "lors_read_str": ("i8*", []),
+    "lors_arg_count": ("i64", []),
+    "lors_arg_value": ("i8*", ["i64"]),
+    "lors_env_get": ("i8*", ["i8*"]),
+    "lors_file_exists": ("i64", ["i8*"]),
+    "lors_file_remove": ("i64", ["i8*"]),
+    "lors_file_write": ("void", ["i8*", "i8*"]),
+    "lors_file_read": ("i8*", ["i8*"]),
+    "lors_system": ("void", ["i8*"]),
+    "lors_exit": ("void", ["i64"]),
+    "lors_is_digit": ("i64", ["i64"]),
+    "lors_is_alpha": ("i64", ["i64"]),
+    "lors_is_alnum": ("i64", ["i64"]),
+    "lors_is_space": ("i64", ["i64"]),
+    "lors_is_upper": ("i64", ["i64"]),
+    "lors_is_lower": ("i64", ["i64"]),
+    "lors_seq_new": ("i8*", ["i64", "i64"]),
+    "lors_seq_push": ("void", ["i8*", "i64"]),
+    "lors_rec_new": ("i8*", ["i64", "i8*"]),
+    "lors_cat_new": ("i8*", ["i64", "i64"]),
+    "lors_cat_put": ("void", ["i8*", "i64", "i64"]),
+    "lors_cat_get": ("i64*", ["i8*", "i64"]),
+    "lors_cat_has": ("i64", ["i8*", "i64"]),
+    "lors_cat_remove": ("i64", ["i8*", "i64"]),
+    "lors_cat_size": ("i64", ["i8*"]),
+    "lors_cat_keys": ("i8*", ["i8*"]),
+    "lors_mat_zeros": ("i8*", ["i64", "i64"]),
+    "lors_mat_identity": ("i8*", ["i64"]),
+    "lors_mat_transpose": ("i8*", ["i8*"]),
+    "lors_mat_matmul": ("i8*", ["i8*", "i8*"]),
+    "lors_mat_solve": ("i8*", ["i8*", "i8*"]),
+    "lors_sum": ("i64", ["i8*", "i64"]),
+    "lors_dot": ("i64", ["i8*", "i64", "i8*", "i64"]),
+    "lors_scale": ("void", ["i8*", "i64", "i64", "i64"]),
+    "lors_axpy": ("void", ["i8*", "i64", "i64", "i64", "i8*", "i64"]),
+    "lors_elementwise_add": ("i8*", ["i8*", "i64", "i8*", "i64"]),
+    "lors_elementwise_mul": ("i8*", ["i8*", "i64", "i8*", "i64"]),
+    "lors_min_of": ("i64", ["i8*", "i64"]),
+    "lors_max_of": ("i64", ["i8*", "i64"]),
+    "lors_mean": ("double", ["i8*", "i64"]),
+    "lors_variance": ("double", ["i8*", "i64"]),
+    "sqrt": ("double", ["double"]),
+    "pow": ("double", ["double", "double"]),
+    "sin": ("double", ["double"]),
+    "cos": ("double", ["double"]),
+    "tan": ("double", ["double"]),
+    "fabs": ("double", ["double"]),
+    "lors_memo_cache": ("i8*", ["i8**", "i64", "i64"]),
+    "lors_memo_key_word": ("void", ["i8*", "i64"]),
+    "lors_memo_key_f64": ("void", ["i8*", "double"]),
+    "lors_memo_key_str": ("void", ["i8*", "i8*"]),
+    "lors_memo_find": ("i64", ["i8*", "i8*", "i64*"]),
+    "lors_memo_put": ("void", ["i8*", "i8*", "i64"]),
+    "lors_memo_hits": ("i64", ["i8*"]),
+    "lors_memo_misses": ("i64", ["i8*"]),
+}
+
+# Intrinsics that map straight onto one runtime call:
+# name -> (runtime function, parameter types, result type)
+SIMPLE_INTRINSICS = {
+    "arg_count": ("lors_arg_count", [], WHOLE),
+    "arg_value": ("lors_arg_value", [WHOLE], SERIES),
+    "env_get": ("lors_env_get", [SERIES], SERIES),
+    "file_exists": ("lors_file_exists", [SERIES], STATE),
+    "file_remove": ("lors_file_remove", [SERIES], WHOLE),
+    "file_write": ("lors_file_write", [SERIES, SERIES], VOID),
+    "file_read": ("lors_file_read", [SERIES], SERIES),
+    "execute_system": ("lors_system", [SERIES], VOID),
+    "exit_program": ("lors_exit", [WHOLE], VOID),
+    "char_at": ("lors_str_char_at", [SERIES, WHOLE], WHOLE),
+    "substring": ("lors_str_substr", [SERIES, WHOLE, WHOLE], SERIES),
+    "is_digit": ("lors_is_digit", [WHOLE], STATE),
+    "is_alpha": ("lors_is_alpha", [WHOLE], STATE),
+    "is_alnum": ("lors_is_alnum", [WHOLE], STATE),
+    "is_space": ("lors_is_space", [WHOLE], STATE),
+    "is_upper": ("lors_is_upper", [WHOLE], STATE),
+    "is_lower": ("lors_is_lower", [WHOLE], STATE),
+    "to_upper": ("lors_str_upper", [SERIES], SERIES),
+    "to_lower": ("lors_str_lower", [SERIES], SERIES),
+    "reverse": ("lors_str_reverse", [SERIES], SERIES),
+    "to_integer": ("lors_str_to_i64", [SERIES], WHOLE),
+    "to_precise": ("lors_str_to_f64", [SERIES], PRECISE),
+    "ascii": ("lors_str_ascii", [SERIES], WHOLE),
+    "character": ("lors_str_from_char", [WHOLE], SERIES),
+    "zeros": ("lors_mat_zeros", [WHOLE, WHOLE], MATRIX),
+    "identity": ("lors_mat_identity", [WHOLE], MATRIX),
+    "matmul": ("lors_mat_matmul", [MATRIX, MATRIX], MATRIX),
+    "transpose": ("lors_mat_transpose", [MATRIX], MATRIX),
+    "solve": ("lors_mat_solve", [MATRIX, TypeNode("sequence", PRECISE)], TypeNode("sequence", PRECISE)),
+    "root": ("sqrt", [PRECISE], PRECISE),
+    "power": ("pow", [PRECISE, PRECISE], PRECISE),
+    "sine": ("sin", [PRECISE], PRECISE),
+    "cosine": ("cos", [PRECISE], PRECISE),
+    "tangent": ("tan", [PRECISE], PRECISE),
+}
+
+INT_OPS = {"+": "add", "-": "sub", "*": "mul", "/": "sdiv", "%": "srem"}
+FLOAT_OPS = {"+": "fadd", "-": "fsub", "*": "fmul", "/": "fdiv", "%": "frem"}
+INT_COMPARE = {"==": "eq", "!=": "ne", "<": "slt", ">": "sgt", "<=": "sle", ">=": "sge"}
+FLOAT_COMPARE = {"==": "oeq", "!=": "une", "<": "olt", ">": "ogt", "<=": "ole", ">=": "oge"}
+
+ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "0": "\0", "\\": "\\", "'": "'", '"': '"'}
+
+@dataclass
+class IRValue:
+    ir: Optional[str]
+    type: TypeNode
+    # Handle values: True for a temporary the current statement must free
+    # (or move somewhere), False for one borrowed from a variable or element.
+    owned: bool = False
+
+class LLVMCodeGenerator:
+    """Lowers the AST to textual LLVM IR for use with runtime.C_RUNTIME.
+
+    Values follow the C++ backend's value semantics: every variable, element
+    and field owns its handle, borrowed handles are copied when stored, and
+    temporaries are freed at the end of the statement that made them.
+    """
+
+    def __init__(self):
+        self.globals = []
+        self.functions = []
+        self.used_runtime = set()
+        self.structs = {}
+        self.signatures = {}
+        self.global_vars = {}
+        self.strings = {}
+        self.counter = 0
+        self.global_writes = {}
+        self.global_reads = {}
+        self.pure = set()
+        self.memoised = []
+
+    def generate(self, node: Program) -> str:
+        self.visit_Program(node)
+        lines = ["; Generated by Lors Compiler (LLVM backend)",
+                 "%LorsStr = type { i64, i64, i64, i8* }",
+                 "%LorsSeq = type { i64, i64, i64, i64* }",
+                 "%LorsMat = type { i64, i64, i64, double* }",
+                 ""]
+        lines += self.globals + [""]
+        for name in sorted(self.used_runtime):
+            ret, params = RUNTIME_FUNCTIONS[name]
+            lines.append(f"declare {ret} @{name}({', '.join(params)})")
+        lines.append("")
+        return "\n".join(lines + self.functions)
+
+    # ---- emission helpers ----
+
+    def fresh(self, prefix: str = "t") -> str:
+        self.counter += 1
+        return f"%{prefix}{self.counter}"
+
+    def new_label(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}{self.counter}"
+
+    def emit(self, line: str):
+        if self.terminated:
+            # Code after 'result' still needs a (dead) block to live in
+            self.start_block(self.new_label("dead"))
+        self.body.append("  " + line)
+
+    def emit_value(self, instr: str, prefix: str = "t") -> str:
+        reg = self.fresh(prefix)
+        self.emit(f"{reg} = {instr}")
+        return reg
+
+    def terminate(self, line: str):
+        self.emit(line)
+        self.terminated = True
+
+    def start_block(self, label: str):
+        self.body.append(f"{label}:")
+        self.current_block = label
+        self.terminated = False
+
+    def label(self, label: str):
+        if not self.terminated:
+            self.terminate(f"br label %{label}")
+        self.start_block(label)
+
+    def call_runtime(self, name: str, *args: str) -> Optional[str]:
+        self.used_runtime.add(name)
+        ret, params = RUNTIME_FUNCTIONS[name]
+        arg_list = ", ".join(f"{t} {a}" for t, a in zip(params, args))
+        if ret == "void":
+            self.emit(f"call void @{name}({arg_list})")
+            return None
+        return self.emit_value(f"call {ret} @{name}({arg_list})")
+
+    def begin_function(self):
+        self.body = []
+        self.allocas = []
+        self.owned_slots = []
+        self.scopes = [{}]
+        self.temp_stack = []
+        # Condition labels of the enclosing 'cycle' loops, for ContinueStatement
+        self.loop_heads = []
+        self.terminated = False
+        self.current_block = "entry"
+
+    def end_function(self, header: str):
+        self.functions.append(f"{header} {{")
+        self.functions.append("entry:")
+        self.functions.extend("  " + line for line in self.allocas)
+        self.functions.extend(self.body)
+        self.functions.append("}")
+        self.functions.append("")
+
+    # ---- types ----
+
+    def is_handle(self, t: TypeNode) -> bool:
+        return t.name in HANDLE_TYPES or t.name in self.structs
+
+    def reg_type(self, t: TypeNode) -> str:
+        if t.name == "precise":
+            return "double"
+        if t.name == "state":
+            return "i1"
+        if t.name == "void":
+            return "void"
+        if t.name in ("whole", "char"):
+            return "i64"
+        if self.is_handle(t):
+            return "i8*"
+        raise SyntaxError(f"Unknown type '{t.name}'")
+
+    def resolve_types(self, t: Optional[TypeNode]):
+        # Dispatched calls run eagerly in this backend, so a future<T> is just a T
+        while t is not None and t.name == "future":
+            t.name, t.subtype, t.value_subtype = t.subtype.name, t.subtype.subtype, t.subtype.value_subtype
+        # A view is stored as a copy of the series it refers to
+        if t is not None and t.name == "view":
+            t.name = "series"
+        if t is not None:
+            self.resolve_types(t.subtype)
+            self.resolve_types(t.value_subtype)
+
+    def mem_type(self, t: TypeNode) -> str:
+        # Every value occupies one 64-bit slot; states are stored widened and a
+        # future<void>, which holds nothing once its call has run, stores a zero
+        return "i64" if t.name in ("state", "void") else self.reg_type(t)
+
+    def type_name(self, t: TypeNode) -> str:
+        if t.name == "sequence":
+            return f"sequence<{self.type_name(t.subtype)}>"
+        if t.name == "catalog":
+            return f"catalog<{self.type_name(t.subtype)}, {self.type_name(t.value_subtype)}>"
+        return t.name
+
+    def same_type(self, a: TypeNode, b: TypeNode) -> bool:
+        return self.type_name(a) == self.type_name(b)
+
+    def key_kind(self, t: TypeNode) -> int:
+        return {"precise": 1, "series": 2}.get(t.name, 0)
+
+    # ---- variables and storage ----
+
+    def declare_local(self, name: str, t: TypeNode) -> str:
+        slot = self.fresh(f"v.{name}.")
+        mem = self.mem_type(t)
+        self.allocas.append(f"{slot} = alloca {mem}")
+        if self.is_handle(t):
+            self.allocas.append(f"store i8* null, i8** {slot}")
+            self.owned_slots.append(slot)
+        self.scopes[-1][name] = (slot, t)
+        return slot
+
+    def lookup(self, name: str):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        if name in self.global_vars:
+            return self.global_vars[name]
+        raise SyntaxError(f"Undefined variable '{name}'")
+
+    def load(self, addr: str, t: TypeNode) -> str:
+        if t.name == "void":
+            return None
+        mem = self.mem_type(t)
+        value = self.emit_value(f"load {mem}, {mem}* {addr}")
+        if t.name == "state":
+            value = self.emit_value(f"icmp ne i64 {value}, 0")
+        return value
+
+    def store(self, value: str, addr: str, t: TypeNode):
+        if t.name == "state":
+            value = self.emit_value(f"zext i1 {value} to i64")
+        elif t.name == "void":
+            value = "0"
+        mem = self.mem_type(t)
+        self.emit(f"store {mem} {value}, {mem}* {addr}")
+
+    def replace(self, value: IRValue, addr: str, t: TypeNode):
+        """Store into a slot that owns its value, releasing the old one."""
+        value = self.coerce(value, t)
+        if not self.is_handle(t):
+            self.store(value.ir, addr, t)
+            return
+        new = self.consume(value)
+        old = self.emit_value(f"load i8*, i8** {addr}")
+        self.emit(f"store i8* {new}, i8** {addr}")
+        self.call_runtime("lors_free", old)
+
+    def slot_address(self, base: str, index: str, t: TypeNode) -> str:
+        # base is an i64* to an array of 64-bit slots
+        slot = self.emit_value(f"getelementptr inbounds i64, i64* {base}, i64 {index}")
+        mem = self.mem_type(t)
+        if mem != "i64":
+            slot = self.emit_value(f"bitcast i64* {slot} to {mem}*")
+        return slot
+
+    def seq_field(self, handle: str, index: int, ty: str) -> str:
+        seq = self.emit_value(f"bitcast i8* {handle} to %LorsSeq*")
+        ptr = self.emit_value(f"getelementptr inbounds %LorsSeq, %LorsSeq* {seq}, i32 0, i32 {index}")
+        return self.emit_value(f"load {ty}, {ty}* {ptr}")
+
+    def element_address(self, seq: IRValue, index: IRValue) -> str:
+        data = self.seq_field(seq.ir, 3, "i64*")
+        return self.slot_address(data, self.coerce(index, WHOLE).ir, seq.type.subtype)
+
+    def matrix_address(self, matrix: IRValue, row: IRValue, col: IRValue) -> str:
+        mat = self.emit_value(f"bitcast i8* {matrix.ir} to %LorsMat*")
+        cols_ptr = self.emit_value(f"getelementptr inbounds %LorsMat, %LorsMat* {mat}, i32 0, i32 2")
+        cols = self.emit_value(f"load i64, i64* {cols_ptr}")
+        data_ptr = self.emit_value(f"getelementptr inbounds %LorsMat, %LorsMat* {mat}, i32 0, i32 3")
+        data = self.emit_value(f"load double*, double** {data_ptr}")
+        offset = self.emit_value(f"mul i64 {self.coerce(row, WHOLE).ir}, {cols}")
+        offset = self.emit_value(f"add i64 {offset}, {self.coerce(col, WHOLE).ir}")
+        return self.emit_value(f"getelementptr inbounds double, double* {data}, i64 {offset}")
+
+    def field_address(self, record: IRValue, member: str):
+        fields = self.structs.get(record.type.name)
+        if fields is None:
+            raise SyntaxError(f"Member access '.{member}' on non-structure type '{self.type_name(record.type)}'")
+        for index, field in enumerate(fields):
+            if field.name == member:
+                # LorsRec: header, field count and mask precede the slots
+                base = self.emit_value(f"bitcast i8* {record.ir} to i64*")
+                return self.slot_address(base, str(3 + index), field.var_type), field.var_type
+        raise SyntaxError(f"Structure '{record.type.name}' has no field '{member}'")
+
+    def address_of(self, node: ASTNode):
+        """(address, type) of an assignable location."""
+        if isinstance(node, Identifier):
+            return self.lookup(node.name)
+        if isinstance(node, ArrayAccess):
+            seq = self.variable_value(node.array_name)
+            if seq.type.name != "sequence":
+                raise SyntaxError(f"'{node.array_name}' is not a sequence")
+            return self.element_address(seq, self.expr(node.index)), seq.type.subtype
+        if isinstance(node, MatrixAccess):
+            matrix = self.variable_value(node.matrix_name)
+            if matrix.type.name != "matrix":
+                raise SyntaxError(f"'{node.matrix_name}' is not a matrix")
+            return self.matrix_address(matrix, self.expr(node.row), self.expr(node.col)), PRECISE
+        if isinstance(node, MemberAccess):
+            return self.field_address(self.expr(node.object), node.member_name)
+        raise SyntaxError("Invalid assignment target")
+
+    def variable_value(self, name: str) -> IRValue:
+        addr, t = self.lookup(name)
+        return IRValue(self.load(addr, t), t)
+
+    # ---- ownership of temporaries ----
+
+    def temp(self, ir: str, t: TypeNode) -> IRValue:
+        self.temp_stack[-1].append(ir)
+        return IRValue(ir, t, True)
+
+    def consume(self, value: IRValue) -> str:
+        """Hand a handle over to a new owner, copying it if it is borrowed."""
+        if not self.is_handle(value.type):
+            return value.ir
+        if value.owned:
+            for frame in reversed(self.temp_stack):
+                if value.ir in frame:
+                    frame.remove(value.ir)
+                    return value.ir
+        return self.call_runtime("lors_copy", value.ir)
+
+    def free_temps(self, temps: list):
+        for ir in temps:
+            self.call_runtime("lors_free", ir)
+
+    def free_locals(self):
+        for slot in self.owned_slots:
+            self.call_runtime("lors_free", self.emit_value(f"load i8*, i8** {slot}"))
+
+    # ---- conversions ----
+
+    def coerce(self, value: IRValue, t: TypeNode) -> IRValue:
+        src, dst = value.type.name, t.name
+        if src == dst or (src == "char" and dst == "whole"):
+            return value if src == dst else IRValue(value.ir, t)
+        if src in NUMERIC and dst in NUMERIC:
+            if dst == "precise":
+                op = "uitofp i1" if src == "state" else "sitofp i64"
+                return IRValue(self.emit_value(f"{op} {value.ir} to double"), t)
+            if dst == "state":
+                if src == "precise":
+                    return IRValue(self.emit_value(f"fcmp une double {value.ir}, 0.0"), t)
+                return IRValue(self.emit_value(f"icmp ne i64 {value.ir}, 0"), t)
+            if src == "precise":
+                return IRValue(self.emit_value(f"fptosi double {value.ir} to i64"), t)
+            if src == "state":
+                return IRValue(self.emit_value(f"zext i1 {value.ir} to i64"), t)
+            return IRValue(value.ir, t)
+        raise SyntaxError(f"Cannot convert {self.type_name(value.type)} to {self.type_name(t)}")
+
+    def to_bits(self, value: IRValue) -> str:
+        # Raw 64-bit slot contents, as the runtime containers store them
+        if value.type.name == "precise":
+            return self.emit_value(f"bitcast double {value.ir} to i64")
+        if value.type.name == "state":
+            return self.emit_value(f"zext i1 {value.ir} to i64")
+        if self.is_handle(value.type):
+            return self.emit_value(f"ptrtoint i8* {value.ir} to i64")
+        if value.type.name == "void":
+            return "0"
+        return value.ir
+
+    def flag(self, t: TypeNode) -> str:
+        return "1" if t.name == "precise" else "0"
+
+    # ---- declarations ----
+
+    def visit(self, node: ASTNode):
+        method_name = f'visit_{type(node).__name__}'
+        visitor = getattr(self, method_name, self.generic_visit)
+        return visitor(node)
+
+    def generic_visit(self, node: ASTNode):
+        raise SyntaxError(f"'{type(node).__name__}' is not supported by the LLVM backend")
+
+    def visit_Program(self, node: Program):
+        # Before resolve_types turns views into series
+        check_views(node)
+        self.global_writes = global_writes(node)
+        self.global_reads = global_reads(node)
+        self.memoised = memoised_algorithms(node)
+        if self.memoised:
+            self.pure = pure_algorithms(node)
+        for decl in node.declarations:
+            if isinstance(decl, StructDeclaration):
+                for field in decl.fields:
+                    self.resolve_types(field.var_type)
+                self.structs[decl.name] = decl.fields
+            elif isinstance(decl, FunctionDeclaration):
+                for t in [decl.return_type] + [p.param_type for p in decl.params]:
+                    self.resolve_types(t)
+                self.signatures[decl.name] = decl
+            elif isinstance(decl, VariableDeclaration):
+                self.resolve_types(decl.var_type)
+                self.global_vars[decl.name] = (f"@lors.g.{decl.name}", decl.var_type)
+        if "genesis" not in self.signatures:
+            raise SyntaxError("Program has no 'genesis' algorithm")
+
+        for decl in node.declarations:
+            if isinstance(decl, StructDeclaration):
+                self.emit_struct(decl)
+            elif isinstance(decl, FunctionDeclaration) and decl.body is not None:
+                self.emit_function(decl)
+        self.emit_globals(node)
+        self.emit_main()
+
+    def emit_struct(self, node: StructDeclaration):
+        mask = "".join("\\01" if self.is_handle(f.var_type) else "\\00" for f in node.fields) or "\\00"
+        size = max(len(node.fields), 1)
+        self.globals.append(f"@lors.mask.{node.name} = private unnamed_addr constant [{size} x i8] c\"{mask}\"")
+
+        # Field-wise constructor: Name(a, b, ...) takes ownership of its arguments
+        self.begin_function()
+        params = []
+        record = self.call_runtime("lors_rec_new", str(len(node.fields)),
+                                   f"getelementptr inbounds ([{size} x i8], [{size} x i8]* @lors.mask.{node.name}, i64 0, i64 0)")
+        base = self.emit_value(f"bitcast i8* {record} to i64*")
+        for index, field in enumerate(node.fields):
+            param = f"%p.{field.name}"
+            params.append(f"{self.reg_type(field.var_type)} {param}")
+            self.store(param, self.slot_address(base, str(3 + index), field.var_type), field.var_type)
+        self.terminate(f"ret i8* {record}")
+        self.end_function(f"define internal i8* @lors.new.{node.name}({', '.join(params)})")
+
+        # Default constructor: field initializers, or each type's empty value
+        self.begin_function()
+        self.temp_stack.append([])
+        args = []
+        for field in node.fields:
+            if field.initializer is not None:
+                value = self.coerce(self.expr(field.initializer, field.var_type), field.var_type)
+            else:
+                value = self.default_value(field.var_type)
+            args.append(f"{self.reg_type(field.var_type)} {self.consume(value)}")
+        self.free_temps(self.temp_stack.pop())
+        record = self.emit_value(f"call i8* @lors.new.{node.name}({', '.join(args)})")
+        self.terminate(f"ret i8* {record}")
+        self.end_function(f"define internal i8* @lors.default.{node.name}()")
+
+    def default_value(self, t: TypeNode) -> IRValue:
+        if t.name == "precise":
+            return IRValue("0.0", t)
+        if t.name == "state":
+            return IRValue("false", t)
+        if t.name in ("whole", "char"):
+            return IRValue("0", t)
+        if t.name == "series":
+            return self.temp(self.call_runtime("lors_str_empty"), t)
+        if t.name == "sequence":
+            handles = "1" if self.is_handle(t.subtype) else "0"
+            return self.temp(self.call_runtime("lors_seq_new", handles, "0"), t)
+        if t.name == "catalog":
+            handles = "1" if self.is_handle(t.value_subtype) else "0"
+            return self.temp(self.call_runtime("lors_cat_new", str(self.key_kind(t.subtype)), handles), t)
+        if t.name == "matrix":
+            return self.temp(self.call_runtime("lors_mat_zeros", "0", "0"), t)
+        if t.name in self.structs:
+            return self.temp(self.emit_value(f"call i8* @lors.default.{t.name}()"), t)
+        raise SyntaxError(f"Unknown type '{t.name}'")
+
+    def emit_function(self, node: FunctionDeclaration):
+        self.begin_function()
+        self.return_type = node.return_type
+        params = []
+        for param in node.params:
+            reg = f"%p.{param.name}"
+            params.append(f"{self.reg_type(param.param_type)} {reg}")
+            # Parameters are passed by value: the callee owns its copy
+            slot = self.declare_local(param.name, param.param_type)
+            self.store(reg, slot, param.param_type)
+        self.visit_Block(node.body)
+        if not self.terminated:
+            # Falling off the end: release locals, return the type's empty value
+            if node.return_type.name == "void":
+                self.free_locals()
+                self.terminate("ret void")
+            else:
+                self.temp_stack.append([])
+                value = self.consume(self.default_value(node.return_type))
+                self.temp_stack.pop()
+                self.free_locals()
+                self.terminate(f"ret {self.reg_type(node.return_type)} {value}")
+        ret = self.reg_type(node.return_type)
+        if node.memoised:
+            self.end_function(f"define internal {ret} @lors.uncached.{node.name}({', '.join(params)})")
+            self.emit_memoised(node)
+        else:
+            self.end_function(f"define internal {ret} @lors.{node.name}({', '.join(params)})")
+
+    def emit_memoised(self, node: FunctionDeclaration):
+        """@lors.<name> looks its arguments up and only calls the body on a miss."""
+        check_memoised(node, self.pure)
+        cache = f"@lors.memo.{node.name}"
+        self.globals.append(f"{cache} = internal global i8* null")
+        self.begin_function()
+        ret = self.reg_type(node.return_type)
+        handles = self.is_handle(node.return_type)
+        memo = self.call_runtime("lors_memo_cache", cache, str(node.memo_capacity), "1" if handles else "0")
+        key = self.call_runtime("lors_str_empty")
+        for param in node.params:
+            reg = f"%p.{param.name}"
+            if param.param_type.name == "series":
+                self.call_runtime("lors_memo_key_str", key, reg)
+            elif param.param_type.name == "precise":
+                self.call_runtime("lors_memo_key_f64", key, reg)
+            else:
+                self.call_runtime("lors_memo_key_word", key, self.to_bits(IRValue(reg, param.param_type)))
+        self.allocas.append("%memo.out = alloca i64")
+        found = self.call_runtime("lors_memo_find", memo, key, "%memo.out")
+        hit = self.emit_value(f"icmp ne i64 {found}, 0")
+        self.terminate(f"br i1 {hit}, label %hit, label %miss")
+
+        self.start_block("hit")
+        self.call_runtime("lors_free", key)
+        for param in node.params:
+            # The callee owns its arguments
+            if self.is_handle(param.param_type):
+                self.call_runtime("lors_free", f"%p.{param.name}")
+        bits = self.emit_value("load i64, i64* %memo.out")
+        self.terminate(f"ret {ret} {self.from_bits(bits, node.return_type).ir}")
+
+        self.start_block("miss")
+        params = [f"{self.reg_type(p.param_type)} %p.{p.name}" for p in node.params]
+        result = self.emit_value(f"call {ret} @lors.uncached.{node.name}({', '.join(params)})")
+        stored = self.call_runtime("lors_copy", result) if handles else result
+        self.call_runtime("lors_memo_put", memo, key, self.to_bits(IRValue(stored, node.return_type)))
+        self.terminate(f"ret {ret} {result}")
+        self.end_function(f"define internal {ret} @lors.{node.name}({', '.join(params)})")
+
+    def emit_globals(self, node: Program):
+        # Globals are initialised in declaration order before genesis runs
+        self.begin_function()
+        for decl in node.declarations:
+            if isinstance(decl, VariableDeclaration):
+                mem = self.mem_type(decl.var_type)
+                init = "null" if self.is_handle(decl.var_type) else "zeroinitializer"
+                self.globals.append(f"@lors.g.{decl.name} = internal global {mem} {init}")
+                self.temp_stack.append([])
+                if decl.initializer is not None:
+                    value = self.expr(decl.initializer, decl.var_type)
+                else:
+                    value = self.default_value(decl.var_type)
+                self.replace(value, f"@lors.g.{decl.name}", decl.var_type)
+                self.free_temps(self.temp_stack.pop())
+        self.terminate("ret void")
+        self.end_function("define internal void @lors.globals()")
+
+    def emit_main(self):
+        genesis = self.signatures["genesis"]
+        self.begin_function()
+        self.call_runtime("lors_init", "%argc", "%argv")
+        self.emit("call void @lors.globals()")
+        ret = self.reg_type(genesis.return_type)
+        if ret == "void":
+            self.emit("call void @lors.genesis()")
+            self.terminate("ret i32 0")
+        else:
+            code = self.emit_value(f"call {ret} @lors.genesis()")
+            code = self.coerce(IRValue(code, genesis.return_type), WHOLE).ir
+            self.terminate(f"ret i32 {self.emit_value(f'trunc i64 {code} to i32')}")
+        self.end_function("define i32 @main(i32 %argc, i8** %argv)")
+
+    # ---- statements ----
+
+    def visit_statement(self, node: ASTNode):
+        self.temp_stack.append([])
+        self.visit(node)
+        temps = self.temp_stack.pop()
+        if not self.terminated:
+            self.free_temps(temps)
+
+    def visit_Block(self, node: Block):
+        self.scopes.append({})
+        for stmt in node.statements:
+            self.visit_statement(stmt)
+        self.scopes.pop()
+
+    def visit_VariableDeclaration(self, node: VariableDeclaration):
+        self.resolve_types(node.var_type)
+        self.reg_type(node.var_type)
+        if node.initializer is not None:
+            value = self.expr(node.initializer, node.var_type)
+        else:
+            value = self.default_value(node.var_type)
+        # Evaluated before the name comes into scope, so 'datum x = x' sees the outer x
+        slot = self.declare_local(node.name, node.var_type)
+        self.replace(value, slot, node.var_type)
+
+    def visit_StructDeclaration(self, node: StructDeclaration):
+        raise SyntaxError(f"Structure '{node.name}' must be declared at the top level")
+
+    def visit_FunctionDeclaration(self, node: FunctionDeclaration):
+        raise SyntaxError(f"Algorithm '{node.name}' must be declared at the top level")
+
+    def visit_IfStatement(self, node: IfStatement):
+        cond = self.coerce(self.expr(node.condition), STATE)
+        then_label = self.new_label("then")
+        else_label = self.new_label("else")
+        end_label = self.new_label("endif")
+        self.terminate(f"br i1 {cond.ir}, label %{then_label}, label %{else_label if node.else_branch else end_label}")
+        self.start_block(then_label)
+        self.visit_Block(node.then_branch)
+        if node.else_branch:
+            if not self.terminated:
+                self.terminate(f"br label %{end_label}")
+            self.start_block(else_label)
+            self.visit_Block(node.else_branch)
+        self.label(end_label)
+
+    def visit_WhileStatement(self, node: WhileStatement):
+        cond_label = self.new_label("while")
+        body_label = self.new_label("body")
+        end_label = self.new_label("endwhile")
+        self.label(cond_label)
+        # The condition's temporaries are released on every evaluation
+        self.temp_stack.append([])
+        cond = self.coerce(self.expr(node.condition), STATE)
+        self.free_temps(self.temp_stack.pop())
+        self.terminate(f"br i1 {cond.ir}, label %{body_label}, label %{end_label}")
+        self.start_block(body_label)
+        self.loop_heads.append(cond_label)
+        self.visit_Block(node.body)
+        self.loop_heads.pop()
+        if not self.terminated:
+            self.terminate(f"br label %{cond_label}")
+        self.start_block(end_label)
+
+    def counted_loop(self, start: IRValue, end: IRValue, body):
+        """for (i = start; i < end; ++i) body(i), with i read-only to the body."""
+        counter = self.fresh("i.")
+        self.allocas.append(f"{counter} = alloca i64")
+        self.store(start.ir, counter, WHOLE)
+        cond_label = self.new_label("loop")
+        body_label = self.new_label("body")
+        end_label = self.new_label("endloop")
+        self.label(cond_label)
+        index = self.load(counter, WHOLE)
+        cond = self.emit_value(f"icmp slt i64 {index}, {end.ir}")
+        self.terminate(f"br i1 {cond}, label %{body_label}, label %{end_label}")
+        self.start_block(body_label)
+        body(index)
+        if not self.terminated:
+            step = self.emit_value(f"add i64 {self.load(counter, WHOLE)}, 1")
+            self.store(step, counter, WHOLE)
+            self.terminate(f"br label %{cond_label}")
+        self.start_block(end_label)
+
+    def visit_ForEachStatement(self, node: ForEachStatement):
+        check_for_each(node, self.global_writes)
+        iterable = self.expr(node.iterable)
+        kind = iterable.type.name
+        if kind == "series":
+            length = self.string_length(iterable)
+        elif kind == "sequence":
+            length = self.seq_field(iterable.ir, 1, "i64")
+            # The body cannot resize the sequence, so its storage stays put
+            data = self.seq_field(iterable.ir, 3, "i64*")
+        else:
+            raise SyntaxError(f"'cycle each' needs a sequence or series, not {self.type_name(iterable.type)}")
+
+        def body(index: str):
+            self.scopes.append({})
+            if node.index_name:
+                self.store(index, self.declare_local(node.index_name, WHOLE), WHOLE)
+            if kind == "series":
+                # Characters are whole values, as with char_at
+                code = self.call_runtime("lors_str_char_at", iterable.ir, index)
+                self.store(code, self.declare_local(node.item_name, WHOLE), WHOLE)
+            else:
+                # The item refers to the element, so writes update it in place
+                slot = self.slot_address(data, index, iterable.type.subtype)
+                self.scopes[-1][node.item_name] = (slot, iterable.type.subtype)
+            self.visit_Block(node.body)
+            self.scopes.pop()
+
+        self.counted_loop(IRValue("0", WHOLE), IRValue(length, WHOLE), body)
+
+    def visit_ParallelForStatement(self, node: ParallelForStatement):
+        # Same race rules as the C++ backend; the iterations then run serially
+        check_parallel_races(node, self.global_writes, lambda name: self.lookup(name)[1])
+        start = self.coerce(self.expr(node.start), WHOLE)
+        end = self.coerce(self.expr(node.end), WHOLE)
+
+        def body(index: str):
+            self.scopes.append({})
+            self.store(index, self.declare_local(node.var_name, WHOLE), WHOLE)
+            self.visit_Block(node.body)
+            self.scopes.pop()
+
+        self.counted_loop(start, end, body)
+
+    def visit_ReturnStatement(self, node: ReturnStatement):
+        if node.value is None:
+            value = None
+        elif isinstance(node.value, Identifier) and self.movable_local(node.value.name):
+            # Returning a local moves it out instead of copying
+            slot, t = self.lookup(node.value.name)
+            value = self.coerce(IRValue(self.load(slot, t), t), self.return_type)
+            if self.is_handle(t):
+                self.emit(f"store i8* null, i8** {slot}")
+        else:
+            value = self.coerce(self.expr(node.value, self.return_type), self.return_type)
+            value = IRValue(self.consume(value), value.type)
+        for frame in self.temp_stack:
+            self.free_temps(frame)
+        self.free_locals()
+        if value is None or self.return_type.name == "void":
+            self.terminate("ret void" if self.return_type.name == "void" else
+                           f"ret {self.reg_type(self.return_type)} {self.consume(self.default_value(self.return_type))}")
+        else:
+            self.terminate(f"ret {self.reg_type(self.return_type)} {value.ir}")
+
+    def visit_ContinueStatement(self, node: ContinueStatement):
+        self.terminate(f"br label %{self.loop_heads[-1]}")
+
+    def movable_local(self, name: str) -> bool:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name][0] in self.owned_slots
+        return False
+
+    def visit_ExpressionStatement(self, node: ExpressionStatement):
+        self.expr(node.expression)
+
+    def visit_Assignment(self, node: Assignment):
+        addr, t = self.lookup(node.name)
+        self.replace(self.expr(node.value, t), addr, t)
+
+    def visit_ArrayAssignment(self, node: ArrayAssignment):
+        addr, t = self.lookup(node.name)
+        if t.name == "series":
+            string = self.load(addr, t)
+            index = self.coerce(self.expr(node.index), WHOLE)
+            char = self.coerce(self.expr(node.value), WHOLE)
+            self.call_runtime("lors_str_set_char", string, index.ir, char.ir)
+            return
+        target, elem = self.address_of(ArrayAccess(node.name, node.index))
+        self.replace(self.expr(node.value, elem), target, elem)
+
+    def visit_MatrixAssignment(self, node: MatrixAssignment):
+        target, elem = self.address_of(MatrixAccess(node.name, node.row, node.col))
+        self.replace(self.expr(node.value, elem), target, elem)
+
+    def visit_MemberAssignment(self, node: MemberAssignment):
+        target, t = self.address_of(MemberAccess(node.object, node.member_name))
+        self.replace(self.expr(node.value, t), target, t)
+
+    # ---- expressions ----
+
+    def expr(self, node: ASTNode, expected: Optional[TypeNode] = None) -> IRValue:
+        method_name = f'expr_{type(node).__name__}'
+        visitor = getattr(self, method_name, None)
+        if visitor is None:
+            raise SyntaxError(f"Unknown expression type {type(node).__name__}")
+        return visitor(node, expected)
+
+    def expr_Literal(self, node: Literal, expected) -> IRValue:
+        if node.value_type == "series":
+            return IRValue(self.string_constant(node.value), SERIES)
+        if node.value_type == "state":
+            return IRValue("true" if node.value else "false", STATE)
+        if node.value_type == "precise":
+            bits = struct.unpack("<Q", struct.pack("<d", node.value))[0]
+            return IRValue(f"0x{bits:016X}", PRECISE)
+        return IRValue(str(node.value), WHOLE)
+
+    def string_constant(self, raw: str) -> str:
+        """A static (never freed) series object for a literal."""
+        if raw not in self.strings:
+            data = self.unescape(raw).encode("utf-8")
+            n = len(self.strings)
+            encoded = "".join(chr(b) if 32 <= b < 127 and b not in (34, 92) else f"\\{b:02X}" for b in data)
+            size = len(data) + 1
+            self.globals.append(f"@.cstr.{n} = private unnamed_addr constant [{size} x i8] c\"{encoded}\\00\"")
+            # Header: LORS_STR | LORS_STATIC
+            self.globals.append(f"@.str.{n} = private constant %LorsStr {{ i64 4294967297, i64 {len(data)}, i64 0, "
+                                f"i8* getelementptr inbounds ([{size} x i8], [{size} x i8]* @.cstr.{n}, i64 0, i64 0) }}")
+            self.strings[raw] = f"bitcast (%LorsStr* @.str.{n} to i8*)"
+        return self.strings[raw]
+
+    def unescape(self, raw: str) -> str:
+        # The C++ backend leaves escapes to the C++ compiler; mirror the common ones
+        out = []
+        i = 0
+        while i < len(raw):
+            if raw[i] == "\\" and i + 1 < len(raw) and raw[i + 1] in ESCAPES:
+                out.append(ESCAPES[raw[i + 1]])
+                i += 2
+            else:
+                out.append(raw[i])
+                i += 1
+        return "".join(out)
+
+    def expr_Identifier(self, node: Identifier, expected) -> IRValue:
+        return self.variable_value(node.name)
+
+    def expr_ArrayAccess(self, node: ArrayAccess, expected) -> IRValue:
+        container = self.variable_value(node.array_name)
+        if container.type.name == "series":
+            index = self.coerce(self.expr(node.index), WHOLE)
+            return IRValue(self.call_runtime("lors_str_char_at", container.ir, index.ir), CHAR)
+        addr, t = self.address_of(node)
+        return IRValue(self.load(addr, t), t)
+
+    def expr_MatrixAccess(self, node: MatrixAccess, expected) -> IRValue:
+        addr, t = self.address_of(node)
+        return IRValue(self.load(addr, t), t)
+
+    def expr_MemberAccess(self, node: MemberAccess, expected) -> IRValue:
+        addr, t = self.address_of(node)
+        return IRValue(self.load(addr, t), t)
+
+    def expr_InquireExpression(self, node: InquireExpression, expected) -> IRValue:
+        if expected is None:
+            raise SyntaxError("inquire() needs a declared target type")
+        if expected.name == "precise":
+            return IRValue(self.call_runtime("lors_read_f64"), PRECISE)
+        if expected.name == "series":
+            return self.temp(self.call_runtime("lors_read_str"), SERIES)
+        if expected.name in ("whole", "state"):
+            return IRValue(self.call_runtime("lors_read_i64"), WHOLE)
+        raise SyntaxError(f"inquire() cannot read a {self.type_name(expected)}")
+
+    def expr_DispatchExpression(self, node: DispatchExpression, expected) -> IRValue:
+        # Same checks as the C++ backend; the call then runs right away
+        check_dispatch(node, self.signatures, self.global_writes, self.global_reads)
+        return self.call_algorithm(FunctionCall(node.name, node.arguments))
+
+    def expr_ArrayLiteral(self, node: ArrayLiteral, expected) -> IRValue:
+        if expected is not None and expected.name == "sequence":
+            elem = expected.subtype
+        elif node.elements:
+            elem = None
+        else:
+            raise SyntaxError("Cannot infer the element type of an empty sequence literal")
+
+        values = []
+        for element in node.elements:
+            value = self.expr(element, elem)
+            elem = elem or value.type
+            values.append(self.coerce(value, elem))
+
+        seq_type = TypeNode("sequence", elem)
+        handles = "1" if self.is_handle(elem) else "0"
+        seq = self.call_runtime("lors_seq_new", handles, str(len(values)))
+        data = self.seq_field(seq, 3, "i64*")
+        for index, value in enumerate(values):
+            bits = self.to_bits(IRValue(self.consume(value), value.type))
+            self.emit(f"store i64 {bits}, i64* {self.slot_address(data, str(index), WHOLE)}")
+        return self.temp(seq, seq_type)
+
+    def expr_BinaryOp(self, node: BinaryOp, expected) -> IRValue:
+        op = node.operator
+        if op == "not":
+            value = self.coerce(self.expr(node.right), STATE)
+            return IRValue(self.emit_value(f"xor i1 {value.ir}, true"), STATE)
+        if op == "-" and node.left is None:
+            value = self.expr(node.right)
+            if value.type.name == "precise":
+                return IRValue(self.emit_value(f"fneg double {value.ir}"), PRECISE)
+            value = self.coerce(value, WHOLE)
+            return IRValue(self.emit_value(f"sub i64 0, {value.ir}"), WHOLE)
+        if op in ("and", "or"):
+            return self.short_circuit(node)
+
+        left = self.expr(node.left)
+        right = self.expr(node.right)
+        if left.type.name == "series" or right.type.name == "series":
+            return self.string_op(op, left, right)
+
+        if left.type.name not in NUMERIC or right.type.name not in NUMERIC:
+            raise SyntaxError(f"Operator '{op}' is not defined for {self.type_name(left.type)} "
+                              f"and {self.type_name(right.type)}")
+        # Usual arithmetic conversions: precise wins, everything else is whole
+        common = PRECISE if PRECISE.name in (left.type.name, right.type.name) else WHOLE
+        a = self.coerce(left, common).ir
+        b = self.coerce(right, common).ir
+        if op in INT_COMPARE:
+            if common is PRECISE:
+                return IRValue(self.emit_value(f"fcmp {FLOAT_COMPARE[op]} double {a}, {b}"), STATE)
+            return IRValue(self.emit_value(f"icmp {INT_COMPARE[op]} i64 {a}, {b}"), STATE)
+        if common is PRECISE:
+            return IRValue(self.emit_value(f"{FLOAT_OPS[op]} double {a}, {b}"), PRECISE)
+        return IRValue(self.emit_value(f"{INT_OPS[op]} i64 {a}, {b}"), WHOLE)
+
+    def string_op(self, op: str, left: IRValue, right: IRValue) -> IRValue:
+        # series + char appends the character, like std::string + char
+        if op == "+" and right.type.name == "char":
+            right = self.temp(self.call_runtime("lors_str_from_char", right.ir), SERIES)
+        if left.type.name != "series" or right.type.name != "series":
+            raise SyntaxError(f"Operator '{op}' is not defined for {self.type_name(left.type)} "
+                              f"and {self.type_name(right.type)}")
+        if op == "+":
+            return self.temp(self.call_runtime("lors_str_concat", left.ir, right.ir), SERIES)
+        if op in INT_COMPARE:
+            cmp = self.call_runtime("lors_str_cmp", left.ir, right.ir)
+            return IRValue(self.emit_value(f"icmp {INT_COMPARE[op]} i64 {cmp}, 0"), STATE)
+        raise SyntaxError(f"Operator '{op}' is not defined for series")
+
+    def short_circuit(self, node: BinaryOp) -> IRValue:
+        left = self.coerce(self.expr(node.left), STATE)
+        start = self.current_block
+        rhs_label = self.new_label("rhs")
+        end_label = self.new_label("endlogic")
+        if node.operator == "and":
+            self.terminate(f"br i1 {left.ir}, label %{rhs_label}, label %{end_label}")
+        else:
+            self.terminate(f"br i1 {left.ir}, label %{end_label}, label %{rhs_label}")
+        self.start_block(rhs_label)
+        # Only evaluated on one path, so its temporaries are released here
+        self.temp_stack.append([])
+        right = self.coerce(self.expr(node.right), STATE)
+        self.free_temps(self.temp_stack.pop())
+        rhs_end = self.current_block
+        self.label(end_label)
+        skipped = "false" if node.operator == "and" else "true"
+        return IRValue(self.emit_value(f"phi i1 [ {skipped}, %{start} ], [ {right.ir}, %{rhs_end} ]"), STATE)
+
+    def string_length(self, value: IRValue) -> str:
+        string = self.emit_value(f"bitcast i8* {value.ir} to %LorsStr*")
+        ptr = self.emit_value(f"getelementptr inbounds %LorsStr, %LorsStr* {string}, i32 0, i32 1")
+        return self.emit_value(f"load i64, i64* {ptr}")
+
+    def expr_FunctionCall(self, node: FunctionCall, expected) -> IRValue:
+        name = node.name
+        args = node.arguments
+
+        if name in self.structs:
+            return self.construct(node)
+        if name in self.signatures:
+            return self.call_algorithm(node)
+
+        if name == "reveal":
+            for arg in args:
+                self.reveal_value(self.expr(arg))
+            self.call_runtime("lors_print_end")
+            return IRValue(None, VOID)
+
+        if name in SIMPLE_INTRINSICS:
+            runtime, param_types, result = SIMPLE_INTRINSICS[name]
+            self.check_arity(node, len(param_types))
+            values = [self.coerce(self.expr(arg, t), t).ir for arg, t in zip(args, param_types)]
+            ir = self.call_runtime(runtime, *values)
+            if result.name == "void":
+                return IRValue(None, VOID)
+            if result.name == "state":
+                return IRValue(self.emit_value(f"icmp ne i64 {ir}, 0"), STATE)
+            if self.is_handle(result):
+                return self.temp(ir, result)
+            return IRValue(ir, result)
+
+        if name in ("length", "size"):
+            self.check_arity(node, 1)
+            value = self.expr(args[0])
+            if value.type.name == "series":
+                return IRValue(self.string_length(value), WHOLE)
+            if value.type.name == "sequence":
+                return IRValue(self.seq_field(value.ir, 1, "i64"), WHOLE)
+            if value.type.name == "catalog" and name == "size":
+                return IRValue(self.call_runtime("lors_cat_size", value.ir), WHOLE)
+            raise SyntaxError(f"{name}() is not defined for {self.type_name(value.type)}")
+
+        if name in ("rows", "cols"):
+            self.check_arity(node, 1)
+            matrix = self.expect(self.expr(args[0]), "matrix", name)
+            mat = self.emit_value(f"bitcast i8* {matrix.ir} to %LorsMat*")
+            ptr = self.emit_value(f"getelementptr inbounds %LorsMat, %LorsMat* {mat}, i32 0, "
+                                  f"i32 {1 if name == 'rows' else 2}")
+            return IRValue(self.emit_value(f"load i64, i64* {ptr}"), WHOLE)
+
+        if name == "to_string":
+            self.check_arity(node, 1)
+            value = self.expr(args[0])
+            if value.type.name == "precise":
+                return self.temp(self.call_runtime("lors_str_from_f64", value.ir), SERIES)
+            value = self.coerce(value, WHOLE)
+            return self.temp(self.call_runtime("lors_str_from_i64", value.ir), SERIES)
+
+        if name == "absolute":
+            self.check_arity(node, 1)
+            value = self.expr(args[0])
+            if value.type.name == "precise":
+                return IRValue(self.call_runtime("fabs", value.ir), PRECISE)
+            value = self.coerce(value, WHOLE)
+            negative = self.emit_value(f"icmp slt i64 {value.ir}, 0")
+            negated = self.emit_value(f"sub i64 0, {value.ir}")
+            return IRValue(self.emit_value(f"select i1 {negative}, i64 {negated}, i64 {value.ir}"), WHOLE)
+
+        if name == "append":
+            self.check_arity(node, 2)
+            seq = self.expect(self.expr(args[0]), "sequence", name)
+            item = self.coerce(self.expr(args[1], seq.type.subtype), seq.type.subtype)
+            bits = self.to_bits(IRValue(self.consume(item), item.type))
+            self.call_runtime("lors_seq_push", seq.ir, bits)
+            return IRValue(None, VOID)
+
+        if name in ("put", "get", "has", "remove", "keys"):
+            return self.catalog_call(node)
+
+        if name == "await":
+            self.check_arity(node, 1)
+            return self.expr(args[0], expected)
+
+        if name in ("memo_hits", "memo_misses"):
+            target = memo_target(node, self.memoised)
+            memo = self.emit_value(f"load i8*, i8** @lors.memo.{target}")
+            return IRValue(self.call_runtime(f"lors_{name}", memo), WHOLE)
+
+        if name in ("sum", "dot", "scale", "axpy", "elementwise_add", "elementwise_mul",
+                    "min_of", "max_of", "mean", "variance"):
+            return self.kernel_call(node)
+
+        raise SyntaxError(f"Unknown algorithm '{name}'")
+
+    def check_arity(self, node: FunctionCall, count: int):
+        if len(node.arguments) != count:
+            raise SyntaxError(f"'{node.name}' expects {count} argument(s), got {len(node.arguments)}")
+
+    def expect(self, value: IRValue, kind: str, name: str) -> IRValue:
+        if value.type.name != kind:
+            raise SyntaxError(f"{name}() expects a {kind}, not {self.type_name(value.type)}")
+        return value
+
+    def reveal_value(self, value: IRValue):
+        kind = value.type.name
+        if kind == "whole":
+            self.call_runtime("lors_print_i64", value.ir)
+        elif kind == "precise":
+            self.call_runtime("lors_print_f64", value.ir)
+        elif kind == "state":
+            self.call_runtime("lors_print_i64", self.coerce(value, WHOLE).ir)
+        elif kind == "char":
+            self.call_runtime("lors_print_char", value.ir)
+        elif kind == "series":
+            self.call_runtime("lors_print_str", value.ir)
+        elif kind == "matrix":
+            self.call_runtime("lors_print_mat", value.ir)
+        else:
+            raise SyntaxError(f"Cannot reveal a value of type {self.type_name(value.type)}")
+
+    def call_algorithm(self, node: FunctionCall) -> IRValue:
+        decl = self.signatures[node.name]
+        self.check_arity(node, len(decl.params))
+        args = []
+        for arg, param in zip(node.arguments, decl.params):
+            value = self.coerce(self.expr(arg, param.param_type), param.param_type)
+            args.append(f"{self.reg_type(param.param_type)} {self.consume(value)}")
+        ret = self.reg_type(decl.return_type)
+        call = f"call {ret} @lors.{node.name}({', '.join(args)})"
+        if ret == "void":
+            self.emit(call)
+            return IRValue(None, VOID)
+        result = self.emit_value(call)
+        if self.is_handle(decl.return_type):
+            return self.temp(result, decl.return_type)
+        return IRValue(result, decl.return_type)
+
+    def construct(self, node: FunctionCall) -> IRValue:
+        t = TypeNode(node.name)
+        if not node.arguments:
+            return self.default_value(t)
+        fields = self.structs[node.name]
+        self.check_arity(node, len(fields))
+        args = []
+        for arg, field in zip(node.arguments, fields):
+            value = self.coerce(self.expr(arg, field.var_type), field.var_type)
+            args.append(f"{self.reg_type(field.var_type)} {self.consume(value)}")
+        return self.temp(self.emit_value(f"call i8* @lors.new.{node.name}({', '.join(args)})"), t)
+
+    def catalog_call(self, node: FunctionCall) -> IRValue:
+        name = node.name
+        self.check_arity(node, {"put": 3, "keys": 1}.get(name, 2))
+        catalog = self.expect(self.expr(node.arguments[0]), "catalog", name)
+        key_type, value_type = catalog.type.subtype, catalog.type.value_subtype
+        if name == "keys":
+            return self.temp(self.call_runtime("lors_cat_keys", catalog.ir), TypeNode("sequence", key_type))
+
+        # Keys are borrowed: the catalog copies a series key when it inserts it
+        key = self.to_bits(self.coerce(self.expr(node.arguments[1], key_type), key_type))
+        if name == "put":
+            value = self.coerce(self.expr(node.arguments[2], value_type), value_type)
+            bits = self.to_bits(IRValue(self.consume(value), value.type))
+            self.call_runtime("lors_cat_put", catalog.ir, key, bits)
+            return IRValue(None, VOID)
+        if name == "get":
+            slot = self.call_runtime("lors_cat_get", catalog.ir, key)
+            mem = self.mem_type(value_type)
+            if mem != "i64":
+                slot = self.emit_value(f"bitcast i64* {slot} to {mem}*")
+            return IRValue(self.load(slot, value_type), value_type)
+        if name == "has":
+            found = self.call_runtime("lors_cat_has", catalog.ir, key)
+            return IRValue(self.emit_value(f"icmp ne i64 {found}, 0"), STATE)
+        return IRValue(self.call_runtime("lors_cat_remove", catalog.ir, key), WHOLE)
+
+    def kernel_call(self, node: FunctionCall) -> IRValue:
+        name = node.name
+        args = node.arguments
+
+        def sequence(arg: ASTNode) -> IRValue:
+            value = self.expect(self.expr(arg), "sequence", name)
+            if value.type.subtype.name not in ("whole", "precise"):
+                raise SyntaxError(f"{name}() needs a sequence of whole or precise values")
+            return value
+
+        def scalar(arg: ASTNode) -> IRValue:
+            value = self.expr(arg)
+            if value.type.name != "precise":
+                value = self.coerce(value, WHOLE)
+            return value
+
+        def promoted(*types: TypeNode) -> TypeNode:
+            return PRECISE if any(t.name == "precise" for t in types) else WHOLE
+
+        if name in ("sum", "min_of", "max_of", "mean", "variance"):
+            self.check_arity(node, 1)
+            v = sequence(args[0])
+            elem = v.type.subtype
+            result = self.call_runtime(f"lors_{name}", v.ir, self.flag(elem))
+            if name in ("mean", "variance"):
+                return IRValue(result, PRECISE)
+            return self.from_bits(result, elem)
+
+        if name == "dot":
+            self.check_arity(node, 2)
+            a, b = sequence(args[0]), sequence(args[1])
+            result = self.call_runtime("lors_dot", a.ir, self.flag(a.type.subtype), b.ir, self.flag(b.type.subtype))
+            return self.from_bits(result, promoted(a.type.subtype, b.type.subtype))
+
+        if name in ("elementwise_add", "elementwise_mul"):
+            self.check_arity(node, 2)
+            a, b = sequence(args[0]), sequence(args[1])
+            result = self.call_runtime(f"lors_{name}", a.ir, self.flag(a.type.subtype), b.ir, self.flag(b.type.subtype))
+            return self.temp(result, TypeNode("sequence", promoted(a.type.subtype, b.type.subtype)))
+
+        if name == "scale":
+            self.check_arity(node, 2)
+            v = sequence(args[0])
+            factor = scalar(args[1])
+            self.call_runtime("lors_scale", v.ir, self.flag(v.type.subtype), self.to_bits(factor), self.flag(factor.type))
+            return IRValue(None, VOID)
+
+        # axpy(y, a, x): y = y + a * x in place
+        self.check_arity(node, 3)
+        y = sequence(args[0])
+        a = scalar(args[1])
+        x = sequence(args[2])
+        self.call_runtime("lors_axpy", y.ir, self.flag(y.type.subtype), self.to_bits(a), self.flag(a.type),
+                          x.ir, self.flag(x.type.subtype))
+        return IRValue(None, VOID)
+
+    def from_bits(self, bits: str, t: TypeNode) -> IRValue:
+        if t.name == "precise":
+            return IRValue(self.emit_value(f"bitcast i64 {bits} to double"), t)
+        if t.name == "state":
+            return IRValue(self.emit_value(f"trunc i64 {bits} to i1"), t)
+        if self.is_handle(t):
+            return IRValue(self.emit_value(f"inttoptr i64 {bits} to i8*"), t)
+        if t.name == "void":
+            return IRValue(None, t)
+        return IRValue(bits, t)
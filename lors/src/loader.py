@@ -0,0 +1,204 @@
+import copy
+import os
+from dataclasses import dataclass, field
+from lors.src.tokens import TokenType, Token
+from lors.src.lexer import Lexer
+from lors.src.parser import Parser
+from lors.src.ast_nodes import *
+
+@dataclass
+class Chunk:
+    """Source lines between two incorporate directives of one file."""
+    text: str
+    line_count: int
+    file: str
+    first_line: int
+    tokens: Optional[List[Token]] = None
+    # Offset already applied to the token lines (position in the expanded program)
+    line_offset: int = 0
+    # Top-level declarations, or None when the chunk is not a whole number of them
+    declarations: Optional[List[ASTNode]] = None
+
+class Unsplittable(Exception):
+    """A chunk could not be lexed on its own."""
+
+@dataclass
+class SourceFile:
+    path: str
+    mtime: float
+    # Chunks interleaved with absolute paths of incorporated files
+    segments: list = field(default_factory=list)
+
+class SourceLoader:
+    """Front end that caches lexed and parsed files between builds (--watch).
+
+    A file is split at its incorporate lines; each chunk is lexed and, where
+    it holds whole declarations, parsed on its own. Unchanged files (same
+    mtime) reuse their tokens and declarations. The result matches running
+    process_includes, Lexer and Parser over the expanded source; when a
+    chunk cannot be handled on its own the whole program is re-lexed or
+    re-parsed instead.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.reused = 0
+        self.loaded = 0
+
+    def load(self, path: str) -> Program:
+        self.reused = 0
+        self.loaded = 0
+        self.expanded = set()
+        path = os.path.abspath(path)
+        try:
+            tokens, declarations = self.expand(path, [], [1])
+        except Unsplittable:
+            line_map = []
+            text = self.expanded_text(path, line_map)
+            return Parser(Lexer(text, line_map).tokenize()).parse()
+        tokens.append(Token(TokenType.EOF, "", tokens[-1].line if tokens else 1, 1))
+        if declarations is None:
+            return Parser(tokens).parse()
+        # Later passes may rewrite the tree; keep the cached declarations pristine
+        return Program(copy.deepcopy(declarations))
+
+    def expanded_text(self, path: str, line_map: list) -> str:
+        """The source process_includes would produce, from the cached files."""
+        parts = []
+        for segment in self.source_file(path).segments:
+            if isinstance(segment, str):
+                parts.append(self.expanded_text(segment, line_map))
+            else:
+                parts.append(segment.text)
+                line_map.extend((segment.file, segment.first_line + k) for k in range(segment.line_count))
+        return "\n".join(parts)
+
+    def file_declarations(self, path: str) -> list:
+        """(file, declaration) pairs in program order, each file taken once (--modules).
+
+        Call after load(); every chunk must hold whole declarations.
+        """
+        pairs = []
+        seen = set()
+
+        def visit(current):
+            if current in seen:
+                return
+            seen.add(current)
+            for segment in self.source_file(current).segments:
+                if isinstance(segment, str):
+                    visit(segment)
+                elif segment.declarations is None:
+                    raise SyntaxError(f"'{current}' cannot be a module: a declaration spans an incorporate")
+                else:
+                    pairs.extend((current, decl) for decl in copy.deepcopy(segment.declarations))
+
+        visit(os.path.abspath(path))
+        return pairs
+
+    def dependencies(self, path: str) -> set:
+        """Absolute paths of a program and everything it incorporates."""
+        deps = set()
+        pending = [os.path.abspath(path)]
+        while pending:
+            current = pending.pop()
+            if current in deps:
+                continue
+            deps.add(current)
+            source = self.files.get(current)
+            if source:
+                pending.extend(s for s in source.segments if isinstance(s, str))
+        return deps
+
+    def source_file(self, path: str) -> SourceFile:
+        mtime = os.path.getmtime(path)
+        cached = self.files.get(path)
+        if cached and cached.mtime == mtime:
+            self.reused += 1
+            return cached
+        self.loaded += 1
+        with open(path, 'r') as f:
+            code = f.read()
+        source = SourceFile(path, mtime)
+        pending = []
+        for number, line in enumerate(code.split('\n'), 1):
+            parts = line.strip().split('"')
+            if line.strip().startswith("incorporate") and len(parts) >= 2:
+                if pending:
+                    source.segments.append(self.make_chunk(pending, path, number - len(pending)))
+                    pending = []
+                source.segments.append(self.resolve(parts[1], os.path.dirname(path)))
+            else:
+                pending.append(line)
+        if pending:
+            source.segments.append(self.make_chunk(pending, path, number + 1 - len(pending)))
+        self.files[path] = source
+        return source
+
+    def resolve(self, inc_path: str, base_dir: str) -> str:
+        # Same search order as process_includes: the including file's directory, then CWD
+        for candidate in (os.path.join(base_dir, inc_path), inc_path):
+            if os.path.exists(candidate):
+                return os.path.abspath(candidate)
+        raise FileNotFoundError(f"Could not find included file: '{inc_path}' (searched in: {base_dir})")
+
+    def make_chunk(self, lines: List[str], path: str, first_line: int) -> Chunk:
+        chunk = Chunk("\n".join(lines), len(lines), path, first_line)
+        try:
+            chunk.tokens = Lexer(chunk.text).tokenize()[:-1]
+        except SyntaxError:
+            # e.g. a string literal that spans an incorporate line
+            return chunk
+        for token in chunk.tokens:
+            token.file = path
+            token.source_line = token.line + first_line - 1
+        try:
+            chunk.declarations = Parser(chunk.tokens + [Token(TokenType.EOF, "", 0, 0)]).parse().declarations
+        except SyntaxError:
+            pass
+        return chunk
+
+    def expand(self, path: str, stack: List[str], next_line: List[int]):
+        """Tokens and declarations of a file with its incorporates expanded.
+
+        next_line[0] is the expanded-program line the file starts on and is
+        advanced past it. Declarations are None if any chunk failed to parse
+        on its own.
+        """
+        if path in stack:
+            raise SyntaxError(f"Circular incorporate of '{path}'")
+        source = self.source_file(path)
+        repeated = path in self.expanded
+        self.expanded.add(path)
+        tokens = []
+        declarations = []
+        for segment in source.segments:
+            if isinstance(segment, str):
+                inc_tokens, inc_declarations = self.expand(segment, stack + [path], next_line)
+                tokens.extend(inc_tokens)
+                if declarations is not None and inc_declarations is not None:
+                    declarations.extend(inc_declarations)
+                else:
+                    declarations = None
+                continue
+
+            if segment.tokens is None:
+                raise Unsplittable(path)
+            delta = (next_line[0] - 1) - segment.line_offset
+            if repeated:
+                # Incorporated twice: the first copy keeps the cached tokens
+                tokens.extend(Token(t.type, t.value, t.line + delta, t.column, t.file, t.source_line)
+                              for t in segment.tokens)
+            else:
+                if delta:
+                    # Keep token lines (and so error messages) those of the expanded source
+                    for token in segment.tokens:
+                        token.line += delta
+                    segment.line_offset += delta
+                tokens.extend(segment.tokens)
+            if declarations is not None and segment.declarations is not None:
+                declarations.extend(segment.declarations)
+            else:
+                declarations = None
+            next_line[0] += segment.line_count
+        return tokens, declarations
@@ -0,0 +1,88 @@
+import os
+import re
+from dataclasses import dataclass, field
+from lors.src.ast_nodes import *
+from lors.src.analysis import walk, root_name
+from lors.src.codegen import CodeGenerator
+
+PRELUDE_HEADER = "lors_prelude.h"
+
+@dataclass
+class Module:
+    """One source file compiled as its own translation unit (--modules)."""
+    name: str
+    path: str
+    # Structures, extern globals and prototypes
+    header: List[str] = field(default_factory=list)
+    # Global definitions and algorithm bodies
+    source: List[str] = field(default_factory=list)
+
+    def header_text(self) -> str:
+        lines = ["#pragma once", f'#include "{PRELUDE_HEADER}"', ""]
+        return "\n".join(lines + self.header) + "\n"
+
+    def source_text(self, modules: List["Module"], flags: List[str]) -> str:
+        # Flags are recorded so that changing them changes the file and forces a rebuild
+        lines = [f"// Generated by Lors Compiler from {os.path.basename(self.path)}",
+                 f"// g++ flags: {' '.join(flags)}"]
+        # Every header, in program order: a module may use any structure or
+        # algorithm declared before it, as in the single translation unit
+        lines += [f'#include "{m.name}.h"' for m in modules]
+        return "\n".join(lines + [""] + self.source) + "\n"
+
+def module_name(path: str, root_dir: str) -> str:
+    relative = os.path.splitext(os.path.relpath(path, root_dir))[0]
+    return re.sub(r"\W", "_", relative)
+
+def take(codegen: CodeGenerator) -> str:
+    text = "\n".join(codegen.code)
+    codegen.code = []
+    return text
+
+def check_initializer(decl: VariableDeclaration, module: Module, owners: dict):
+    # Globals of different translation units are initialised in an unspecified order
+    if decl.initializer is None:
+        return
+    for node in walk(decl.initializer):
+        name = root_name(node)
+        if name in owners and owners[name] != module.name:
+            raise SyntaxError(f"Global '{decl.name}' is initialised from '{name}' of another module")
+
+def generate_modules(pairs: list, root_dir: str, line_directives: bool = False):
+    """Generate C++ for a program split by source file.
+
+    pairs are (file, declaration) in program order (SourceLoader.file_declarations).
+    Declarations are visited in that order by one generator, so each sees
+    the same types as in the single translation unit. Returns the prelude
+    header, the modules and the g++ flags the code needs.
+    """
+    program = Program([decl for _, decl in pairs])
+    codegen = CodeGenerator(line_directives=line_directives)
+    codegen.program = program
+    # constexpr functions are inline: their bodies would be needed in every module
+    codegen.constexpr = False
+
+    modules = {}
+    owners = {}
+    for path, decl in pairs:
+        if path not in modules:
+            modules[path] = Module(module_name(path, root_dir), path)
+        module = modules[path]
+        if isinstance(decl, VariableDeclaration):
+            check_initializer(decl, module, owners)
+            owners[decl.name] = module.name
+
+        codegen.visit(decl)
+        text = take(codegen)
+        if isinstance(decl, StructDeclaration):
+            module.header.append(text)
+            continue
+        module.source.append(text)
+        if isinstance(decl, VariableDeclaration):
+            module.header.append(f"extern {codegen.map_type_node(decl.var_type)} {decl.name};")
+        elif isinstance(decl, FunctionDeclaration) and decl.body is not None and decl.name != "genesis":
+            module.header.append(codegen.prototype(decl))
+    # Last, so that it holds what every module uses
+    codegen.emit_prelude()
+    prelude = "#pragma once\n" + take(codegen) + "\n"
+    return prelude, list(modules.values()), sorted(codegen.compile_flags)
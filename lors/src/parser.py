@@ -12,16 +12,46 @@ class Parser:
             declarations.append(self.parse_declaration())
         return Program(declarations)
 
+    def locate(self, node: ASTNode, token: Token) -> ASTNode:
+        # Source position for #line directives (compiler.py -g)
+        node.file = token.file
+        node.line = token.source_line or token.line
+        return node
+
     def parse_declaration(self):
+        start = self.peek()
+        return self.locate(self.parse_declaration_kind(), start)
+
+    def parse_declaration_kind(self):
         if self.match(TokenType.DATUM):
             return self.parse_variable_declaration()
         elif self.match(TokenType.ALGORITHM):
             return self.parse_function_declaration()
         elif self.match(TokenType.STRUCTURE):
             return self.parse_struct_declaration()
+        elif self.check_word("memoised"):
+            return self.parse_memoised_declaration()
         else:
             raise SyntaxError(f"Expected declaration (datum, algorithm, or structure) at line {self.peek().line}")
 
+    def parse_memoised_declaration(self):
+        # memoised [(capacity)] algorithm name ( params ) -> return_type begin ... end
+        self.advance()
+        capacity = 0
+        if self.match(TokenType.LPAREN):
+            capacity = int(self.consume(TokenType.INTEGER_LITERAL, "Expected cache capacity after 'memoised('").value)
+            if capacity <= 0:
+                raise SyntaxError(f"Cache capacity must be positive at line {self.previous().line}")
+            self.consume(TokenType.RPAREN, "Expected ')' after cache capacity")
+        self.consume(TokenType.ALGORITHM, "Expected 'algorithm' after 'memoised'")
+        line = self.previous().line
+        node = self.parse_function_declaration()
+        if node.body is None:
+            raise SyntaxError(f"'memoised' belongs on the definition of '{node.name}', not its prototype at line {line}")
+        node.memoised = True
+        node.memo_capacity = capacity
+        return node
+
     def parse_struct_declaration(self):
         name = self.consume(TokenType.IDENTIFIER, "Expected structure name").value
         self.consume(TokenType.BEGIN, "Expected 'begin' after structure name")
@@ -89,6 +119,10 @@ class Parser:
         return Block(statements)
 
     def parse_statement(self):
+        start = self.peek()
+        return self.locate(self.parse_statement_kind(), start)
+
+    def parse_statement_kind(self):
         if self.match(TokenType.VERIFY):
             return self.parse_if_statement()
         elif self.match(TokenType.CYCLE):
@@ -114,6 +148,8 @@ class Parser:
                     return Assignment(expr.name, value)
                 elif isinstance(expr, ArrayAccess):
                     return ArrayAssignment(expr.array_name, expr.index, value)
+                elif isinstance(expr, MatrixAccess):
+                    return MatrixAssignment(expr.matrix_name, expr.row, expr.col, value)
                 elif isinstance(expr, MemberAccess):
                     return MemberAssignment(expr.object, expr.member_name, value)
                 else:
@@ -166,11 +202,58 @@ class Parser:
         return IfStatement(condition, then_branch, else_branch)
 
     def parse_while_statement(self):
+        # 'each' and 'parallel' are contextual: a plain cycle goes on with '('
+        if self.check_word("each"):
+            self.advance()
+            return self.parse_for_each_statement()
+        if self.check_word("parallel"):
+            self.advance()
+            return self.parse_parallel_statement()
+
         # cycle ( cond ) do ... conclude
         self.consume(TokenType.LPAREN, "Expected '(' after cycle")
         condition = self.parse_expression()
         self.consume(TokenType.RPAREN, "Expected ')' after condition")
 
+        return WhileStatement(condition, self.parse_loop_body())
+
+    def parse_for_each_statement(self):
+        # cycle each [index ,] item in expr do ... conclude
+        index_name = None
+        item_name = self.consume(TokenType.IDENTIFIER, "Expected loop variable after 'each'").value
+        if self.match(TokenType.COMMA):
+            index_name = item_name
+            item_name = self.consume(TokenType.IDENTIFIER, "Expected item variable after ','").value
+
+        # 'in' is not reserved so that it stays usable as a field name
+        self.consume_word("in", "Expected 'in' after loop variable")
+        iterable = self.parse_expression()
+
+        return ForEachStatement(item_name, iterable, self.parse_loop_body(), index_name)
+
+    def parse_parallel_statement(self):
+        # cycle parallel i from a to b [reduce sum x, max y] do ... conclude
+        var_name = self.consume(TokenType.IDENTIFIER, "Expected loop variable after 'parallel'").value
+        self.consume_word("from", "Expected 'from' after loop variable")
+        start = self.parse_expression()
+        self.consume_word("to", "Expected 'to' after range start")
+        end = self.parse_expression()
+
+        reductions = []
+        if self.check_word("reduce"):
+            self.advance()
+            while True:
+                op = self.consume(TokenType.IDENTIFIER, "Expected reduction operator (sum, min, max)").value
+                if op not in ("sum", "min", "max"):
+                    raise SyntaxError(f"Unknown reduction operator '{op}' at line {self.previous().line}")
+                name = self.consume(TokenType.IDENTIFIER, "Expected reduction variable").value
+                reductions.append(Reduction(op, name))
+                if not self.match(TokenType.COMMA):
+                    break
+
+        return ParallelForStatement(var_name, start, end, reductions, self.parse_loop_body())
+
+    def parse_loop_body(self):
         self.consume(TokenType.DO, "Expected 'do' before loop body")
 
         body_stmts = []
@@ -178,7 +261,7 @@ class Parser:
             body_stmts.append(self.parse_statement())
 
         self.consume(TokenType.CONCLUDE, "Expected 'conclude' after cycle body")
-        return WhileStatement(condition, Block(body_stmts))
+        return Block(body_stmts)
 
     def parse_return_statement(self):
         value = None
@@ -263,6 +346,10 @@ class Parser:
 
     def parse_primary(self):
         expr = None
+        # 'dispatch' is contextual: a name followed by another name is never an expression
+        if self.check_word("dispatch") and self.peek_next().type == TokenType.IDENTIFIER:
+            return self.parse_dispatch()
+
         if self.match(TokenType.INQUIRE):
             self.consume(TokenType.LPAREN, "Expected '(' after inquire")
             self.consume(TokenType.RPAREN, "Expected ')' after inquire")
@@ -300,8 +387,13 @@ class Parser:
                 expr = FunctionCall(name, args)
             elif self.match(TokenType.LBRACKET): # Array access
                 index = self.parse_expression()
-                self.consume(TokenType.RBRACKET, "Expected ']' after array index")
-                expr = ArrayAccess(name, index)
+                if self.match(TokenType.COMMA): # Matrix access: m[i, j]
+                    col = self.parse_expression()
+                    self.consume(TokenType.RBRACKET, "Expected ']' after matrix index")
+                    expr = MatrixAccess(name, index, col)
+                else:
+                    self.consume(TokenType.RBRACKET, "Expected ']' after array index")
+                    expr = ArrayAccess(name, index)
             else:
                 expr = Identifier(name)
 
@@ -334,6 +426,20 @@ class Parser:
 
         return expr
 
+    def parse_dispatch(self):
+        # dispatch algorithm(args)
+        self.advance()
+        name = self.consume(TokenType.IDENTIFIER, "Expected algorithm name after 'dispatch'").value
+        self.consume(TokenType.LPAREN, "Expected '(' after algorithm name")
+        args = []
+        if not self.check(TokenType.RPAREN):
+            while True:
+                args.append(self.parse_expression())
+                if not self.match(TokenType.COMMA):
+                    break
+        self.consume(TokenType.RPAREN, "Expected ')' after arguments")
+        return DispatchExpression(name, args)
+
     def parse_type(self):
         if self.match(TokenType.TYPE_WHOLE):
             return TypeNode("whole")
@@ -343,11 +449,27 @@ class Parser:
             return TypeNode("series")
         if self.match(TokenType.TYPE_STATE):
             return TypeNode("state")
+        if self.match(TokenType.TYPE_MATRIX):
+            return TypeNode("matrix")
         if self.match(TokenType.TYPE_SEQUENCE):
             self.consume(TokenType.LT, "Expected '<' after sequence")
             subtype = self.parse_type()
             self.consume(TokenType.GT, "Expected '>' after sequence type")
             return TypeNode("sequence", subtype)
+        if self.match(TokenType.TYPE_CATALOG):
+            self.consume(TokenType.LT, "Expected '<' after catalog")
+            key_type = self.parse_type()
+            self.consume(TokenType.COMMA, "Expected ',' between catalog key and value types")
+            value_type = self.parse_type()
+            self.consume(TokenType.GT, "Expected '>' after catalog type")
+            return TypeNode("catalog", key_type, value_type)
+        if self.check_word("future") and self.peek_next().type == TokenType.LT:
+            # future<T>: the handle 'dispatch' returns
+            self.advance()
+            self.advance()
+            subtype = self.parse_type()
+            self.consume(TokenType.GT, "Expected '>' after future type")
+            return TypeNode("future", subtype)
         if self.match(TokenType.IDENTIFIER):
             return TypeNode(self.previous().value)
         raise SyntaxError(f"Expected type at line {self.peek().line}")
@@ -388,3 +510,12 @@ class Parser:
         if self.check(type_):
             return self.advance()
         raise SyntaxError(f"{message} at line {self.peek().line}")
+
+    def check_word(self, word):
+        # Contextual keywords are lexed as identifiers
+        return self.check(TokenType.IDENTIFIER) and self.peek().value == word
+
+    def consume_word(self, word, message):
+        if self.check_word(word):
+            return self.advance()
+        raise SyntaxError(f"{message} at line {self.peek().line}")
@@ -0,0 +1,81 @@
+from lors.src.ast_nodes import *
+from lors.src.analysis import walk, algorithm_names
+from lors.src.hoist import SPECULATABLE_INTRINSICS
+
+# The field of each node that refers to an algorithm, structure or variable by name
+NAME_FIELDS = {
+    FunctionCall: "name",
+    DispatchExpression: "name",
+    Identifier: "name",
+    ArrayAccess: "array_name",
+    MatrixAccess: "matrix_name",
+    Assignment: "name",
+    ArrayAssignment: "name",
+    MatrixAssignment: "name",
+    Reduction: "name",
+    TypeNode: "name",
+}
+
+def referenced_names(node: ASTNode) -> set:
+    """Every name a subtree calls, reads, writes or uses as a type.
+
+    Locals that shadow a global are counted too, which only keeps more.
+    """
+    names = set()
+    for child in walk(node):
+        field = NAME_FIELDS.get(type(child))
+        if field is not None:
+            names.add(getattr(child, field))
+    return names
+
+def has_effects(initializer: ASTNode, struct_names: set, functions: set) -> bool:
+    """Whether running a global's initializer can be observed (output, input, failure)."""
+    for child in walk(initializer):
+        if isinstance(child, (InquireExpression, DispatchExpression)):
+            return True
+        if isinstance(child, BinaryOp) and child.operator in ("/", "%"):
+            return True
+        if isinstance(child, (ArrayAccess, MatrixAccess)):
+            return True
+        if isinstance(child, FunctionCall):
+            if child.name in functions:
+                return True
+            if child.name not in SPECULATABLE_INTRINSICS and child.name not in struct_names:
+                return True
+    return False
+
+def prune_unreachable(program: Program) -> List[ASTNode]:
+    """Drop the algorithms, structures and globals genesis cannot reach.
+
+    Reachability follows calls, variable references and types from genesis
+    and from every global whose initializer has effects, as those run before
+    genesis whether or not anything reads them. Returns the removed
+    declarations; a program without genesis is left alone.
+    """
+    by_name = {}
+    for decl in program.declarations:
+        by_name.setdefault(decl.name, []).append(decl)
+    if "genesis" not in by_name:
+        return []
+    struct_names = {d.name for d in program.declarations if isinstance(d, StructDeclaration)}
+    functions = algorithm_names(program)
+
+    reached = {"genesis"}
+    pending = ["genesis"]
+    for decl in program.declarations:
+        if (isinstance(decl, VariableDeclaration) and decl.initializer is not None
+                and decl.name not in reached and has_effects(decl.initializer, struct_names, functions)):
+            reached.add(decl.name)
+            pending.append(decl.name)
+    while pending:
+        # A prototype and the body of an algorithm share its name
+        for decl in by_name[pending.pop()]:
+            for name in referenced_names(decl):
+                if name in by_name and name not in reached:
+                    reached.add(name)
+                    pending.append(name)
+
+    removed = [d for d in program.declarations if d.name not in reached]
+    if removed:
+        program.declarations = [d for d in program.declarations if d.name in reached]
+    return removed
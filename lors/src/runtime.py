@@ -0,0 +1,1618 @@
+# C++ runtime support emitted into generated programs.
+# Helpers are inline so the prelude can also be a header shared by modules (--modules).
+
+INQUIRE = r"""
+struct InquireProxy {
+    template<typename T>
+    operator T() {
+        T val;
+        std::cin >> val;
+        return val;
+    }
+};
+inline InquireProxy inquire() { return InquireProxy(); }
+"""
+
+FILE_WRITE = r"""
+inline void file_write(const std::string& path, const std::string& content) {
+    std::ofstream f(path);
+    f << content;
+    f.close();
+}
+"""
+
+FILE_READ = r"""
+inline std::string file_read(const std::string& path) {
+    std::ifstream f(path);
+    std::stringstream buffer;
+    buffer << f.rdbuf();
+    return buffer.str();
+}
+"""
+
+EXECUTE_SYSTEM = r"""
+inline void execute_system(const std::string& cmd) {
+    std::system(cmd.c_str());
+}
+"""
+
+STR_REVERSE = r"""
+// Taken by value and changed in place: a temporary argument is moved, not copied
+inline std::string str_reverse_helper(std::string s) {
+    std::reverse(s.begin(), s.end());
+    return s;
+}
+"""
+
+STR_UPPER = r"""
+inline std::string str_upper_helper(std::string s) {
+    for(auto &c : s) c = toupper(c);
+    return s;
+}
+"""
+
+STR_LOWER = r"""
+inline std::string str_lower_helper(std::string s) {
+    for(auto &c : s) c = tolower(c);
+    return s;
+}
+"""
+
+STR_SUBSTR = r"""
+// A string_view parameter takes series, views and literals without a copy
+inline std::string str_substr_helper(std::string_view s, long long start, long long len) {
+    if (start < 0 || start >= (long long)s.length()) return "";
+    return std::string(s.substr(start, len));
+}
+"""
+
+LORS_VIEW = r"""
+// Series Views
+// A 'view' is a std::string_view that converts back to a series wherever one
+// is expected, so views mix with series in concatenations and calls.
+struct LorsView : std::string_view {
+    LorsView() {}
+    LorsView(std::string_view v) : std::string_view(v) {}
+    LorsView(const std::string& s) : std::string_view(s) {}
+    LorsView(const char* s) : std::string_view(s) {}
+    operator std::string() const { return std::string(data(), size()); }
+};
+inline std::string operator+(const std::string& a, LorsView b) { std::string r = a; r.append(b.data(), b.size()); return r; }
+inline std::string operator+(LorsView a, const std::string& b) { std::string r(a); r += b; return r; }
+inline std::string operator+(LorsView a, LorsView b) { std::string r(a); r.append(b.data(), b.size()); return r; }
+inline std::string operator+(const char* a, LorsView b) { std::string r(a); r.append(b.data(), b.size()); return r; }
+inline std::string operator+(LorsView a, const char* b) { std::string r(a); r += b; return r; }
+
+// substring without the copy: same bounds handling as str_substr_helper
+inline LorsView lors_substr_view(LorsView s, long long start, long long len) {
+    if (start < 0 || start >= (long long)s.size()) return LorsView();
+    return s.substr(start, len);
+}
+"""
+
+CATALOG_KEYS = r"""
+template<typename K, typename V>
+inline std::vector<K> catalog_keys_helper(const std::unordered_map<K, V>& c) {
+    std::vector<K> keys;
+    keys.reserve(c.size());
+    for (const auto& entry : c) keys.push_back(entry.first);
+    // Sorted so iteration order does not depend on the hash layout
+    std::sort(keys.begin(), keys.end());
+    return keys;
+}
+"""
+
+NUMERIC_KERNELS = r"""
+// Numeric Kernels
+// Compiled at O3 even in default (-O0) builds so the loops vectorise.
+#pragma GCC push_options
+#pragma GCC optimize ("O3")
+template<typename T>
+T lors_sum(const std::vector<T>& v) {
+    const T* __restrict__ p = v.data();
+    const size_t n = v.size();
+    // Independent accumulators break the dependency chain between lanes
+    T a0 = T(), a1 = T(), a2 = T(), a3 = T();
+    size_t i = 0;
+    for (; i + 4 <= n; i += 4) {
+        a0 += p[i]; a1 += p[i + 1]; a2 += p[i + 2]; a3 += p[i + 3];
+    }
+    for (; i < n; ++i) a0 += p[i];
+    return (a0 + a1) + (a2 + a3);
+}
+
+template<typename T, typename U>
+auto lors_dot(const std::vector<T>& a, const std::vector<U>& b) -> decltype(T() * U()) {
+    typedef decltype(T() * U()) R;
+    const T* __restrict__ pa = a.data();
+    const U* __restrict__ pb = b.data();
+    const size_t n = std::min(a.size(), b.size());
+    R a0 = R(), a1 = R(), a2 = R(), a3 = R();
+    size_t i = 0;
+    for (; i + 4 <= n; i += 4) {
+        a0 += pa[i] * pb[i]; a1 += pa[i + 1] * pb[i + 1];
+        a2 += pa[i + 2] * pb[i + 2]; a3 += pa[i + 3] * pb[i + 3];
+    }
+    for (; i < n; ++i) a0 += pa[i] * pb[i];
+    return (a0 + a1) + (a2 + a3);
+}
+
+template<typename T, typename S>
+void lors_scale(std::vector<T>& v, S factor) {
+    T* __restrict__ p = v.data();
+    const size_t n = v.size();
+    for (size_t i = 0; i < n; ++i) p[i] = p[i] * factor;
+}
+
+template<typename T, typename S, typename U>
+void lors_axpy(std::vector<T>& y, S a, const std::vector<U>& x) {
+    if ((const void*)&y == (const void*)&x) {
+        // y += a * y would violate the restrict contract below
+        lors_scale(y, 1 + a);
+        return;
+    }
+    T* __restrict__ py = y.data();
+    const U* __restrict__ px = x.data();
+    const size_t n = std::min(y.size(), x.size());
+    for (size_t i = 0; i < n; ++i) py[i] = py[i] + a * px[i];
+}
+
+template<typename T, typename U>
+auto lors_elementwise_add(const std::vector<T>& a, const std::vector<U>& b) -> std::vector<decltype(T() + U())> {
+    const size_t n = std::min(a.size(), b.size());
+    std::vector<decltype(T() + U())> out(n);
+    const T* __restrict__ pa = a.data();
+    const U* __restrict__ pb = b.data();
+    auto* __restrict__ po = out.data();
+    for (size_t i = 0; i < n; ++i) po[i] = pa[i] + pb[i];
+    return out;
+}
+
+template<typename T, typename U>
+auto lors_elementwise_mul(const std::vector<T>& a, const std::vector<U>& b) -> std::vector<decltype(T() * U())> {
+    const size_t n = std::min(a.size(), b.size());
+    std::vector<decltype(T() * U())> out(n);
+    const T* __restrict__ pa = a.data();
+    const U* __restrict__ pb = b.data();
+    auto* __restrict__ po = out.data();
+    for (size_t i = 0; i < n; ++i) po[i] = pa[i] * pb[i];
+    return out;
+}
+
+template<typename T>
+T lors_min_of(const std::vector<T>& v) {
+    if (v.empty()) return T();
+    const T* __restrict__ p = v.data();
+    const size_t n = v.size();
+    T m = p[0];
+    for (size_t i = 1; i < n; ++i) m = p[i] < m ? p[i] : m;
+    return m;
+}
+
+template<typename T>
+T lors_max_of(const std::vector<T>& v) {
+    if (v.empty()) return T();
+    const T* __restrict__ p = v.data();
+    const size_t n = v.size();
+    T m = p[0];
+    for (size_t i = 1; i < n; ++i) m = p[i] > m ? p[i] : m;
+    return m;
+}
+
+template<typename T>
+double lors_mean(const std::vector<T>& v) {
+    if (v.empty()) return 0.0;
+    return (double)lors_sum(v) / (double)v.size();
+}
+
+template<typename T>
+double lors_variance(const std::vector<T>& v) {
+    // Population variance, two-pass for accuracy
+    if (v.empty()) return 0.0;
+    const double m = lors_mean(v);
+    const T* __restrict__ p = v.data();
+    const size_t n = v.size();
+    double a0 = 0.0, a1 = 0.0;
+    size_t i = 0;
+    for (; i + 2 <= n; i += 2) {
+        const double d0 = (double)p[i] - m, d1 = (double)p[i + 1] - m;
+        a0 += d0 * d0; a1 += d1 * d1;
+    }
+    for (; i < n; ++i) { const double d = (double)p[i] - m; a0 += d * d; }
+    return (a0 + a1) / (double)n;
+}
+#pragma GCC pop_options
+"""
+
+DENSE_MATRIX = r"""
+// Dense Matrix
+// Contiguous row-major storage; kernels are tiled so the working set of the
+// inner loops stays in cache.
+struct LorsMatrix {
+    long long rows = 0;
+    long long cols = 0;
+    std::vector<double> data;
+
+    LorsMatrix() {}
+    LorsMatrix(long long r, long long c) : rows(r), cols(c), data((size_t)(r * c), 0.0) {}
+
+    double& operator()(long long i, long long j) { return data[(size_t)(i * cols + j)]; }
+    double operator()(long long i, long long j) const { return data[(size_t)(i * cols + j)]; }
+};
+
+inline std::ostream& operator<<(std::ostream& os, const LorsMatrix& m) {
+    os << "[";
+    for (long long i = 0; i < m.rows; ++i) {
+        if (i > 0) os << "; ";
+        for (long long j = 0; j < m.cols; ++j) {
+            if (j > 0) os << ", ";
+            os << m(i, j);
+        }
+    }
+    return os << "]";
+}
+
+inline void lors_matrix_fail(const char* what) {
+    std::cerr << "Matrix error: " << what << std::endl;
+    std::exit(1);
+}
+
+inline LorsMatrix lors_zeros(long long r, long long c) {
+    return LorsMatrix(r, c);
+}
+
+inline LorsMatrix lors_identity(long long n) {
+    LorsMatrix m(n, n);
+    for (long long i = 0; i < n; ++i) m(i, i) = 1.0;
+    return m;
+}
+
+#pragma GCC push_options
+#pragma GCC optimize ("O3")
+const long long LORS_TILE = 64;
+
+inline LorsMatrix lors_transpose(const LorsMatrix& a) {
+    LorsMatrix t(a.cols, a.rows);
+    const double* __restrict__ src = a.data.data();
+    double* __restrict__ dst = t.data.data();
+    for (long long ii = 0; ii < a.rows; ii += LORS_TILE) {
+        const long long i_end = std::min(ii + LORS_TILE, a.rows);
+        for (long long jj = 0; jj < a.cols; jj += LORS_TILE) {
+            const long long j_end = std::min(jj + LORS_TILE, a.cols);
+            for (long long i = ii; i < i_end; ++i)
+                for (long long j = jj; j < j_end; ++j)
+                    dst[j * a.rows + i] = src[i * a.cols + j];
+        }
+    }
+    return t;
+}
+
+inline LorsMatrix lors_matmul(const LorsMatrix& a, const LorsMatrix& b) {
+    if (a.cols != b.rows) lors_matrix_fail("matmul dimension mismatch");
+    const long long n = a.rows, m = a.cols, p = b.cols;
+    LorsMatrix c(n, p);
+    const double* __restrict__ pa = a.data.data();
+    const double* __restrict__ pb = b.data.data();
+    double* __restrict__ pc = c.data.data();
+    // i-k-j order inside each tile: the innermost loop streams rows of b and c
+    for (long long ii = 0; ii < n; ii += LORS_TILE) {
+        const long long i_end = std::min(ii + LORS_TILE, n);
+        for (long long kk = 0; kk < m; kk += LORS_TILE) {
+            const long long k_end = std::min(kk + LORS_TILE, m);
+            for (long long jj = 0; jj < p; jj += LORS_TILE) {
+                const long long j_end = std::min(jj + LORS_TILE, p);
+                for (long long i = ii; i < i_end; ++i) {
+                    double* __restrict__ crow = pc + i * p;
+                    for (long long k = kk; k < k_end; ++k) {
+                        const double aik = pa[i * m + k];
+                        const double* __restrict__ brow = pb + k * p;
+                        for (long long j = jj; j < j_end; ++j) crow[j] += aik * brow[j];
+                    }
+                }
+            }
+        }
+    }
+    return c;
+}
+
+inline std::vector<double> lors_solve(LorsMatrix a, std::vector<double> b) {
+    // Gaussian elimination with partial pivoting on private copies
+    const long long n = a.rows;
+    if (a.cols != n || (long long)b.size() != n) lors_matrix_fail("solve needs a square system");
+    for (long long k = 0; k < n; ++k) {
+        long long pivot = k;
+        for (long long i = k + 1; i < n; ++i)
+            if (std::abs(a(i, k)) > std::abs(a(pivot, k))) pivot = i;
+        if (a(pivot, k) == 0.0) lors_matrix_fail("solve on a singular matrix");
+        if (pivot != k) {
+            for (long long j = 0; j < n; ++j) std::swap(a(k, j), a(pivot, j));
+            std::swap(b[k], b[pivot]);
+        }
+        double* __restrict__ rk = &a.data[k * n];
+        for (long long i = k + 1; i < n; ++i) {
+            double* __restrict__ ri = &a.data[i * n];
+            const double f = ri[k] / rk[k];
+            for (long long j = k; j < n; ++j) ri[j] -= f * rk[j];
+            b[i] -= f * b[k];
+        }
+    }
+    std::vector<double> x(n);
+    for (long long i = n - 1; i >= 0; --i) {
+        double s = b[i];
+        for (long long j = i + 1; j < n; ++j) s -= a(i, j) * x[j];
+        x[i] = s / a(i, i);
+    }
+    return x;
+}
+#pragma GCC pop_options
+"""
+
+TASK_POOL = r"""
+// Task Pool (dispatch / await)
+// One worker per hardware thread, each with its own deque of tasks. A worker
+// runs its newest task first and steals the oldest task of another worker
+// when its own deque is empty. A thread waiting in await runs queued tasks
+// meanwhile, so tasks that await other tasks cannot starve the pool.
+class LorsTaskPool {
+public:
+    LorsTaskPool() : queues(std::max(1u, std::thread::hardware_concurrency())) {
+        for (size_t i = 0; i < queues.size(); ++i) workers.emplace_back([this, i] { work(i); });
+    }
+
+    // Runs the queued tasks to completion before the workers stop
+    ~LorsTaskPool() {
+        {
+            std::lock_guard<std::mutex> lock(mutex);
+            stopping = true;
+        }
+        wake.notify_all();
+        for (auto& worker : workers) worker.join();
+    }
+
+    template<typename F>
+    auto submit(F f) -> std::shared_future<decltype(f())> {
+        auto task = std::make_shared<std::packaged_task<decltype(f())()>>(std::move(f));
+        std::shared_future<decltype(f())> result = task->get_future().share();
+        // Workers queue onto their own deque; other threads spread tasks round-robin
+        size_t target = current >= 0 ? (size_t)current : next++ % queues.size();
+        {
+            std::lock_guard<std::mutex> lock(queues[target].mutex);
+            queues[target].tasks.push_back([task] { (*task)(); });
+        }
+        {
+            std::lock_guard<std::mutex> lock(mutex);
+            ++pending;
+        }
+        wake.notify_one();
+        return result;
+    }
+
+    template<typename T>
+    void wait(const std::shared_future<T>& f) {
+        while (f.wait_for(std::chrono::seconds(0)) != std::future_status::ready) {
+            // Nothing left to help with: whoever took the task is running it
+            if (!run_one(current >= 0 ? (size_t)current : 0)) {
+                f.wait();
+                return;
+            }
+        }
+    }
+
+private:
+    struct Queue {
+        std::mutex mutex;
+        std::deque<std::function<void()>> tasks;
+    };
+
+    static inline thread_local int current = -1;
+    std::vector<Queue> queues;
+    std::vector<std::thread> workers;
+    std::atomic<size_t> next{0};
+    std::mutex mutex;
+    std::condition_variable wake;
+    long long pending = 0;
+    bool stopping = false;
+
+    bool take(size_t self, std::function<void()>& task) {
+        for (size_t k = 0; k < queues.size(); ++k) {
+            Queue& q = queues[(self + k) % queues.size()];
+            std::lock_guard<std::mutex> lock(q.mutex);
+            if (q.tasks.empty()) continue;
+            if (k == 0) {
+                task = std::move(q.tasks.back());
+                q.tasks.pop_back();
+            } else {
+                task = std::move(q.tasks.front());
+                q.tasks.pop_front();
+            }
+            return true;
+        }
+        return false;
+    }
+
+    bool run_one(size_t self) {
+        std::function<void()> task;
+        if (!take(self, task)) return false;
+        {
+            std::lock_guard<std::mutex> lock(mutex);
+            --pending;
+        }
+        task();
+        return true;
+    }
+
+    void work(size_t self) {
+        current = (int)self;
+        while (true) {
+            if (run_one(self)) continue;
+            std::unique_lock<std::mutex> lock(mutex);
+            wake.wait(lock, [this] { return stopping || pending > 0; });
+            if (stopping && pending == 0) return;
+        }
+    }
+};
+
+// Created on first use, after the globals, so it is destroyed (and drained) before them
+inline LorsTaskPool& lors_pool() {
+    static LorsTaskPool pool;
+    return pool;
+}
+
+// Arguments are copied when the task is dispatched, as for a call
+template<typename F, typename... A>
+auto lors_dispatch(F f, A... args) {
+    return lors_pool().submit([f, args...]() { return f(args...); });
+}
+
+template<typename T>
+T lors_await(const std::shared_future<T>& f) {
+    lors_pool().wait(f);
+    return f.get();
+}
+
+inline void lors_await(const std::shared_future<void>& f) {
+    lors_pool().wait(f);
+    f.get();
+}
+"""
+
+LORS_MEMO = r"""
+// Memoisation
+// Each memoised algorithm keeps a cache from its argument tuple to its
+// result, evicting the least recently used entry beyond 'capacity' (0: no
+// bound). The lock is not held while the body runs, as it may recurse.
+struct LorsMemoStats {
+    std::atomic<long long> hits{0}, misses{0};
+};
+
+struct LorsMemoHash {
+    template<typename... T>
+    std::size_t operator()(const std::tuple<T...>& key) const {
+        std::size_t h = 0;
+        std::apply([&h](const T&... v) { ((h ^= std::hash<T>()(v) + 0x9e3779b97f4a7c15ULL + (h << 6) + (h >> 2)), ...); }, key);
+        return h;
+    }
+};
+
+template<typename R, typename... K>
+struct LorsMemo {
+    using Key = std::tuple<K...>;
+    using Entry = std::pair<Key, R>;
+    LorsMemoStats& stats;
+    std::size_t capacity;
+    std::list<Entry> recent;  // most recently used first
+    std::unordered_map<Key, typename std::list<Entry>::iterator, LorsMemoHash> index;
+    std::mutex lock;
+
+    LorsMemo(LorsMemoStats& stats, std::size_t capacity) : stats(stats), capacity(capacity) {}
+
+    template<typename F>
+    R call(const Key& key, F&& body) {
+        {
+            std::lock_guard<std::mutex> guard(lock);
+            auto found = index.find(key);
+            if (found != index.end()) {
+                stats.hits.fetch_add(1, std::memory_order_relaxed);
+                recent.splice(recent.begin(), recent, found->second);
+                return found->second->second;
+            }
+        }
+        stats.misses.fetch_add(1, std::memory_order_relaxed);
+        R value = body();
+        std::lock_guard<std::mutex> guard(lock);
+        // A recursive or concurrent call may have stored it meanwhile
+        if (index.find(key) == index.end()) {
+            recent.emplace_front(key, value);
+            index.emplace(key, recent.begin());
+            if (capacity && index.size() > capacity) {
+                index.erase(recent.back().first);
+                recent.pop_back();
+            }
+        }
+        return value;
+    }
+};
+"""
+
+# Expects lors_profile_count and lors_profile_names to be emitted first.
+PROFILER = r"""
+// Algorithm Profiler (--instrument)
+// One LorsScope lives on the stack of every algorithm call. Counters are
+// atomic so algorithms called from 'cycle parallel' are counted correctly.
+struct LorsProfileStat {
+    std::atomic<long long> calls{0};
+    std::atomic<long long> inclusive_ns{0};
+    std::atomic<long long> exclusive_ns{0};
+    std::atomic<int> max_depth{0};
+};
+static LorsProfileStat lors_profile_stats[lors_profile_count];
+thread_local int lors_profile_depth[lors_profile_count];
+
+inline long long lors_now_ns() {
+    return std::chrono::duration_cast<std::chrono::nanoseconds>(
+        std::chrono::steady_clock::now().time_since_epoch()).count();
+}
+
+struct LorsScope;
+thread_local LorsScope* lors_scope_top = nullptr;
+
+struct LorsScope {
+    int id;
+    long long start;
+    long long child_ns = 0;
+    LorsScope* parent;
+
+    LorsScope(int id_) : id(id_), parent(lors_scope_top) {
+        lors_scope_top = this;
+        LorsProfileStat& stat = lors_profile_stats[id];
+        stat.calls.fetch_add(1, std::memory_order_relaxed);
+        int depth = ++lors_profile_depth[id];
+        int seen = stat.max_depth.load(std::memory_order_relaxed);
+        while (depth > seen && !stat.max_depth.compare_exchange_weak(seen, depth)) {}
+        start = lors_now_ns();
+    }
+
+    ~LorsScope() { close(lors_now_ns()); }
+
+    void close(long long now) {
+        long long elapsed = now - start;
+        LorsProfileStat& stat = lors_profile_stats[id];
+        // Only the outermost activation adds inclusive time, so recursion
+        // is not counted twice.
+        if (--lors_profile_depth[id] == 0) stat.inclusive_ns.fetch_add(elapsed, std::memory_order_relaxed);
+        stat.exclusive_ns.fetch_add(elapsed - child_ns, std::memory_order_relaxed);
+        if (parent) parent->child_ns += elapsed;
+        lors_scope_top = parent;
+    }
+};
+
+inline void lors_profile_report() {
+    // exit_program() skips stack unwinding: close whatever is still open
+    long long now = lors_now_ns();
+    while (lors_scope_top) lors_scope_top->close(now);
+
+    std::vector<int> order;
+    for (int i = 0; i < lors_profile_count; ++i)
+        if (lors_profile_stats[i].calls.load() > 0) order.push_back(i);
+    std::sort(order.begin(), order.end(), [](int a, int b) {
+        return lors_profile_stats[a].inclusive_ns.load() > lors_profile_stats[b].inclusive_ns.load();
+    });
+
+    std::fprintf(stderr, "\n=== Lors profile (sorted by inclusive time) ===\n");
+    std::fprintf(stderr, "%-32s %12s %14s %14s %10s\n", "algorithm", "calls", "inclusive ms", "exclusive ms", "max depth");
+    for (int i : order) {
+        const LorsProfileStat& s = lors_profile_stats[i];
+        std::fprintf(stderr, "%-32s %12lld %14.3f %14.3f %10d\n", lors_profile_names[i], s.calls.load(),
+                     s.inclusive_ns.load() / 1e6, s.exclusive_ns.load() / 1e6, s.max_depth.load());
+    }
+
+    const char* json_path = std::getenv("LORS_PROFILE_JSON");
+    if (json_path) {
+        std::ofstream out(json_path);
+        out << "{\"algorithms\": [";
+        for (size_t k = 0; k < order.size(); ++k) {
+            const LorsProfileStat& s = lors_profile_stats[order[k]];
+            out << (k ? ", " : "") << "{\"name\": \"" << lors_profile_names[order[k]] << "\""
+                << ", \"calls\": " << s.calls.load()
+                << ", \"inclusive_ns\": " << s.inclusive_ns.load()
+                << ", \"exclusive_ns\": " << s.exclusive_ns.load()
+                << ", \"max_depth\": " << s.max_depth.load() << "}";
+        }
+        out << "]}" << std::endl;
+    }
+}
+"""
+
+# Expects PROFILER (for lors_scope_top) to be emitted first.
+ALLOC_TRACER = r"""
+// Allocation Tracer (--trace-alloc)
+// The global operator new counts every heap allocation against the
+// algorithm whose LorsScope is innermost on the calling thread.
+struct LorsAllocStat {
+    std::atomic<long long> count{0};
+    std::atomic<long long> bytes{0};
+};
+// The extra last slot collects allocations made outside any algorithm
+static LorsAllocStat lors_alloc_stats[lors_profile_count + 1];
+static std::atomic<long long> lors_alloc_frees{0};
+
+inline void* lors_counted_alloc(std::size_t size) {
+    LorsAllocStat& stat = lors_alloc_stats[lors_scope_top ? lors_scope_top->id : lors_profile_count];
+    stat.count.fetch_add(1, std::memory_order_relaxed);
+    stat.bytes.fetch_add((long long)size, std::memory_order_relaxed);
+    void* p = std::malloc(size ? size : 1);
+    if (!p) throw std::bad_alloc();
+    return p;
+}
+
+inline void lors_counted_free(void* p) {
+    if (!p) return;
+    lors_alloc_frees.fetch_add(1, std::memory_order_relaxed);
+    std::free(p);
+}
+
+void* operator new(std::size_t size) { return lors_counted_alloc(size); }
+void* operator new[](std::size_t size) { return lors_counted_alloc(size); }
+void operator delete(void* p) noexcept { lors_counted_free(p); }
+void operator delete[](void* p) noexcept { lors_counted_free(p); }
+void operator delete(void* p, std::size_t) noexcept { lors_counted_free(p); }
+void operator delete[](void* p, std::size_t) noexcept { lors_counted_free(p); }
+
+inline void lors_alloc_report() {
+    // Snapshot first: building the report allocates too
+    long long count[lors_profile_count + 1], bytes[lors_profile_count + 1];
+    long long total_count = 0, total_bytes = 0;
+    for (int i = 0; i <= lors_profile_count; ++i) {
+        count[i] = lors_alloc_stats[i].count.load();
+        bytes[i] = lors_alloc_stats[i].bytes.load();
+        total_count += count[i];
+        total_bytes += bytes[i];
+    }
+    long long frees = lors_alloc_frees.load();
+
+    std::vector<int> order;
+    for (int i = 0; i <= lors_profile_count; ++i)
+        if (count[i] > 0) order.push_back(i);
+    std::sort(order.begin(), order.end(), [&](int a, int b) {
+        return bytes[a] != bytes[b] ? bytes[a] > bytes[b] : count[a] > count[b];
+    });
+    const char* top_env = std::getenv("LORS_ALLOC_TOP");
+    size_t top = top_env ? std::strtoul(top_env, nullptr, 10) : 10;
+    if (order.size() > top) order.resize(top);
+
+    std::fprintf(stderr, "\n=== Lors allocations (top %zu by bytes) ===\n", top);
+    std::fprintf(stderr, "%-32s %12s %12s %14s %10s %8s\n", "algorithm", "calls", "allocs", "bytes", "bytes/call", "share");
+    for (int i : order) {
+        const char* name = i < lors_profile_count ? lors_profile_names[i] : "<outside algorithms>";
+        long long calls = i < lors_profile_count ? lors_profile_stats[i].calls.load() : 0;
+        std::fprintf(stderr, "%-32s %12lld %12lld %14lld %10lld %7.1f%%\n", name, calls, count[i], bytes[i],
+                     calls ? bytes[i] / calls : 0LL, total_bytes ? 100.0 * bytes[i] / total_bytes : 0.0);
+    }
+    std::fprintf(stderr, "%-32s %12s %12lld %14lld %10s %7.1f%%\n", "total", "", total_count, total_bytes, "", 100.0);
+    std::fprintf(stderr, "%lld frees, %lld allocations still live at exit\n", frees, total_count - frees);
+}
+"""
+
+# C runtime linked into programs built with --backend llvm. Every heap value
+# (series, sequence, catalog, matrix, structure) is an opaque pointer whose
+# first word is a header; the generated IR owns and frees these handles.
+C_RUNTIME = r"""
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+#include <ctype.h>
+#include <errno.h>
+#include <math.h>
+
+/* Header word: low byte is the kind, higher bits are per-kind flags */
+enum { LORS_STR = 1, LORS_SEQ = 2, LORS_CAT = 3, LORS_MAT = 4, LORS_REC = 5 };
+#define LORS_STATIC ((int64_t)1 << 32) /* string literal in the data segment */
+#define LORS_HANDLES ((int64_t)1 << 8)  /* sequence elements are handles */
+
+typedef struct { int64_t header; int64_t len; int64_t cap; char* data; } LorsStr;
+typedef struct { int64_t header; int64_t len; int64_t cap; int64_t* data; } LorsSeq;
+typedef struct { int64_t header; int64_t rows; int64_t cols; double* data; } LorsMat;
+typedef struct { int64_t header; int64_t nfields; const char* mask; int64_t slots[]; } LorsRec;
+typedef struct { int64_t key; int64_t value; int64_t state; } LorsEntry;
+/* Catalog header: bits 8-15 key kind (0 whole, 1 precise, 2 series), bit 16 value handles */
+typedef struct { int64_t header; int64_t len; int64_t cap; LorsEntry* entries; int64_t used; } LorsCat;
+
+static int lors_argc;
+static char** lors_argv;
+
+void lors_init(int argc, char** argv) {
+    lors_argc = argc;
+    lors_argv = argv;
+}
+
+static void* lors_alloc(size_t n) {
+    void* p = malloc(n ? n : 1);
+    if (!p) {
+        fputs("Out of memory\n", stderr);
+        exit(1);
+    }
+    return p;
+}
+
+static void lors_throw(const char* type, const char* what) {
+    /* Same report as an uncaught C++ exception in the C++ backend */
+    fflush(stdout);
+    fprintf(stderr, "terminate called after throwing an instance of '%s'\n  what():  %s\n", type, what);
+    abort();
+}
+
+static double lors_f(int64_t bits) { double d; memcpy(&d, &bits, 8); return d; }
+static int64_t lors_bits(double d) { int64_t b; memcpy(&b, &d, 8); return b; }
+
+void lors_free(void* h);
+void* lors_copy(const void* h);
+
+/* ---- series ---- */
+
+static LorsStr* str_alloc(int64_t len) {
+    LorsStr* s = lors_alloc(sizeof *s);
+    s->header = LORS_STR;
+    s->len = len;
+    s->cap = len + 1;
+    s->data = lors_alloc((size_t)len + 1);
+    s->data[len] = 0;
+    return s;
+}
+
+void* lors_str_new(const char* p, int64_t len) {
+    LorsStr* s = str_alloc(len);
+    memcpy(s->data, p, (size_t)len);
+    return s;
+}
+
+void* lors_str_empty(void) { return str_alloc(0); }
+
+void* lors_str_concat(const LorsStr* a, const LorsStr* b) {
+    LorsStr* s = str_alloc(a->len + b->len);
+    memcpy(s->data, a->data, (size_t)a->len);
+    memcpy(s->data + a->len, b->data, (size_t)b->len);
+    return s;
+}
+
+int64_t lors_str_cmp(const LorsStr* a, const LorsStr* b) {
+    int64_t n = a->len < b->len ? a->len : b->len;
+    int c = memcmp(a->data, b->data, (size_t)n);
+    if (c) return c;
+    return a->len < b->len ? -1 : (a->len > b->len ? 1 : 0);
+}
+
+int64_t lors_str_char_at(const LorsStr* s, int64_t i) { return (int64_t)(signed char)s->data[i]; }
+
+void lors_str_set_char(LorsStr* s, int64_t i, int64_t c) { s->data[i] = (char)c; }
+
+void* lors_str_substr(const LorsStr* s, int64_t start, int64_t len) {
+    if (start < 0 || start >= s->len) return str_alloc(0);
+    int64_t rest = s->len - start;
+    /* A negative length wraps to npos in std::string::substr */
+    if (len < 0 || len > rest) len = rest;
+    return lors_str_new(s->data + start, len);
+}
+
+void* lors_str_upper(const LorsStr* s) {
+    LorsStr* r = lors_str_new(s->data, s->len);
+    for (int64_t i = 0; i < r->len; ++i) r->data[i] = (char)toupper(r->data[i]);
+    return r;
+}
+
+void* lors_str_lower(const LorsStr* s) {
+    LorsStr* r = lors_str_new(s->data, s->len);
+    for (int64_t i = 0; i < r->len; ++i) r->data[i] = (char)tolower(r->data[i]);
+    return r;
+}
+
+void* lors_str_reverse(const LorsStr* s) {
+    LorsStr* r = str_alloc(s->len);
+    for (int64_t i = 0; i < s->len; ++i) r->data[i] = s->data[s->len - 1 - i];
+    return r;
+}
+
+void* lors_str_from_i64(int64_t v) {
+    char buf[32];
+    int n = snprintf(buf, sizeof buf, "%lld", (long long)v);
+    return lors_str_new(buf, n);
+}
+
+void* lors_str_from_f64(double v) {
+    char buf[512];
+    int n = snprintf(buf, sizeof buf, "%f", v);
+    return lors_str_new(buf, n);
+}
+
+void* lors_str_from_char(int64_t c) {
+    char ch = (char)c;
+    return lors_str_new(&ch, 1);
+}
+
+int64_t lors_str_ascii(const LorsStr* s) { return (int64_t)(signed char)s->data[0]; }
+
+int64_t lors_str_to_i64(const LorsStr* s) {
+    char* end;
+    errno = 0;
+    long long v = strtoll(s->data, &end, 10);
+    if (end == s->data) lors_throw("std::invalid_argument", "stoll");
+    if (errno == ERANGE) lors_throw("std::out_of_range", "stoll");
+    return v;
+}
+
+double lors_str_to_f64(const LorsStr* s) {
+    char* end;
+    errno = 0;
+    double v = strtod(s->data, &end);
+    if (end == s->data) lors_throw("std::invalid_argument", "stod");
+    if (errno == ERANGE) lors_throw("std::out_of_range", "stod");
+    return v;
+}
+
+/* ---- console, files and the system ---- */
+
+void lors_print_str(const LorsStr* s) { fwrite(s->data, 1, (size_t)s->len, stdout); }
+void lors_print_i64(int64_t v) { printf("%lld", (long long)v); }
+void lors_print_f64(double v) { printf("%g", v); }
+void lors_print_char(int64_t c) { putchar((char)c); }
+
+void lors_print_end(void) {
+    /* std::endl flushes, which keeps output ordered with execute_system */
+    putchar('\n');
+    fflush(stdout);
+}
+
+int64_t lors_read_i64(void) {
+    long long v = 0;
+    fflush(stdout);
+    if (scanf("%lld", &v) != 1) v = 0;
+    return v;
+}
+
+double lors_read_f64(void) {
+    double v = 0;
+    fflush(stdout);
+    if (scanf("%lf", &v) != 1) v = 0;
+    return v;
+}
+
+void* lors_read_str(void) {
+    /* Like std::cin >> std::string: one whitespace-delimited word */
+    fflush(stdout);
+    int c = getchar();
+    while (c != EOF && isspace(c)) c = getchar();
+    int64_t len = 0, cap = 16;
+    char* buf = lors_alloc((size_t)cap);
+    while (c != EOF && !isspace(c)) {
+        if (len == cap) {
+            cap *= 2;
+            buf = realloc(buf, (size_t)cap);
+        }
+        buf[len++] = (char)c;
+        c = getchar();
+    }
+    if (c != EOF) ungetc(c, stdin);
+    void* s = lors_str_new(buf, len);
+    free(buf);
+    return s;
+}
+
+int64_t lors_arg_count(void) { return lors_argc; }
+void* lors_arg_value(int64_t i) { return lors_str_new(lors_argv[i], (int64_t)strlen(lors_argv[i])); }
+
+void* lors_env_get(const LorsStr* name) {
+    const char* v = getenv(name->data);
+    return v ? lors_str_new(v, (int64_t)strlen(v)) : str_alloc(0);
+}
+
+int64_t lors_file_exists(const LorsStr* path) {
+    FILE* f = fopen(path->data, "r");
+    if (!f) return 0;
+    fclose(f);
+    return 1;
+}
+
+int64_t lors_file_remove(const LorsStr* path) { return remove(path->data); }
+
+void lors_file_write(const LorsStr* path, const LorsStr* content) {
+    FILE* f = fopen(path->data, "w");
+    if (!f) return;
+    fwrite(content->data, 1, (size_t)content->len, f);
+    fclose(f);
+}
+
+void* lors_file_read(const LorsStr* path) {
+    FILE* f = fopen(path->data, "rb");
+    if (!f) return str_alloc(0);
+    int64_t len = 0, cap = 4096;
+    char* buf = lors_alloc((size_t)cap);
+    size_t n;
+    while ((n = fread(buf + len, 1, (size_t)(cap - len), f)) > 0) {
+        len += (int64_t)n;
+        if (len == cap) {
+            cap *= 2;
+            buf = realloc(buf, (size_t)cap);
+        }
+    }
+    fclose(f);
+    void* s = lors_str_new(buf, len);
+    free(buf);
+    return s;
+}
+
+void lors_system(const LorsStr* cmd) {
+    fflush(stdout);
+    if (system(cmd->data) == -1) return;
+}
+
+void lors_exit(int64_t code) { exit((int)code); }
+
+int64_t lors_is_digit(int64_t c) { return isdigit((unsigned char)c) != 0; }
+int64_t lors_is_alpha(int64_t c) { return isalpha((unsigned char)c) != 0; }
+int64_t lors_is_alnum(int64_t c) { return isalnum((unsigned char)c) != 0; }
+int64_t lors_is_space(int64_t c) { return isspace((unsigned char)c) != 0; }
+int64_t lors_is_upper(int64_t c) { return isupper((unsigned char)c) != 0; }
+int64_t lors_is_lower(int64_t c) { return islower((unsigned char)c) != 0; }
+
+/* ---- sequences ---- */
+
+void* lors_seq_new(int64_t handles, int64_t len) {
+    LorsSeq* s = lors_alloc(sizeof *s);
+    s->header = LORS_SEQ | (handles ? LORS_HANDLES : 0);
+    s->len = len;
+    s->cap = len;
+    s->data = calloc(len ? (size_t)len : 1, 8);
+    return s;
+}
+
+void lors_seq_push(LorsSeq* s, int64_t bits) {
+    if (s->len == s->cap) {
+        s->cap = s->cap ? s->cap * 2 : 4;
+        s->data = realloc(s->data, (size_t)s->cap * 8);
+    }
+    s->data[s->len++] = bits;
+}
+
+/* ---- structures ---- */
+
+void* lors_rec_new(int64_t nfields, const char* mask) {
+    LorsRec* r = lors_alloc(sizeof *r + (size_t)nfields * 8);
+    r->header = LORS_REC;
+    r->nfields = nfields;
+    r->mask = mask;
+    memset(r->slots, 0, (size_t)nfields * 8);
+    return r;
+}
+
+/* ---- catalogs ---- */
+
+static int cat_key_kind(const LorsCat* c) { return (int)((c->header >> 8) & 0xff); }
+static int cat_value_handles(const LorsCat* c) { return (int)((c->header >> 16) & 1); }
+
+void* lors_cat_new(int64_t key_kind, int64_t value_handles) {
+    LorsCat* c = lors_alloc(sizeof *c);
+    c->header = LORS_CAT | (key_kind << 8) | (value_handles ? (int64_t)1 << 16 : 0);
+    c->len = 0;
+    c->used = 0;
+    c->cap = 8;
+    c->entries = calloc(8, sizeof(LorsEntry));
+    return c;
+}
+
+static uint64_t cat_hash(int kind, int64_t key) {
+    if (kind == 2) {
+        const LorsStr* s = (const LorsStr*)(intptr_t)key;
+        uint64_t h = 1469598103934665603ULL;
+        for (int64_t i = 0; i < s->len; ++i) h = (h ^ (unsigned char)s->data[i]) * 1099511628211ULL;
+        return h;
+    }
+    if (kind == 1 && lors_f(key) == 0.0) key = 0; /* 0.0 and -0.0 are the same key */
+    uint64_t x = (uint64_t)key + 0x9e3779b97f4a7c15ULL;
+    x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9ULL;
+    x = (x ^ (x >> 27)) * 0x94d049bb133111ebULL;
+    return x ^ (x >> 31);
+}
+
+static int cat_key_eq(int kind, int64_t a, int64_t b) {
+    if (kind == 2) return lors_str_cmp((const LorsStr*)(intptr_t)a, (const LorsStr*)(intptr_t)b) == 0;
+    if (kind == 1) return lors_f(a) == lors_f(b);
+    return a == b;
+}
+
+/* Index of the key, or -1. Entry states: 0 empty, 1 full, 2 removed. */
+static int64_t cat_find(const LorsCat* c, int64_t key) {
+    int kind = cat_key_kind(c);
+    uint64_t mask = (uint64_t)c->cap - 1;
+    for (uint64_t i = cat_hash(kind, key) & mask;; i = (i + 1) & mask) {
+        const LorsEntry* e = &c->entries[i];
+        if (e->state == 0) return -1;
+        if (e->state == 1 && cat_key_eq(kind, e->key, key)) return (int64_t)i;
+    }
+}
+
+static void cat_insert_new(LorsCat* c, int64_t key, int64_t value) {
+    uint64_t mask = (uint64_t)c->cap - 1;
+    uint64_t i = cat_hash(cat_key_kind(c), key) & mask;
+    while (c->entries[i].state == 1) i = (i + 1) & mask;
+    if (c->entries[i].state == 0) c->used++;
+    c->entries[i].key = key;
+    c->entries[i].value = value;
+    c->entries[i].state = 1;
+    c->len++;
+}
+
+static void cat_grow(LorsCat* c) {
+    LorsEntry* old = c->entries;
+    int64_t old_cap = c->cap;
+    /* Rehash in place when removals, not live entries, filled the table */
+    if (c->len * 2 >= c->cap) c->cap *= 2;
+    c->entries = calloc((size_t)c->cap, sizeof(LorsEntry));
+    c->len = 0;
+    c->used = 0;
+    for (int64_t i = 0; i < old_cap; ++i)
+        if (old[i].state == 1) cat_insert_new(c, old[i].key, old[i].value);
+    free(old);
+}
+
+void lors_cat_put(LorsCat* c, int64_t key, int64_t value) {
+    int64_t i = cat_find(c, key);
+    if (i >= 0) {
+        if (cat_value_handles(c)) lors_free((void*)(intptr_t)c->entries[i].value);
+        c->entries[i].value = value;
+        return;
+    }
+    if ((c->used + 1) * 2 > c->cap) cat_grow(c);
+    /* The caller keeps its key; series keys are copied */
+    if (cat_key_kind(c) == 2) key = (int64_t)(intptr_t)lors_copy((void*)(intptr_t)key);
+    cat_insert_new(c, key, value);
+}
+
+int64_t* lors_cat_get(LorsCat* c, int64_t key) {
+    int64_t i = cat_find(c, key);
+    if (i < 0) lors_throw("std::out_of_range", "_Map_base::at");
+    return &c->entries[i].value;
+}
+
+int64_t lors_cat_has(const LorsCat* c, int64_t key) { return cat_find(c, key) >= 0; }
+
+int64_t lors_cat_remove(LorsCat* c, int64_t key) {
+    int64_t i = cat_find(c, key);
+    if (i < 0) return 0;
+    if (cat_key_kind(c) == 2) lors_free((void*)(intptr_t)c->entries[i].key);
+    if (cat_value_handles(c)) lors_free((void*)(intptr_t)c->entries[i].value);
+    c->entries[i].state = 2;
+    c->len--;
+    return 1;
+}
+
+int64_t lors_cat_size(const LorsCat* c) { return c->len; }
+
+static int key_cmp_whole(const void* a, const void* b) {
+    int64_t x = *(const int64_t*)a, y = *(const int64_t*)b;
+    return x < y ? -1 : (x > y ? 1 : 0);
+}
+
+static int key_cmp_precise(const void* a, const void* b) {
+    double x = lors_f(*(const int64_t*)a), y = lors_f(*(const int64_t*)b);
+    return x < y ? -1 : (x > y ? 1 : 0);
+}
+
+static int key_cmp_series(const void* a, const void* b) {
+    int64_t c = lors_str_cmp((const LorsStr*)(intptr_t)*(const int64_t*)a, (const LorsStr*)(intptr_t)*(const int64_t*)b);
+    return c < 0 ? -1 : (c > 0 ? 1 : 0);
+}
+
+void* lors_cat_keys(const LorsCat* c) {
+    int kind = cat_key_kind(c);
+    LorsSeq* keys = lors_seq_new(kind == 2, 0);
+    for (int64_t i = 0; i < c->cap; ++i) {
+        if (c->entries[i].state != 1) continue;
+        int64_t key = c->entries[i].key;
+        lors_seq_push(keys, kind == 2 ? (int64_t)(intptr_t)lors_copy((void*)(intptr_t)key) : key);
+    }
+    /* Sorted so iteration order does not depend on the hash layout */
+    qsort(keys->data, (size_t)keys->len, 8,
+          kind == 2 ? key_cmp_series : (kind == 1 ? key_cmp_precise : key_cmp_whole));
+    return keys;
+}
+
+/* ---- matrices ---- */
+
+static LorsMat* mat_alloc(int64_t rows, int64_t cols) {
+    LorsMat* m = lors_alloc(sizeof *m);
+    m->header = LORS_MAT;
+    m->rows = rows;
+    m->cols = cols;
+    m->data = calloc(rows * cols > 0 ? (size_t)(rows * cols) : 1, sizeof(double));
+    return m;
+}
+
+static void mat_fail(const char* what) {
+    fflush(stdout);
+    fprintf(stderr, "Matrix error: %s\n", what);
+    exit(1);
+}
+
+void* lors_mat_zeros(int64_t rows, int64_t cols) { return mat_alloc(rows, cols); }
+
+void* lors_mat_identity(int64_t n) {
+    LorsMat* m = mat_alloc(n, n);
+    for (int64_t i = 0; i < n; ++i) m->data[i * n + i] = 1.0;
+    return m;
+}
+
+#define LORS_TILE 64
+#define LORS_MIN(a, b) ((a) < (b) ? (a) : (b))
+
+void* lors_mat_transpose(const LorsMat* a) {
+    LorsMat* t = mat_alloc(a->cols, a->rows);
+    const double* restrict src = a->data;
+    double* restrict dst = t->data;
+    for (int64_t ii = 0; ii < a->rows; ii += LORS_TILE) {
+        const int64_t i_end = LORS_MIN(ii + LORS_TILE, a->rows);
+        for (int64_t jj = 0; jj < a->cols; jj += LORS_TILE) {
+            const int64_t j_end = LORS_MIN(jj + LORS_TILE, a->cols);
+            for (int64_t i = ii; i < i_end; ++i)
+                for (int64_t j = jj; j < j_end; ++j)
+                    dst[j * a->rows + i] = src[i * a->cols + j];
+        }
+    }
+    return t;
+}
+
+void* lors_mat_matmul(const LorsMat* a, const LorsMat* b) {
+    if (a->cols != b->rows) mat_fail("matmul dimension mismatch");
+    const int64_t n = a->rows, m = a->cols, p = b->cols;
+    LorsMat* c = mat_alloc(n, p);
+    const double* restrict pa = a->data;
+    const double* restrict pb = b->data;
+    double* restrict pc = c->data;
+    for (int64_t ii = 0; ii < n; ii += LORS_TILE) {
+        const int64_t i_end = LORS_MIN(ii + LORS_TILE, n);
+        for (int64_t kk = 0; kk < m; kk += LORS_TILE) {
+            const int64_t k_end = LORS_MIN(kk + LORS_TILE, m);
+            for (int64_t jj = 0; jj < p; jj += LORS_TILE) {
+                const int64_t j_end = LORS_MIN(jj + LORS_TILE, p);
+                for (int64_t i = ii; i < i_end; ++i) {
+                    double* restrict crow = pc + i * p;
+                    for (int64_t k = kk; k < k_end; ++k) {
+                        const double aik = pa[i * m + k];
+                        const double* restrict brow = pb + k * p;
+                        for (int64_t j = jj; j < j_end; ++j) crow[j] += aik * brow[j];
+                    }
+                }
+            }
+        }
+    }
+    return c;
+}
+
+void* lors_mat_solve(const LorsMat* am, const LorsSeq* bs) {
+    /* Gaussian elimination with partial pivoting on private copies */
+    const int64_t n = am->rows;
+    if (am->cols != n || bs->len != n) mat_fail("solve needs a square system");
+    LorsMat* a = lors_copy(am);
+    double* b = lors_alloc((size_t)n * sizeof(double));
+    for (int64_t i = 0; i < n; ++i) b[i] = lors_f(bs->data[i]);
+    for (int64_t k = 0; k < n; ++k) {
+        int64_t pivot = k;
+        for (int64_t i = k + 1; i < n; ++i)
+            if (fabs(a->data[i * n + k]) > fabs(a->data[pivot * n + k])) pivot = i;
+        if (a->data[pivot * n + k] == 0.0) mat_fail("solve on a singular matrix");
+        if (pivot != k) {
+            for (int64_t j = 0; j < n; ++j) {
+                double t = a->data[k * n + j];
+                a->data[k * n + j] = a->data[pivot * n + j];
+                a->data[pivot * n + j] = t;
+            }
+            double t = b[k]; b[k] = b[pivot]; b[pivot] = t;
+        }
+        double* restrict rk = &a->data[k * n];
+        for (int64_t i = k + 1; i < n; ++i) {
+            double* restrict ri = &a->data[i * n];
+            const double f = ri[k] / rk[k];
+            for (int64_t j = k; j < n; ++j) ri[j] -= f * rk[j];
+            b[i] -= f * b[k];
+        }
+    }
+    LorsSeq* x = lors_seq_new(0, n);
+    for (int64_t i = n - 1; i >= 0; --i) {
+        double s = b[i];
+        for (int64_t j = i + 1; j < n; ++j) s -= a->data[i * n + j] * lors_f(x->data[j]);
+        x->data[i] = lors_bits(s / a->data[i * n + i]);
+    }
+    lors_free(a);
+    free(b);
+    return x;
+}
+
+void lors_print_mat(const LorsMat* m) {
+    putchar('[');
+    for (int64_t i = 0; i < m->rows; ++i) {
+        if (i > 0) fputs("; ", stdout);
+        for (int64_t j = 0; j < m->cols; ++j) {
+            if (j > 0) fputs(", ", stdout);
+            printf("%g", m->data[i * m->cols + j]);
+        }
+    }
+    putchar(']');
+}
+
+/* ---- numeric kernels ----
+   Elements travel as raw 64-bit slots; each *_f flag says whether a
+   sequence (or scalar) holds precise rather than whole values. Results
+   use the same accumulation order as the C++ kernels. */
+
+int64_t lors_sum(const LorsSeq* v, int64_t v_f) {
+    const int64_t* restrict p = v->data;
+    const int64_t n = v->len;
+    int64_t i = 0;
+    if (v_f) {
+        double a0 = 0, a1 = 0, a2 = 0, a3 = 0;
+        for (; i + 4 <= n; i += 4) {
+            a0 += lors_f(p[i]); a1 += lors_f(p[i + 1]); a2 += lors_f(p[i + 2]); a3 += lors_f(p[i + 3]);
+        }
+        for (; i < n; ++i) a0 += lors_f(p[i]);
+        return lors_bits((a0 + a1) + (a2 + a3));
+    }
+    uint64_t a0 = 0, a1 = 0, a2 = 0, a3 = 0;
+    for (; i + 4 <= n; i += 4) {
+        a0 += (uint64_t)p[i]; a1 += (uint64_t)p[i + 1]; a2 += (uint64_t)p[i + 2]; a3 += (uint64_t)p[i + 3];
+    }
+    for (; i < n; ++i) a0 += (uint64_t)p[i];
+    return (int64_t)((a0 + a1) + (a2 + a3));
+}
+
+int64_t lors_dot(const LorsSeq* a, int64_t a_f, const LorsSeq* b, int64_t b_f) {
+    const int64_t* restrict pa = a->data;
+    const int64_t* restrict pb = b->data;
+    const int64_t n = LORS_MIN(a->len, b->len);
+    int64_t i = 0;
+    if (a_f || b_f) {
+#define X(k) (a_f ? lors_f(pa[k]) : (double)pa[k]) * (b_f ? lors_f(pb[k]) : (double)pb[k])
+        double a0 = 0, a1 = 0, a2 = 0, a3 = 0;
+        for (; i + 4 <= n; i += 4) {
+            a0 += X(i); a1 += X(i + 1); a2 += X(i + 2); a3 += X(i + 3);
+        }
+        for (; i < n; ++i) a0 += X(i);
+#undef X
+        return lors_bits((a0 + a1) + (a2 + a3));
+    }
+    uint64_t a0 = 0, a1 = 0, a2 = 0, a3 = 0;
+    for (; i + 4 <= n; i += 4) {
+        a0 += (uint64_t)pa[i] * (uint64_t)pb[i]; a1 += (uint64_t)pa[i + 1] * (uint64_t)pb[i + 1];
+        a2 += (uint64_t)pa[i + 2] * (uint64_t)pb[i + 2]; a3 += (uint64_t)pa[i + 3] * (uint64_t)pb[i + 3];
+    }
+    for (; i < n; ++i) a0 += (uint64_t)pa[i] * (uint64_t)pb[i];
+    return (int64_t)((a0 + a1) + (a2 + a3));
+}
+
+void lors_scale(LorsSeq* v, int64_t v_f, int64_t factor, int64_t factor_f) {
+    int64_t* restrict p = v->data;
+    const int64_t n = v->len;
+    if (v_f) {
+        const double f = factor_f ? lors_f(factor) : (double)factor;
+        for (int64_t i = 0; i < n; ++i) p[i] = lors_bits(lors_f(p[i]) * f);
+    } else if (factor_f) {
+        const double f = lors_f(factor);
+        for (int64_t i = 0; i < n; ++i) p[i] = (int64_t)((double)p[i] * f);
+    } else {
+        for (int64_t i = 0; i < n; ++i) p[i] = (int64_t)((uint64_t)p[i] * (uint64_t)factor);
+    }
+}
+
+void lors_axpy(LorsSeq* y, int64_t y_f, int64_t a, int64_t a_f, const LorsSeq* x, int64_t x_f) {
+    if (y == x) {
+        /* y += a * y */
+        lors_scale(y, y_f, a_f ? lors_bits(1 + lors_f(a)) : a + 1, a_f);
+        return;
+    }
+    int64_t* restrict py = y->data;
+    const int64_t* restrict px = x->data;
+    const int64_t n = LORS_MIN(y->len, x->len);
+    if (!y_f && !a_f && !x_f) {
+        for (int64_t i = 0; i < n; ++i) py[i] = (int64_t)((uint64_t)py[i] + (uint64_t)a * (uint64_t)px[i]);
+        return;
+    }
+    for (int64_t i = 0; i < n; ++i) {
+        double prod = a_f || x_f ? (a_f ? lors_f(a) : (double)a) * (x_f ? lors_f(px[i]) : (double)px[i])
+                                 : (double)(int64_t)((uint64_t)a * (uint64_t)px[i]);
+        double r = (y_f ? lors_f(py[i]) : (double)py[i]) + prod;
+        py[i] = y_f ? lors_bits(r) : (int64_t)r;
+    }
+}
+
+static void* elementwise(const LorsSeq* a, int64_t a_f, const LorsSeq* b, int64_t b_f, int mul) {
+    const int64_t n = LORS_MIN(a->len, b->len);
+    LorsSeq* out = lors_seq_new(0, n);
+    const int64_t* restrict pa = a->data;
+    const int64_t* restrict pb = b->data;
+    int64_t* restrict po = out->data;
+    if (a_f || b_f) {
+        for (int64_t i = 0; i < n; ++i) {
+            double x = a_f ? lors_f(pa[i]) : (double)pa[i], y = b_f ? lors_f(pb[i]) : (double)pb[i];
+            po[i] = lors_bits(mul ? x * y : x + y);
+        }
+    } else {
+        for (int64_t i = 0; i < n; ++i)
+            po[i] = (int64_t)(mul ? (uint64_t)pa[i] * (uint64_t)pb[i] : (uint64_t)pa[i] + (uint64_t)pb[i]);
+    }
+    return out;
+}
+
+void* lors_elementwise_add(const LorsSeq* a, int64_t a_f, const LorsSeq* b, int64_t b_f) {
+    return elementwise(a, a_f, b, b_f, 0);
+}
+
+void* lors_elementwise_mul(const LorsSeq* a, int64_t a_f, const LorsSeq* b, int64_t b_f) {
+    return elementwise(a, a_f, b, b_f, 1);
+}
+
+static int64_t extreme(const LorsSeq* v, int64_t v_f, int want_max) {
+    if (v->len == 0) return 0;
+    const int64_t* restrict p = v->data;
+    int64_t m = p[0];
+    for (int64_t i = 1; i < v->len; ++i) {
+        int better = v_f ? (want_max ? lors_f(p[i]) > lors_f(m) : lors_f(p[i]) < lors_f(m))
+                         : (want_max ? p[i] > m : p[i] < m);
+        if (better) m = p[i];
+    }
+    return m;
+}
+
+int64_t lors_min_of(const LorsSeq* v, int64_t v_f) { return extreme(v, v_f, 0); }
+int64_t lors_max_of(const LorsSeq* v, int64_t v_f) { return extreme(v, v_f, 1); }
+
+double lors_mean(const LorsSeq* v, int64_t v_f) {
+    if (v->len == 0) return 0.0;
+    int64_t s = lors_sum(v, v_f);
+    return (v_f ? lors_f(s) : (double)s) / (double)v->len;
+}
+
+double lors_variance(const LorsSeq* v, int64_t v_f) {
+    /* Population variance, two-pass for accuracy */
+    if (v->len == 0) return 0.0;
+    const double m = lors_mean(v, v_f);
+    const int64_t* restrict p = v->data;
+    const int64_t n = v->len;
+    double a0 = 0.0, a1 = 0.0;
+    int64_t i = 0;
+    for (; i + 2 <= n; i += 2) {
+        const double d0 = (v_f ? lors_f(p[i]) : (double)p[i]) - m;
+        const double d1 = (v_f ? lors_f(p[i + 1]) : (double)p[i + 1]) - m;
+        a0 += d0 * d0; a1 += d1 * d1;
+    }
+    for (; i < n; ++i) {
+        const double d = (v_f ? lors_f(p[i]) : (double)p[i]) - m;
+        a0 += d * d;
+    }
+    return (a0 + a1) / (double)n;
+}
+
+/* ---- memoised algorithms ---- */
+
+/* A cache from the bytes of an argument list (built with lors_memo_key_*)
+   to the bits of a result, evicting the least recently used entry beyond
+   'capacity' (0: no bound). Handle results are owned by the cache and
+   copied out on a hit. */
+typedef struct LorsMemoEntry {
+    LorsStr* key;
+    int64_t value;
+    uint64_t hash;
+    struct LorsMemoEntry* chain;            /* next in the bucket */
+    struct LorsMemoEntry *newer, *older;    /* recency list */
+} LorsMemoEntry;
+
+typedef struct {
+    int64_t capacity, handles, len, nbuckets, hits, misses;
+    LorsMemoEntry** buckets;
+    LorsMemoEntry *newest, *oldest;
+} LorsMemo;
+
+void* lors_memo_cache(void** slot, int64_t capacity, int64_t handles) {
+    if (!*slot) {
+        LorsMemo* m = calloc(1, sizeof *m);
+        m->capacity = capacity;
+        m->handles = handles;
+        m->nbuckets = 64;
+        m->buckets = calloc((size_t)m->nbuckets, sizeof *m->buckets);
+        *slot = m;
+    }
+    return *slot;
+}
+
+static void memo_key_append(LorsStr* k, const void* p, int64_t n) {
+    if (k->len + n + 1 > k->cap) {
+        k->cap = (k->len + n + 1) * 2;
+        k->data = realloc(k->data, (size_t)k->cap);
+    }
+    memcpy(k->data + k->len, p, (size_t)n);
+    k->len += n;
+}
+
+void lors_memo_key_word(LorsStr* k, int64_t bits) { memo_key_append(k, &bits, 8); }
+
+void lors_memo_key_f64(LorsStr* k, double d) {
+    if (d == 0) d = 0; /* -0.0 and 0.0 are the same key, as with std::hash */
+    memo_key_append(k, &d, 8);
+}
+
+void lors_memo_key_str(LorsStr* k, const LorsStr* s) {
+    memo_key_append(k, &s->len, 8);
+    memo_key_append(k, s->data, s->len);
+}
+
+static uint64_t memo_hash(const LorsStr* k) {
+    uint64_t h = 1469598103934665603ULL;
+    for (int64_t i = 0; i < k->len; ++i) h = (h ^ (unsigned char)k->data[i]) * 1099511628211ULL;
+    return h;
+}
+
+static LorsMemoEntry** memo_slot(LorsMemo* m, const LorsStr* k, uint64_t h) {
+    LorsMemoEntry** p = &m->buckets[h & (uint64_t)(m->nbuckets - 1)];
+    while (*p && !((*p)->hash == h && (*p)->key->len == k->len && memcmp((*p)->key->data, k->data, (size_t)k->len) == 0))
+        p = &(*p)->chain;
+    return p;
+}
+
+static void memo_unlink(LorsMemo* m, LorsMemoEntry* e) {
+    if (e->newer) e->newer->older = e->older; else m->newest = e->older;
+    if (e->older) e->older->newer = e->newer; else m->oldest = e->newer;
+}
+
+static void memo_push(LorsMemo* m, LorsMemoEntry* e) {
+    e->newer = NULL;
+    e->older = m->newest;
+    if (m->newest) m->newest->newer = e; else m->oldest = e;
+    m->newest = e;
+}
+
+int64_t lors_memo_find(LorsMemo* m, const LorsStr* key, int64_t* out) {
+    LorsMemoEntry* e = *memo_slot(m, key, memo_hash(key));
+    if (!e) {
+        ++m->misses;
+        return 0;
+    }
+    ++m->hits;
+    memo_unlink(m, e);
+    memo_push(m, e);
+    *out = m->handles ? (int64_t)(intptr_t)lors_copy((void*)(intptr_t)e->value) : e->value;
+    return 1;
+}
+
+static void memo_grow(LorsMemo* m) {
+    int64_t n = m->nbuckets * 2;
+    LorsMemoEntry** buckets = calloc((size_t)n, sizeof *buckets);
+    for (LorsMemoEntry* e = m->oldest; e; e = e->newer) {
+        LorsMemoEntry** b = &buckets[e->hash & (uint64_t)(n - 1)];
+        e->chain = *b;
+        *b = e;
+    }
+    free(m->buckets);
+    m->buckets = buckets;
+    m->nbuckets = n;
+}
+
+static void memo_evict(LorsMemo* m) {
+    LorsMemoEntry* e = m->oldest;
+    memo_unlink(m, e);
+    LorsMemoEntry** p = &m->buckets[e->hash & (uint64_t)(m->nbuckets - 1)];
+    while (*p != e) p = &(*p)->chain;
+    *p = e->chain;
+    lors_free(e->key);
+    if (m->handles) lors_free((void*)(intptr_t)e->value);
+    free(e);
+    --m->len;
+}
+
+/* Takes ownership of the key, and of the value if it is a handle */
+void lors_memo_put(LorsMemo* m, LorsStr* key, int64_t value) {
+    uint64_t h = memo_hash(key);
+    LorsMemoEntry** p = memo_slot(m, key, h);
+    if (*p) {
+        /* A recursive call stored it meanwhile */
+        lors_free(key);
+        if (m->handles) lors_free((void*)(intptr_t)value);
+        return;
+    }
+    LorsMemoEntry* e = lors_alloc(sizeof *e);
+    e->key = key;
+    e->value = value;
+    e->hash = h;
+    e->chain = NULL;
+    *p = e;
+    memo_push(m, e);
+    if (++m->len > m->capacity && m->capacity) memo_evict(m);
+    if (m->len > m->nbuckets) memo_grow(m);
+}
+
+int64_t lors_memo_hits(const LorsMemo* m) { return m ? m->hits : 0; }
+int64_t lors_memo_misses(const LorsMemo* m) { return m ? m->misses : 0; }
+
+/* ---- ownership ---- */
+
+void lors_free(void* h) {
+    if (!h) return;
+    const int64_t header = *(int64_t*)h;
+    switch (header & 0xff) {
+    case LORS_STR:
+        if (header & LORS_STATIC) return;
+        free(((LorsStr*)h)->data);
+        break;
+    case LORS_SEQ: {
+        LorsSeq* s = h;
+        if (header & LORS_HANDLES)
+            for (int64_t i = 0; i < s->len; ++i) lors_free((void*)(intptr_t)s->data[i]);
+        free(s->data);
+        break;
+    }
+    case LORS_CAT: {
+        LorsCat* c = h;
+        for (int64_t i = 0; i < c->cap; ++i) {
+            if (c->entries[i].state != 1) continue;
+            if (cat_key_kind(c) == 2) lors_free((void*)(intptr_t)c->entries[i].key);
+            if (cat_value_handles(c)) lors_free((void*)(intptr_t)c->entries[i].value);
+        }
+        free(c->entries);
+        break;
+    }
+    case LORS_MAT:
+        free(((LorsMat*)h)->data);
+        break;
+    case LORS_REC: {
+        LorsRec* r = h;
+        for (int64_t i = 0; i < r->nfields; ++i)
+            if (r->mask[i]) lors_free((void*)(intptr_t)r->slots[i]);
+        break;
+    }
+    }
+    free(h);
+}
+
+void* lors_copy(const void* h) {
+    if (!h) return NULL;
+    const int64_t header = *(const int64_t*)h;
+    switch (header & 0xff) {
+    case LORS_STR: {
+        const LorsStr* s = h;
+        return lors_str_new(s->data, s->len);
+    }
+    case LORS_SEQ: {
+        const LorsSeq* s = h;
+        LorsSeq* r = lors_seq_new((header & LORS_HANDLES) != 0, s->len);
+        if (header & LORS_HANDLES)
+            for (int64_t i = 0; i < s->len; ++i) r->data[i] = (int64_t)(intptr_t)lors_copy((void*)(intptr_t)s->data[i]);
+        else
+            memcpy(r->data, s->data, (size_t)s->len * 8);
+        return r;
+    }
+    case LORS_CAT: {
+        const LorsCat* c = h;
+        LorsCat* r = lors_alloc(sizeof *r);
+        *r = *c;
+        r->entries = lors_alloc((size_t)c->cap * sizeof(LorsEntry));
+        memcpy(r->entries, c->entries, (size_t)c->cap * sizeof(LorsEntry));
+        for (int64_t i = 0; i < r->cap; ++i) {
+            if (r->entries[i].state != 1) continue;
+            if (cat_key_kind(c) == 2) r->entries[i].key = (int64_t)(intptr_t)lors_copy((void*)(intptr_t)r->entries[i].key);
+            if (cat_value_handles(c)) r->entries[i].value = (int64_t)(intptr_t)lors_copy((void*)(intptr_t)r->entries[i].value);
+        }
+        return r;
+    }
+    case LORS_MAT: {
+        const LorsMat* m = h;
+        LorsMat* r = mat_alloc(m->rows, m->cols);
+        memcpy(r->data, m->data, (size_t)(m->rows * m->cols) * sizeof(double));
+        return r;
+    }
+    case LORS_REC: {
+        const LorsRec* r = h;
+        LorsRec* c = lors_rec_new(r->nfields, r->mask);
+        for (int64_t i = 0; i < r->nfields; ++i)
+            c->slots[i] = r->mask[i] ? (int64_t)(intptr_t)lors_copy((void*)(intptr_t)r->slots[i]) : r->slots[i];
+        return c;
+    }
+    }
+    return NULL;
+}
+"""
@@ -0,0 +1,96 @@
+from lors.src.ast_nodes import *
+from lors.src.analysis import walk
+
+def falls_through(block: Block) -> bool:
+    """Whether running the block can reach its end without a 'result'."""
+    if not block.statements:
+        return True
+    last = block.statements[-1]
+    if isinstance(last, ReturnStatement):
+        return False
+    if isinstance(last, IfStatement) and last.else_branch is not None:
+        return falls_through(last.then_branch) or falls_through(last.else_branch)
+    return True
+
+class TailCalls:
+    """Turns self tail calls ('result f(...);' inside f) into a loop.
+
+    The body of f becomes the body of 'cycle (true)', and each tail call
+    assigns its arguments to the parameters and continues the loop, so deep
+    recursion runs in constant stack space. Only calls reached through
+    'verify' branches are rewritten: inside another loop the continue would
+    restart that loop instead.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.temporaries = 0
+
+    def eligible(self, func: FunctionDeclaration) -> bool:
+        if func.body is None or func.name == "genesis" or func.memoised:
+            # A memoised algorithm must recurse through its cache
+            return False
+        if falls_through(func.body):
+            # The loop would run the body again instead of leaving
+            return False
+        # A view parameter reassigned each iteration may outlive the series
+        # it was taken from, and a series written by the loop cannot be viewed
+        return not any(isinstance(n, TypeNode) and n.name == "view" for n in walk(func))
+
+    def function(self, func: FunctionDeclaration):
+        if not self.eligible(func):
+            return
+        before = self.count
+        self.block(func, func.body)
+        if self.count > before:
+            loop = WhileStatement(Literal(True, "state"), func.body)
+            loop.file, loop.line = func.file, func.line
+            func.body = Block([loop])
+
+    def block(self, func: FunctionDeclaration, block: Block):
+        statements = []
+        for stmt in block.statements:
+            if isinstance(stmt, IfStatement):
+                self.block(func, stmt.then_branch)
+                if stmt.else_branch is not None:
+                    self.block(func, stmt.else_branch)
+            elif self.is_tail_call(func, stmt):
+                statements.extend(self.jump(func, stmt))
+                continue
+            statements.append(stmt)
+        block.statements = statements
+
+    def is_tail_call(self, func: FunctionDeclaration, stmt: ASTNode) -> bool:
+        return (isinstance(stmt, ReturnStatement) and isinstance(stmt.value, FunctionCall)
+                and stmt.value.name == func.name and len(stmt.value.arguments) == len(func.params))
+
+    def jump(self, func: FunctionDeclaration, stmt: ReturnStatement) -> List[ASTNode]:
+        """The statements replacing 'result f(args);': new parameters, then the next iteration."""
+        changed = [(param, arg) for param, arg in zip(func.params, stmt.value.arguments)
+                   if not (isinstance(arg, Identifier) and arg.name == param.name)]
+        # Arguments are evaluated in order before any parameter changes:
+        # all but the last are kept in temporaries
+        statements = []
+        moves = []
+        for param, arg in changed[:-1]:
+            name = f"lors_tail{self.temporaries}"
+            self.temporaries += 1
+            statements.append(VariableDeclaration(name, param.param_type, arg))
+            moves.append(Assignment(param.name, Identifier(name)))
+        if changed:
+            param, arg = changed[-1]
+            statements.append(Assignment(param.name, arg))
+        statements += moves
+        statements.append(ContinueStatement())
+        for new in statements:
+            new.file, new.line = stmt.file, stmt.line
+        self.count += 1
+        return statements
+
+def loop_tail_calls(program: Program) -> int:
+    """Rewrite self tail calls of every algorithm into loops; returns how many."""
+    tail_calls = TailCalls()
+    for decl in program.declarations:
+        if isinstance(decl, FunctionDeclaration):
+            tail_calls.function(decl)
+    return tail_calls.count
@@ -1,5 +1,6 @@
 from enum import Enum, auto
 from dataclasses import dataclass
+from typing import Optional
 
 class TokenType(Enum):
     # Keywords
@@ -28,6 +29,8 @@ class TokenType(Enum):
     TYPE_SERIES = auto()   # series
     TYPE_STATE = auto()    # state
     TYPE_SEQUENCE = auto() # sequence
+    TYPE_CATALOG = auto()  # catalog
+    TYPE_MATRIX = auto()   # matrix
 
     # Literals
     INTEGER_LITERAL = auto()
@@ -69,3 +72,7 @@ class Token:
     value: str
     line: int
     column: int
+    # Where the token was written, when the lexed text was assembled from
+    # several files (line is then the line in the expanded source)
+    file: Optional[str] = None
+    source_line: int = 0
@@ -0,0 +1,1523 @@
+import os
+import re
+import sys
+import math
+import bisect
+import operator
+from collections import OrderedDict
+from functools import reduce
+from lors.src.ast_nodes import *
+from lors.src.analysis import (assigned_names, global_writes, global_reads, check_for_each, check_parallel_races,
+                               check_dispatch, check_views, pure_algorithms, memoised_algorithms, check_memoised,
+                               memo_target)
+from lors.src.llvm_codegen import ESCAPES
+
+# Opcodes, roughly in order of how often a loop runs them (the dispatch
+# loop tests them in this order). Every instruction takes one operand.
+(LOAD, CONST, STORE, JUMP_IF_FALSE, ADD, LT, JUMP, INDEX, LOAD_GLOBAL, STORE_GLOBAL, SUB, MUL,
+ EQ, NE, LE, GT, GE, DIV, MOD, CALL, RETURN, INTRINSIC, MEMBER, CONVERT, CLONE, POP, STORE_INDEX,
+ STORE_MEMBER, MATRIX_GET, MATRIX_SET, SET_CHAR, LENGTH, NEG, NOT, TO_BOOL, JUMP_IF_FALSE_KEEP,
+ JUMP_IF_TRUE_KEEP, MAKE_RECORD, MAKE_LIST, REVEAL, INQUIRE, MEMO_CALL, MEMO_KEY, MEMO_STORE) = range(44)
+
+OPCODE_NAMES = ["LOAD", "CONST", "STORE", "JUMP_IF_FALSE", "ADD", "LT", "JUMP", "INDEX", "LOAD_GLOBAL",
+                "STORE_GLOBAL", "SUB", "MUL", "EQ", "NE", "LE", "GT", "GE", "DIV", "MOD", "CALL", "RETURN",
+                "INTRINSIC", "MEMBER", "CONVERT", "CLONE", "POP", "STORE_INDEX", "STORE_MEMBER", "MATRIX_GET",
+                "MATRIX_SET", "SET_CHAR", "LENGTH", "NEG", "NOT", "TO_BOOL", "JUMP_IF_FALSE_KEEP",
+                "JUMP_IF_TRUE_KEEP", "MAKE_RECORD", "MAKE_LIST", "REVEAL", "INQUIRE", "MEMO_CALL", "MEMO_KEY",
+                "MEMO_STORE"]
+
+COMPARISONS = {"<": LT, "==": EQ, "!=": NE, "<=": LE, ">": GT, ">=": GE}
+ARITHMETIC = {"+": ADD, "-": SUB, "*": MUL, "/": DIV, "%": MOD}
+
+# CONVERT and INQUIRE operands: the C++ type a value is converted to or read as
+KINDS = {"whole": 1, "precise": 2, "state": 3, "series": 4, "view": 4}
+# Types whose values are immutable here, so a copy is never needed
+SCALARS = {"whole", "precise", "state", "series", "view", "char"}
+
+INT_MIN = -2**63
+INT_MAX = 2**63 - 1
+
+# Deeper than any stack a compiled program survives
+MAX_CALL_DEPTH = 200_000
+
+class LorsRuntimeError(Exception):
+    """A failure the compiled program would crash or abort on."""
+
+class MatrixError(LorsRuntimeError):
+    """Reported as the C++ runtime reports it, without a location."""
+
+class LorsExit(Exception):
+    def __init__(self, status: int):
+        self.status = status
+
+class Char(int):
+    """s[i] on a series: a (signed) char, which reveal prints as a character."""
+    __slots__ = ()
+
+class Layout:
+    """Field names, types and conversions of a structure."""
+
+    def __init__(self, node: StructDeclaration):
+        self.name = node.name
+        self.fields = [f.name for f in node.fields]
+        self.types = {f.name: f.var_type for f in node.fields}
+        self.kinds = {f.name: KINDS.get(f.var_type.name) for f in node.fields}
+
+class Record:
+    __slots__ = ("layout", "fields")
+
+    def __init__(self, layout: Layout, fields: dict):
+        self.layout = layout
+        self.fields = fields
+
+class Matrix:
+    __slots__ = ("rows", "cols", "data")
+
+    def __init__(self, rows: int, cols: int, data: list = None):
+        self.rows = rows
+        self.cols = cols
+        self.data = [0.0] * (rows * cols) if data is None else data
+
+class Function:
+    """One compiled algorithm: flat [opcode, operand, ...] code over numbered local slots."""
+    __slots__ = ("name", "arity", "slots", "code", "lines", "memo")
+
+    def __init__(self, name: str, arity: int):
+        self.name = name
+        self.arity = arity
+        self.slots = 0
+        self.code = []
+        # (code offset, file, line) of each statement, for error messages
+        self.lines = []
+        # The result cache of a memoised algorithm
+        self.memo = None
+
+    def location(self, pc: int) -> str:
+        index = bisect.bisect_right([entry[0] for entry in self.lines], pc) - 1
+        if index < 0:
+            return ""
+        _, path, line = self.lines[index]
+        return f" at {os.path.basename(path)}:{line}" if path else f" at line {line}"
+
+    def disassemble(self, consts: list) -> str:
+        lines = [f"{self.name} ({self.arity} params, {self.slots} slots):"]
+        for pc in range(0, len(self.code), 2):
+            op, arg = self.code[pc], self.code[pc + 1]
+            note = f"  ; {consts[arg]!r}" if op == CONST else ""
+            lines.append(f"  {pc:5}  {OPCODE_NAMES[op]:<18} {arg}{note}")
+        return "\n".join(lines)
+
+class Memo:
+    """Results of a memoised algorithm by argument tuple, least recently used first."""
+    __slots__ = ("entries", "capacity", "hits", "misses")
+
+    def __init__(self, capacity: int):
+        self.entries = OrderedDict()
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: tuple):
+        """(True, a copy of the result) on a hit, (False, None) on a miss."""
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return True, clone(self.entries[key])
+        self.misses += 1
+        return False, None
+
+    def store(self, key: tuple, value):
+        # A recursive call may have stored it meanwhile
+        if key not in self.entries:
+            self.entries[key] = clone(value)
+            if self.capacity and len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+class Module:
+    """A compiled program: its algorithms, the constant pool and the global initialiser."""
+
+    def __init__(self):
+        self.functions = []
+        self.consts = []
+        self.layouts = []
+        self.global_count = 0
+        self.init = None
+        self.entry = None
+
+# ---- values ----
+
+def wrap(value: int) -> int:
+    # long long arithmetic wraps around
+    value &= 0xFFFFFFFFFFFFFFFF
+    return value - 2**64 if value > INT_MAX else value
+
+def to_whole(value) -> int:
+    if type(value) is float:
+        # Out-of-range conversions give INT64_MIN on x86
+        if value != value or not -9.3e18 < value < 9.3e18:
+            return INT_MIN
+        return wrap(int(value))
+    return int(value)
+
+CONVERTERS = [None, to_whole, float, bool, None]
+
+def clone(value):
+    """Copy a value the way C++ copies it: sequences, catalogs and records deeply."""
+    t = type(value)
+    if t is list:
+        if value and type(value[0]) in (list, dict, Record, Matrix):
+            return [clone(v) for v in value]
+        return value[:]
+    if t is dict:
+        return {k: clone(v) for k, v in value.items()}
+    if t is Record:
+        return Record(value.layout, {k: clone(v) for k, v in value.fields.items()})
+    if t is Matrix:
+        return Matrix(value.rows, value.cols, value.data[:])
+    return value
+
+def char_code(s: str, index: int) -> int:
+    if 0 <= index < len(s):
+        c = ord(s[index])
+        return c - 256 if c > 127 else c
+    if index == len(s):
+        # std::string keeps a NUL after its last character
+        return 0
+    raise LorsRuntimeError(f"index {index} is outside a series of length {len(s)}")
+
+def show_double(value: float) -> str:
+    # std::ostream's default: six significant digits
+    if value != value:
+        return "-nan" if math.copysign(1.0, value) < 0 else "nan"
+    return "%g" % value
+
+def show(value) -> str:
+    t = type(value)
+    if t is str:
+        return value
+    if t is int:
+        return str(value)
+    if t is float:
+        return show_double(value)
+    if t is bool:
+        return "1" if value else "0"
+    if t is Char:
+        return chr(value & 0xFF)
+    if t is Matrix:
+        rows = []
+        for i in range(value.rows):
+            rows.append(", ".join(show_double(v) for v in value.data[i * value.cols:(i + 1) * value.cols]))
+        return "[" + "; ".join(rows) + "]"
+    raise LorsRuntimeError(f"reveal cannot print a {type_label(value)}")
+
+def type_label(value) -> str:
+    return {list: "sequence", dict: "catalog", Record: "structure"}.get(type(value), type(value).__name__)
+
+def float_divide(a, b) -> float:
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a != a or a == 0:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+def concat(a, b) -> str:
+    # std::string + char appends the character
+    if type(a) is str and type(b) is Char:
+        return a + chr(b & 0xFF)
+    if type(a) is Char and type(b) is str:
+        return chr(a & 0xFF) + b
+    raise LorsRuntimeError(f"cannot add a {type_label(a)} and a {type_label(b)}")
+
+# ---- intrinsics ----
+
+INTEGER_PREFIX = re.compile(r"\s*([+-]?\d+)")
+FLOAT_PREFIX = re.compile(r"\s*([+-]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|inf(?:inity)?|nan))", re.IGNORECASE)
+
+def to_integer(s: str) -> int:
+    match = INTEGER_PREFIX.match(s)
+    if not match:
+        raise LorsRuntimeError(f"to_integer: '{s}' is not a number")
+    value = int(match.group(1))
+    if not INT_MIN <= value <= INT_MAX:
+        raise LorsRuntimeError(f"to_integer: '{s}' is out of range")
+    return value
+
+def to_precise(s: str) -> float:
+    match = FLOAT_PREFIX.match(s)
+    if not match:
+        raise LorsRuntimeError(f"to_precise: '{s}' is not a number")
+    return float(match.group(1))
+
+def to_string(value) -> str:
+    if type(value) is float:
+        # std::to_string formats doubles with %f
+        return "%f" % value
+    return str(int(value))
+
+def substring(s: str, start: int, length: int) -> str:
+    if start < 0 or start >= len(s):
+        return ""
+    return s[start:start + length] if length >= 0 else s[start:]
+
+# The C library's character classes and case mappings in the "C" locale
+UPPER = str.maketrans("abcdefghijklmnopqrstuvwxyz", "ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+def char_class(chars: str):
+    codes = frozenset(ord(c) for c in chars)
+    return lambda c: (c & 0xFF) in codes
+
+DIGITS = "0123456789"
+LETTERS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+def lanes(values: list, count: int) -> list:
+    """Sums of every count-th value, as the runtime's unrolled loops accumulate them."""
+    n = len(values) - len(values) % count
+    sums = [reduce(operator.add, values[lane:n:count], 0) for lane in range(count)]
+    sums[0] = reduce(operator.add, values[n:], sums[0])
+    return sums
+
+def kernel_sum(v: list):
+    a0, a1, a2, a3 = lanes(v, 4)
+    return (a0 + a1) + (a2 + a3)
+
+def kernel_dot(a: list, b: list):
+    return kernel_sum(list(map(operator.mul, a, b)))
+
+def kernel_scale(v: list, factor):
+    for i, x in enumerate(v):
+        v[i] = to_whole(x * factor) if type(x) is int else x * factor
+
+def kernel_axpy(y: list, a, x: list):
+    if y is x:
+        kernel_scale(y, 1 + a)
+        return
+    for i in range(min(len(y), len(x))):
+        value = y[i] + a * x[i]
+        y[i] = to_whole(value) if type(y[i]) is int else value
+
+def kernel_mean(v: list) -> float:
+    return float(kernel_sum(v)) / len(v) if v else 0.0
+
+def kernel_variance(v: list) -> float:
+    if not v:
+        return 0.0
+    m = kernel_mean(v)
+    a0, a1 = lanes([(float(x) - m) * (float(x) - m) for x in v], 2)
+    return (a0 + a1) / len(v)
+
+def matrix_fail(what: str):
+    raise MatrixError(f"Matrix error: {what}")
+
+def matrix_identity(n: int) -> Matrix:
+    m = Matrix(n, n)
+    for i in range(n):
+        m.data[i * n + i] = 1.0
+    return m
+
+def matrix_transpose(a: Matrix) -> Matrix:
+    t = Matrix(a.cols, a.rows)
+    for i in range(a.rows):
+        t.data[i::a.rows] = a.data[i * a.cols:(i + 1) * a.cols]
+    return t
+
+def matrix_multiply(a: Matrix, b: Matrix) -> Matrix:
+    if a.cols != b.rows:
+        matrix_fail("matmul dimension mismatch")
+    n, m, p = a.rows, a.cols, b.cols
+    c = Matrix(n, p)
+    for i in range(n):
+        row = [0.0] * p
+        for k in range(m):
+            aik = a.data[i * m + k]
+            brow = b.data[k * p:(k + 1) * p]
+            row = [r + aik * bv for r, bv in zip(row, brow)]
+        c.data[i * p:(i + 1) * p] = row
+    return c
+
+def matrix_solve(a: Matrix, b: list) -> list:
+    # Gaussian elimination with partial pivoting, as runtime.DENSE_MATRIX does it
+    n = a.rows
+    if a.cols != n or len(b) != n:
+        matrix_fail("solve needs a square system")
+    a = a.data[:]
+    b = [float(x) for x in b]
+    for k in range(n):
+        pivot = k
+        for i in range(k + 1, n):
+            if abs(a[i * n + k]) > abs(a[pivot * n + k]):
+                pivot = i
+        if a[pivot * n + k] == 0.0:
+            matrix_fail("solve on a singular matrix")
+        if pivot != k:
+            a[k * n:(k + 1) * n], a[pivot * n:(pivot + 1) * n] = a[pivot * n:(pivot + 1) * n], a[k * n:(k + 1) * n]
+            b[k], b[pivot] = b[pivot], b[k]
+        for i in range(k + 1, n):
+            f = a[i * n + k] / a[k * n + k]
+            for j in range(k, n):
+                a[i * n + j] -= f * a[k * n + j]
+            b[i] -= f * b[k]
+    x = [0.0] * n
+    for i in range(n - 1, -1, -1):
+        s = b[i]
+        for j in range(i + 1, n):
+            s -= a[i * n + j] * x[j]
+        x[i] = s / a[i * n + i]
+    return x
+
+def math_call(function):
+    def call(*args):
+        try:
+            return function(*(float(a) for a in args))
+        except ValueError:
+            return math.nan
+        except OverflowError:
+            return math.inf
+    return call
+
+def absolute(value):
+    return abs(value) if type(value) is float else abs(int(value))
+
+def catalog_get(catalog: dict, key):
+    try:
+        return catalog[key]
+    except KeyError:
+        raise LorsRuntimeError(f"get: the catalog has no key {show(key)!r}") from None
+
+def catalog_remove(catalog: dict, key) -> int:
+    if key not in catalog:
+        return 0
+    del catalog[key]
+    return 1
+
+def file_read(path: str) -> str:
+    try:
+        with open(path.encode("latin-1"), "rb") as f:
+            return f.read().decode("latin-1")
+    except OSError:
+        return ""
+
+def file_write(path: str, content: str):
+    try:
+        with open(path.encode("latin-1"), "wb") as f:
+            f.write(content.encode("latin-1"))
+    except OSError:
+        pass
+
+def file_remove(path: str) -> int:
+    # remove(3) deletes files and empty directories
+    try:
+        os.remove(path.encode("latin-1"))
+    except IsADirectoryError:
+        try:
+            os.rmdir(path.encode("latin-1"))
+        except OSError:
+            return -1
+    except OSError:
+        return -1
+    return 0
+
+def env_get(name: str) -> str:
+    value = os.environb.get(name.encode("latin-1"))
+    return "" if value is None else value.decode("latin-1")
+
+# name -> (implementation, parameter types, result type). An implementation
+# of None is provided by the VM (it needs its arguments or I/O); a parameter
+# type of None takes any value; a result of None depends on the arguments
+# (see Compiler.type_of).
+WHOLE = TypeNode("whole")
+PRECISE = TypeNode("precise")
+STATE = TypeNode("state")
+SERIES = TypeNode("series")
+MATRIX = TypeNode("matrix")
+VOID = TypeNode("void")
+CHAR = TypeNode("char")
+
+INTRINSICS = {
+    "arg_count": (None, [], WHOLE),
+    "arg_value": (None, [WHOLE], SERIES),
+    "env_get": (env_get, [SERIES], SERIES),
+    "file_exists": (lambda path: os.access(path.encode("latin-1"), os.R_OK), [SERIES], STATE),
+    "file_remove": (file_remove, [SERIES], WHOLE),
+    "file_write": (file_write, [SERIES, SERIES], VOID),
+    "file_read": (file_read, [SERIES], SERIES),
+    "execute_system": (None, [SERIES], VOID),
+    "exit_program": (None, [WHOLE], VOID),
+    "length": (len, [None], WHOLE),
+    "size": (len, [None], WHOLE),
+    "char_at": (char_code, [SERIES, WHOLE], WHOLE),
+    "substring": (substring, [SERIES, WHOLE, WHOLE], SERIES),
+    "is_digit": (char_class(DIGITS), [WHOLE], STATE),
+    "is_alpha": (char_class(LETTERS), [WHOLE], STATE),
+    "is_alnum": (char_class(LETTERS + DIGITS), [WHOLE], STATE),
+    "is_space": (char_class(" \t\n\v\f\r"), [WHOLE], STATE),
+    "is_upper": (char_class(LETTERS[26:]), [WHOLE], STATE),
+    "is_lower": (char_class(LETTERS[:26]), [WHOLE], STATE),
+    "to_upper": (lambda s: s.translate(UPPER), [SERIES], SERIES),
+    "to_lower": (lambda s: s.translate(LOWER), [SERIES], SERIES),
+    "reverse": (lambda s: s[::-1], [SERIES], SERIES),
+    "to_string": (to_string, [None], SERIES),
+    "to_integer": (to_integer, [SERIES], WHOLE),
+    "to_precise": (to_precise, [SERIES], PRECISE),
+    "ascii": (lambda s: char_code(s, 0), [SERIES], WHOLE),
+    "character": (lambda c: chr(c & 0xFF), [WHOLE], SERIES),
+    "append": (lambda seq, item: seq.append(item), [None, None], VOID),
+    "put": (operator.setitem, [None, None, None], VOID),
+    "get": (catalog_get, [None, None], None),
+    "has": (operator.contains, [None, None], STATE),
+    "remove": (catalog_remove, [None, None], WHOLE),
+    "keys": (sorted, [None], None),
+    "sum": (kernel_sum, [None], None),
+    "dot": (kernel_dot, [None, None], None),
+    "scale": (kernel_scale, [None, None], VOID),
+    "axpy": (kernel_axpy, [None, None, None], VOID),
+    "elementwise_add": (lambda a, b: list(map(operator.add, a, b)), [None, None], None),
+    "elementwise_mul": (lambda a, b: list(map(operator.mul, a, b)), [None, None], None),
+    "min_of": (lambda v: min(v) if v else 0, [None], None),
+    "max_of": (lambda v: max(v) if v else 0, [None], None),
+    "mean": (kernel_mean, [None], PRECISE),
+    "variance": (kernel_variance, [None], PRECISE),
+    "zeros": (Matrix, [WHOLE, WHOLE], MATRIX),
+    "identity": (matrix_identity, [WHOLE], MATRIX),
+    "matmul": (matrix_multiply, [MATRIX, MATRIX], MATRIX),
+    "transpose": (matrix_transpose, [MATRIX], MATRIX),
+    "solve": (matrix_solve, [MATRIX, None], TypeNode("sequence", PRECISE)),
+    "rows": (operator.attrgetter("rows"), [MATRIX], WHOLE),
+    "cols": (operator.attrgetter("cols"), [MATRIX], WHOLE),
+    "root": (math_call(math.sqrt), [PRECISE], PRECISE),
+    "power": (math_call(math.pow), [PRECISE, PRECISE], PRECISE),
+    "absolute": (absolute, [None], None),
+    "sine": (math_call(math.sin), [PRECISE], PRECISE),
+    "cosine": (math_call(math.cos), [PRECISE], PRECISE),
+    "tangent": (math_call(math.tan), [PRECISE], PRECISE),
+    "memo_hits": (operator.attrgetter("hits"), [None], WHOLE),
+    "memo_misses": (operator.attrgetter("misses"), [None], WHOLE),
+}
+INTRINSIC_NAMES = list(INTRINSICS)
+INTRINSIC_INDEX = {name: i for i, name in enumerate(INTRINSIC_NAMES)}
+
+def unescape(raw: str) -> str:
+    """A literal as the C++ compiler stores it: escapes resolved, one char per UTF-8 byte."""
+    out = []
+    i = 0
+    while i < len(raw):
+        if raw[i] == "\\" and i + 1 < len(raw) and raw[i + 1] in ESCAPES:
+            out.append(ESCAPES[raw[i + 1]])
+            i += 2
+        else:
+            out.append(raw[i])
+            i += 1
+    return "".join(out).encode("utf-8").decode("latin-1")
+
+# ---- compiler ----
+
+class Compiler:
+    """Lowers the AST to bytecode for the VM.
+
+    Values follow the C++ backend: variables are converted to their declared
+    type when stored, and sequences, catalogs, records and matrices are
+    copied when stored from another variable, element or field. Names are
+    resolved to numbered local slots or global indices here, so the VM never
+    looks a name up.
+    """
+
+    def __init__(self, program: Program):
+        self.program = program
+        self.module = Module()
+        self.const_index = {}
+        self.layouts = {}
+        self.structs = {d.name: d for d in program.declarations if isinstance(d, StructDeclaration)}
+        self.signatures = {}
+        self.function_index = {}
+        self.globals = {}
+        self.writes = None
+        self.reads = None
+        self.pure = None
+        self.memoised = memoised_algorithms(program)
+        # The function being compiled, its scopes (name -> (slot, type)) and
+        # the 'cycle each' items bound to an element (slot -> (sequence slot, index slot))
+        self.function = None
+        self.return_type = None
+        self.scopes = []
+        self.aliases = {}
+
+    def compile(self) -> Module:
+        check_views(self.program)
+        module = self.module
+        for decl in self.program.declarations:
+            if isinstance(decl, StructDeclaration):
+                for field in decl.fields:
+                    self.check_type(field.var_type)
+                layout = Layout(decl)
+                self.layouts[decl.name] = (len(module.layouts), layout)
+                module.layouts.append(layout)
+            elif isinstance(decl, FunctionDeclaration):
+                # A prototype and the definition share the signature
+                self.signatures[decl.name] = decl
+                if decl.body is not None and decl.name not in self.function_index:
+                    self.function_index[decl.name] = len(module.functions)
+                    module.functions.append(Function(decl.name, len(decl.params)))
+                    if decl.memoised:
+                        module.functions[-1].memo = Memo(decl.memo_capacity)
+            elif isinstance(decl, VariableDeclaration):
+                self.check_type(decl.var_type)
+                self.globals[decl.name] = (len(self.globals), decl.var_type)
+        if "genesis" not in self.function_index:
+            raise SyntaxError("The program has no 'genesis' algorithm")
+        module.global_count = len(self.globals)
+
+        # Globals are initialised in declaration order before genesis runs
+        module.init = self.begin(Function("<globals>", 0), VOID)
+        for decl in self.program.declarations:
+            if isinstance(decl, VariableDeclaration):
+                self.mark(decl)
+                self.store_value(decl.initializer, decl.var_type)
+                self.emit(STORE_GLOBAL, self.globals[decl.name][0])
+        self.end()
+
+        for decl in self.program.declarations:
+            if isinstance(decl, FunctionDeclaration) and decl.body is not None:
+                self.compile_function(decl)
+        module.entry = module.functions[self.function_index["genesis"]]
+        return module
+
+    # ---- emission ----
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        self.function.code += (op, arg)
+        return len(self.function.code) - 1
+
+    def here(self) -> int:
+        return len(self.function.code)
+
+    def patch(self, operand: int, target: int = None):
+        self.function.code[operand] = self.here() if target is None else target
+
+    def constant(self, value) -> int:
+        """Index of a value in the constant pool."""
+        # 1, 1.0 and True are equal as dict keys but not as constants
+        key = (type(value), repr(value))
+        if key not in self.const_index:
+            self.const_index[key] = len(self.module.consts)
+            self.module.consts.append(value)
+        return self.const_index[key]
+
+    def const(self, value):
+        self.emit(CONST, self.constant(value))
+
+    def mark(self, node: ASTNode):
+        if node.line:
+            self.function.lines.append((self.here(), node.file, node.line))
+
+    def begin(self, function: Function, return_type: TypeNode) -> Function:
+        self.function = function
+        self.return_type = return_type
+        self.scopes = [{}]
+        self.aliases = {}
+        # Slot of a memoised algorithm's argument tuple
+        self.memo_key = None
+        # Condition addresses of the enclosing 'cycle' loops, for ContinueStatement
+        self.loop_heads = []
+        return function
+
+    def end(self):
+        self.const(None)
+        self.emit(RETURN)
+        self.function = None
+
+    def declare(self, name: str, var_type: TypeNode) -> int:
+        slot = self.function.slots
+        self.function.slots += 1
+        self.scopes[-1][name] = (slot, var_type)
+        return slot
+
+    def lookup(self, name: str):
+        """(slot, type, is_global) of a variable."""
+        for scope in reversed(self.scopes):
+            if name in scope:
+                slot, var_type = scope[name]
+                return slot, var_type, False
+        if name in self.globals:
+            index, var_type = self.globals[name]
+            return index, var_type, True
+        raise SyntaxError(f"Unknown variable '{name}' in '{self.function.name}'")
+
+    def load(self, name: str) -> TypeNode:
+        slot, var_type, is_global = self.lookup(name)
+        self.emit(LOAD_GLOBAL if is_global else LOAD, slot)
+        return var_type
+
+    def store(self, name: str):
+        slot, var_type, is_global = self.lookup(name)
+        self.emit(STORE_GLOBAL if is_global else STORE, slot)
+
+    def check_type(self, t: TypeNode):
+        if t is None:
+            return
+        if t.name not in KINDS and t.name not in ("sequence", "catalog", "matrix", "future", "void") \
+                and t.name not in self.structs:
+            raise SyntaxError(f"Unknown type '{t.name}'")
+        self.check_type(t.subtype)
+        self.check_type(t.value_subtype)
+
+    def writes_by_algorithm(self) -> dict:
+        # Computed on first use: only 'cycle each', 'cycle parallel' and 'dispatch' need it
+        if self.writes is None:
+            self.writes = global_writes(self.program)
+        return self.writes
+
+    # ---- types ----
+
+    def value_type(self, t: Optional[TypeNode]) -> Optional[TypeNode]:
+        # A future holds the value of the finished call
+        while t is not None and t.name == "future":
+            t = t.subtype
+        return t
+
+    def type_of(self, node: ASTNode) -> Optional[TypeNode]:
+        """Static type of an expression where it is known."""
+        if isinstance(node, Literal):
+            return TypeNode(node.value_type)
+        if isinstance(node, Identifier):
+            return self.value_type(self.lookup(node.name)[1])
+        if isinstance(node, ArrayAccess):
+            container = self.value_type(self.lookup(node.array_name)[1])
+            if container.name in ("series", "view"):
+                return CHAR
+            if container.name == "catalog":
+                return container.value_subtype
+            return container.subtype
+        if isinstance(node, MatrixAccess):
+            return PRECISE
+        if isinstance(node, MemberAccess):
+            owner = self.type_of(node.object)
+            if owner is not None and owner.name in self.layouts:
+                return self.layouts[owner.name][1].types.get(node.member_name)
+            return None
+        if isinstance(node, BinaryOp):
+            if node.operator in COMPARISONS or node.operator in ("and", "or", "not"):
+                return STATE
+            left = WHOLE if node.left is None else self.type_of(node.left)
+            right = self.type_of(node.right)
+            if left is None or right is None:
+                return None
+            names = {left.name, right.name}
+            if names & {"series", "view"}:
+                return SERIES
+            if "precise" in names:
+                return PRECISE
+            if names <= {"whole", "state", "char"}:
+                return WHOLE
+            return None
+        if isinstance(node, (FunctionCall, DispatchExpression)):
+            return self.call_type(node)
+        return None
+
+    def call_type(self, node) -> Optional[TypeNode]:
+        name = node.name
+        if name in self.signatures:
+            return self.signatures[name].return_type
+        if name in INTRINSICS and isinstance(node, FunctionCall):
+            result = INTRINSICS[name][2]
+            if result is not None:
+                return result
+            arg = self.type_of(node.arguments[0]) if node.arguments else None
+            if arg is None:
+                return None
+            if name == "get":
+                return arg.value_subtype
+            if name == "keys":
+                return TypeNode("sequence", arg.subtype)
+            if name in ("sum", "min_of", "max_of"):
+                return arg.subtype
+            if name == "absolute":
+                return PRECISE if arg.name == "precise" else WHOLE
+            return None
+        if name == "await":
+            return self.value_type(self.type_of(node.arguments[0])) if node.arguments else None
+        if name in self.layouts:
+            return TypeNode(name)
+        return None
+
+    # ---- algorithms ----
+
+    def compile_function(self, node: FunctionDeclaration):
+        function = self.begin(self.module.functions[self.function_index[node.name]], node.return_type)
+        for param in node.params:
+            self.check_type(param.param_type)
+            self.declare(param.name, param.param_type)
+        self.check_type(node.return_type)
+        if node.memoised:
+            if self.pure is None:
+                self.pure = pure_algorithms(self.program)
+            check_memoised(node, self.pure)
+            # Taken before the body can reassign the parameters
+            self.memo_key = self.declare("<key>", None)
+            self.emit(MEMO_KEY, self.memo_key)
+        self.block(node.body)
+        self.end()
+        return function
+
+    def block(self, node: Block):
+        self.scopes.append({})
+        for stmt in node.statements:
+            self.mark(stmt)
+            self.statement(stmt)
+        self.scopes.pop()
+
+    def statement(self, node: ASTNode):
+        method = getattr(self, f"stmt_{type(node).__name__}", None)
+        if method is None:
+            raise SyntaxError(f"Cannot run a {type(node).__name__}")
+        method(node)
+
+    def stmt_VariableDeclaration(self, node: VariableDeclaration):
+        self.check_type(node.var_type)
+        # The initialiser still sees an outer variable of the same name
+        self.store_value(node.initializer, node.var_type)
+        self.emit(STORE, self.declare(node.name, node.var_type))
+
+    def stmt_Assignment(self, node: Assignment):
+        slot, var_type, is_global = self.lookup(node.name)
+        self.store_value(node.value, var_type)
+        self.emit(STORE_GLOBAL if is_global else STORE, slot)
+        if not is_global and slot in self.aliases:
+            # Writes through a 'cycle each' item update the element
+            sequence, index = self.aliases[slot]
+            self.emit(LOAD, sequence)
+            self.emit(LOAD, index)
+            self.emit(LOAD, slot)
+            self.emit(STORE_INDEX)
+
+    def stmt_ArrayAssignment(self, node: ArrayAssignment):
+        container = self.value_type(self.load(node.name))
+        if container.name in ("series", "view"):
+            # Series are immutable here: build the new one and store it back
+            self.index(node.index, WHOLE)
+            self.store_value(node.value, WHOLE)
+            self.emit(SET_CHAR)
+            self.store(node.name)
+            return
+        if container.name == "catalog":
+            self.index(node.index, container.subtype)
+            self.store_value(node.value, container.value_subtype)
+        else:
+            self.index(node.index, WHOLE)
+            self.store_value(node.value, container.subtype)
+        self.emit(STORE_INDEX)
+
+    def stmt_MatrixAssignment(self, node: MatrixAssignment):
+        self.load(node.name)
+        self.index(node.row, WHOLE)
+        self.index(node.col, WHOLE)
+        self.store_value(node.value, PRECISE)
+        self.emit(MATRIX_SET)
+
+    def stmt_MemberAssignment(self, node: MemberAssignment):
+        self.expression(node.object)
+        owner = self.type_of(node.object)
+        field_type = None
+        if owner is not None and owner.name in self.layouts:
+            field_type = self.layouts[owner.name][1].types.get(node.member_name)
+        # STORE_MEMBER converts to the field's type
+        self.store_value(node.value, field_type, convert=False)
+        self.emit(STORE_MEMBER, self.constant(node.member_name))
+
+    def stmt_ExpressionStatement(self, node: ExpressionStatement):
+        expr = node.expression
+        if isinstance(expr, FunctionCall) and expr.name == "reveal":
+            for arg in expr.arguments:
+                self.expression(arg)
+            self.emit(REVEAL, len(expr.arguments))
+            return
+        self.expression(expr)
+        self.emit(POP)
+
+    def stmt_ReturnStatement(self, node: ReturnStatement):
+        if node.value is None:
+            self.const(None)
+        else:
+            self.store_value(node.value, self.value_type(self.return_type))
+        if self.memo_key is not None:
+            self.emit(MEMO_STORE, self.memo_key)
+        self.emit(RETURN)
+
+    def stmt_IfStatement(self, node: IfStatement):
+        skip = self.condition(node.condition)
+        self.block(node.then_branch)
+        if node.else_branch is not None:
+            done = self.emit(JUMP)
+            self.patch(skip)
+            self.block(node.else_branch)
+            self.patch(done)
+        else:
+            self.patch(skip)
+
+    def stmt_WhileStatement(self, node: WhileStatement):
+        top = self.here()
+        done = self.condition(node.condition)
+        self.loop_heads.append(top)
+        self.block(node.body)
+        self.loop_heads.pop()
+        self.emit(JUMP, top)
+        self.patch(done)
+
+    def stmt_ContinueStatement(self, node: ContinueStatement):
+        self.emit(JUMP, self.loop_heads[-1])
+
+    def stmt_ForEachStatement(self, node: ForEachStatement):
+        check_for_each(node, self.writes_by_algorithm())
+        iterable = self.value_type(self.type_of(node.iterable))
+        if iterable is not None and iterable.name == "catalog":
+            raise SyntaxError("'cycle each' cannot iterate over a catalog; use keys()")
+        characters = isinstance(node.iterable, Literal) or (
+            iterable is not None and iterable.name in ("series", "view"))
+
+        self.scopes.append({})
+        # The sequence is bound by reference, as in a C++ range-for
+        self.expression(node.iterable)
+        sequence = self.declare(" sequence", iterable)
+        self.emit(STORE, sequence)
+        self.emit(LOAD, sequence)
+        self.emit(LENGTH)
+        end = self.declare(" end", WHOLE)
+        self.emit(STORE, end)
+        index = self.declare(node.index_name or " index", WHOLE)
+        self.const(0)
+        self.emit(STORE, index)
+
+        top = self.here()
+        self.emit(LOAD, index)
+        self.emit(LOAD, end)
+        self.emit(LT)
+        done = self.emit(JUMP_IF_FALSE)
+        self.emit(LOAD, sequence)
+        self.emit(LOAD, index)
+        self.emit(INDEX, -1)
+        if characters:
+            # Characters are whole values, as with char_at
+            self.emit(CONVERT, KINDS["whole"])
+            item_type = WHOLE
+        else:
+            item_type = iterable.subtype if iterable is not None and iterable.name == "sequence" else None
+        item = self.declare(node.item_name, item_type)
+        self.emit(STORE, item)
+        if not characters and node.item_name in assigned_names(node.body):
+            self.aliases[item] = (sequence, index)
+        self.block(node.body)
+        self.aliases.pop(item, None)
+        self.emit(LOAD, index)
+        self.const(1)
+        self.emit(ADD)
+        self.emit(STORE, index)
+        self.emit(JUMP, top)
+        self.patch(done)
+        self.scopes.pop()
+
+    def stmt_ParallelForStatement(self, node: ParallelForStatement):
+        # Iterations run one after another, which is one valid OpenMP schedule
+        check_parallel_races(node, self.writes_by_algorithm(), lambda name: self.lookup(name)[1])
+        self.scopes.append({})
+        self.store_value(node.start, WHOLE)
+        var = self.declare(node.var_name, WHOLE)
+        self.emit(STORE, var)
+        self.store_value(node.end, WHOLE)
+        end = self.declare(" end", WHOLE)
+        self.emit(STORE, end)
+        top = self.here()
+        self.emit(LOAD, var)
+        self.emit(LOAD, end)
+        self.emit(LT)
+        done = self.emit(JUMP_IF_FALSE)
+        self.block(node.body)
+        self.emit(LOAD, var)
+        self.const(1)
+        self.emit(ADD)
+        self.emit(STORE, var)
+        self.emit(JUMP, top)
+        self.patch(done)
+        self.scopes.pop()
+
+    def condition(self, node: ASTNode) -> int:
+        """Evaluate a condition and jump if it is false; returns the operand to patch."""
+        self.expression(node)
+        return self.emit(JUMP_IF_FALSE)
+
+    # ---- expressions ----
+
+    def store_value(self, node: Optional[ASTNode], target: Optional[TypeNode], convert: bool = True):
+        """Push a value about to be stored in a variable, element, field or parameter of type target."""
+        target = self.value_type(target)
+        if node is None:
+            self.default(target)
+            return
+        if convert and target is not None and target.name in KINDS and isinstance(node, Literal) \
+                and node.value_type != "series" and target.name != "series":
+            # Converted here rather than at run time
+            self.const(CONVERTERS[KINDS[target.name]](node.value))
+            return
+        self.expression(node, target)
+        source = self.type_of(node)
+        if convert and target is not None and KINDS.get(target.name, 4) != 4 and (
+                source is None or source.name != target.name):
+            self.emit(CONVERT, KINDS[target.name])
+        if self.is_place(node) and (source is None or source.name not in SCALARS):
+            self.emit(CLONE)
+
+    def is_place(self, node: ASTNode) -> bool:
+        """Whether an expression refers to storage that a copy must not share."""
+        if isinstance(node, FunctionCall):
+            # get returns the element itself, await the future's value
+            return node.name in ("get", "await") and node.name not in self.signatures
+        return isinstance(node, (Identifier, ArrayAccess, MemberAccess))
+
+    def default(self, t: Optional[TypeNode]):
+        """Push the value of a variable declared without an initialiser."""
+        if t is None:
+            raise SyntaxError("A variable needs a type")
+        if t.name in ("whole", "state"):
+            self.const(CONVERTERS[KINDS[t.name]](0))
+        elif t.name == "precise":
+            self.const(0.0)
+        elif t.name in ("series", "view"):
+            self.const("")
+        elif t.name == "sequence":
+            self.emit(MAKE_LIST, 0)
+        elif t.name == "catalog":
+            self.const({})
+            self.emit(CLONE)
+        elif t.name == "matrix":
+            self.const(Matrix(0, 0))
+            self.emit(CLONE)
+        elif t.name in self.layouts:
+            for field in self.structs[t.name].fields:
+                self.store_value(field.initializer, field.var_type)
+            self.emit(MAKE_RECORD, self.layouts[t.name][0])
+        else:
+            raise SyntaxError(f"Cannot create a value of type '{t.name}'")
+
+    def static_default(self, t: Optional[TypeNode]):
+        """The value catalog[key] inserts for a missing key."""
+        if t is None:
+            return None
+        if t.name in ("whole", "state"):
+            return CONVERTERS[KINDS[t.name]](0)
+        if t.name == "precise":
+            return 0.0
+        if t.name in ("series", "view"):
+            return ""
+        if t.name == "sequence":
+            return []
+        if t.name == "catalog":
+            return {}
+        if t.name == "matrix":
+            return Matrix(0, 0)
+        if t.name in self.layouts:
+            layout = self.layouts[t.name][1]
+            return Record(layout, {name: self.static_default(layout.types[name]) for name in layout.fields})
+        return None
+
+    def index(self, node: ASTNode, key_type: Optional[TypeNode]):
+        self.store_value(node, key_type)
+
+    def expression(self, node: ASTNode, expected: Optional[TypeNode] = None):
+        method = getattr(self, f"expr_{type(node).__name__}", None)
+        if method is None:
+            raise SyntaxError(f"Cannot run a {type(node).__name__}")
+        method(node, expected)
+
+    def expr_Literal(self, node: Literal, expected):
+        self.const(unescape(node.value) if node.value_type == "series" else node.value)
+
+    def expr_Identifier(self, node: Identifier, expected):
+        self.load(node.name)
+
+    def expr_ArrayAccess(self, node: ArrayAccess, expected):
+        container = self.value_type(self.load(node.array_name))
+        if container.name == "catalog":
+            self.index(node.index, container.subtype)
+            # operator[] inserts a default value for a missing key
+            self.emit(INDEX, self.constant(self.static_default(container.value_subtype)))
+        else:
+            self.index(node.index, WHOLE)
+            self.emit(INDEX, -1)
+
+    def expr_MatrixAccess(self, node: MatrixAccess, expected):
+        self.load(node.matrix_name)
+        self.index(node.row, WHOLE)
+        self.index(node.col, WHOLE)
+        self.emit(MATRIX_GET)
+
+    def expr_MemberAccess(self, node: MemberAccess, expected):
+        self.expression(node.object)
+        self.emit(MEMBER, self.constant(node.member_name))
+
+    def expr_InquireExpression(self, node: InquireExpression, expected):
+        expected = self.value_type(expected)
+        if expected is None or expected.name not in KINDS:
+            raise SyntaxError("inquire() needs a whole, precise, state or series target")
+        self.emit(INQUIRE, KINDS[expected.name])
+
+    def expr_ArrayLiteral(self, node: ArrayLiteral, expected):
+        expected = self.value_type(expected)
+        element = expected.subtype if expected is not None and expected.name == "sequence" else None
+        for item in node.elements:
+            self.store_value(item, element)
+        self.emit(MAKE_LIST, len(node.elements))
+
+    def expr_BinaryOp(self, node: BinaryOp, expected):
+        op = node.operator
+        if op == "not":
+            self.expression(node.right)
+            self.emit(NOT)
+        elif op == "-" and node.left is None:
+            self.expression(node.right)
+            self.emit(NEG)
+        elif op in ("and", "or"):
+            self.expression(node.left)
+            # The left value decides: leave it (as a state) and skip the right
+            skip = self.emit(JUMP_IF_FALSE_KEEP if op == "and" else JUMP_IF_TRUE_KEEP)
+            self.expression(node.right)
+            self.patch(skip)
+            self.emit(TO_BOOL)
+        else:
+            self.expression(node.left)
+            self.expression(node.right)
+            opcode = COMPARISONS.get(op, ARITHMETIC.get(op))
+            if opcode is None:
+                raise SyntaxError(f"Unknown operator '{op}'")
+            self.emit(opcode)
+
+    def expr_DispatchExpression(self, node: DispatchExpression, expected):
+        # Same checks as the C++ backend; the call then runs right away
+        if self.reads is None:
+            self.reads = global_reads(self.program)
+        check_dispatch(node, self.signatures, self.writes_by_algorithm(), self.reads)
+        self.call_algorithm(FunctionCall(node.name, node.arguments))
+
+    def expr_FunctionCall(self, node: FunctionCall, expected):
+        name = node.name
+        if name == "reveal":
+            raise SyntaxError("reveal() has no value")
+        if name in self.signatures:
+            # An algorithm takes precedence over an intrinsic of the same name
+            self.call_algorithm(node)
+        elif name == "await":
+            self.check_arity(node, 1)
+            self.expression(node.arguments[0])
+        elif name in ("memo_hits", "memo_misses"):
+            target = memo_target(node, self.memoised)
+            self.const(self.module.functions[self.function_index[target]].memo)
+            self.emit(INTRINSIC, INTRINSIC_INDEX[name])
+        elif name in INTRINSICS:
+            self.intrinsic(node)
+        elif name in self.layouts:
+            index, layout = self.layouts[name]
+            self.check_arity(node, len(layout.fields))
+            for arg, field in zip(node.arguments, layout.fields):
+                # MAKE_RECORD converts to the field types
+                self.store_value(arg, layout.types[field], convert=False)
+            self.emit(MAKE_RECORD, index)
+        else:
+            raise SyntaxError(f"Unknown algorithm '{name}'")
+
+    def check_arity(self, node: FunctionCall, count: int):
+        if len(node.arguments) != count:
+            raise SyntaxError(f"'{node.name}' expects {count} argument(s), got {len(node.arguments)}")
+
+    def call_algorithm(self, node: FunctionCall):
+        decl = self.signatures[node.name]
+        if node.name not in self.function_index:
+            raise SyntaxError(f"Algorithm '{node.name}' is declared but never defined")
+        self.check_arity(node, len(decl.params))
+        for arg, param in zip(node.arguments, decl.params):
+            self.store_value(arg, param.param_type)
+        index = self.function_index[node.name]
+        if self.module.functions[index].memo is not None:
+            self.emit(MEMO_CALL, index)
+        self.emit(CALL, index)
+
+    def intrinsic(self, node: FunctionCall):
+        _, params, _ = INTRINSICS[node.name]
+        self.check_arity(node, len(params))
+        if node.name in ("append", "put"):
+            # The new element takes the container's element types
+            container = self.value_type(self.type_of(node.arguments[0])) or TypeNode("")
+            self.expression(node.arguments[0])
+            self.store_value(node.arguments[1], container.subtype)
+            if node.name == "put":
+                self.store_value(node.arguments[2], container.value_subtype)
+        elif node.name in ("get", "has", "remove"):
+            container = self.value_type(self.type_of(node.arguments[0])) or TypeNode("")
+            self.expression(node.arguments[0])
+            self.store_value(node.arguments[1], container.subtype)
+        else:
+            for arg, param in zip(node.arguments, params):
+                if param is None:
+                    # Mutating intrinsics work on the variable itself
+                    self.expression(arg)
+                else:
+                    self.store_value(arg, param)
+        self.emit(INTRINSIC, INTRINSIC_INDEX[node.name])
+
+def compile_program(program: Program) -> Module:
+    return Compiler(program).compile()
+
+# ---- virtual machine ----
+
+class InputReader:
+    """std::cin's >> on whitespace-separated tokens, read a line at a time."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.line = ""
+        self.pos = 0
+        # After a failed read std::cin reads nothing more
+        self.failed = False
+
+    def skip_space(self) -> bool:
+        while True:
+            while self.pos < len(self.line) and self.line[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.line):
+                return True
+            data = self.stream.readline()
+            if not data:
+                self.failed = True
+                return False
+            self.line = data.decode("latin-1")
+            self.pos = 0
+
+    def read(self, kind: int):
+        if self.failed or not self.skip_space():
+            return "" if kind == 4 else CONVERTERS[kind](0)
+        rest = self.line[self.pos:]
+        if kind == 4:
+            word = rest.split(None, 1)[0]
+            self.pos += len(word)
+            return word
+        match = (INTEGER_PREFIX if kind != 2 else FLOAT_PREFIX).match(rest)
+        if not match or match.group(1).lower().lstrip("+-").startswith(("i", "n")):
+            self.failed = True
+            return CONVERTERS[kind](0)
+        self.pos += match.end()
+        value = int(match.group(1)) if kind != 2 else float(match.group(1))
+        if kind == 3:
+            if value not in (0, 1):
+                self.failed = True
+            return value == 1
+        if kind == 1 and not INT_MIN <= value <= INT_MAX:
+            self.failed = True
+            return INT_MAX if value > 0 else INT_MIN
+        return value
+
+class VM:
+    """Runs a compiled Module: a stack machine over flat bytecode."""
+
+    def __init__(self, module: Module, argv: list, stdout=None, stdin=None):
+        self.module = module
+        self.argv = argv
+        self.out = stdout if stdout is not None else sys.stdout.buffer
+        self.input = InputReader(stdin if stdin is not None else sys.stdin.buffer)
+        self.globals = [None] * module.global_count
+        overrides = {
+            "arg_count": lambda: len(self.argv),
+            "arg_value": self.arg_value,
+            "execute_system": self.execute_system,
+            "exit_program": self.exit_program,
+        }
+        self.intrinsics = [(overrides.get(name) or INTRINSICS[name][0], len(INTRINSICS[name][1]))
+                           for name in INTRINSIC_NAMES]
+
+    def arg_value(self, index: int) -> str:
+        if not 0 <= index < len(self.argv):
+            raise LorsRuntimeError(f"arg_value: there is no argument {index}")
+        return self.argv[index]
+
+    def execute_system(self, command: str):
+        self.out.flush()
+        os.system(command.encode("latin-1"))
+
+    def exit_program(self, status: int):
+        raise LorsExit(status)
+
+    def write(self, text: str):
+        # reveal ends with std::endl, which flushes
+        self.out.write(text.encode("latin-1", "replace"))
+        self.out.flush()
+
+    def run(self) -> int:
+        """Initialise the globals, run genesis; returns the exit status."""
+        try:
+            self.execute(self.module.init)
+            status = self.execute(self.module.entry)
+            return 0 if status is None else to_whole(status) & 0xFF
+        except LorsExit as e:
+            return e.status & 0xFF
+        finally:
+            self.out.flush()
+
+    def execute(self, function: Function):
+        consts = self.module.consts
+        functions = self.module.functions
+        layouts = self.module.layouts
+        globals_ = self.globals
+        intrinsics = self.intrinsics
+        converters = CONVERTERS
+        frames = []
+        code = function.code
+        locals_ = [None] * function.slots
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        try:
+            while True:
+                op = code[pc]
+                arg = code[pc + 1]
+                pc += 2
+                if op == LOAD:
+                    push(locals_[arg])
+                elif op == CONST:
+                    push(consts[arg])
+                elif op == STORE:
+                    locals_[arg] = pop()
+                elif op == JUMP_IF_FALSE:
+                    if not pop():
+                        pc = arg
+                elif op == ADD:
+                    b = pop()
+                    a = stack[-1]
+                    try:
+                        r = a + b
+                    except TypeError:
+                        r = concat(a, b)
+                    if type(r) is int and not INT_MIN <= r <= INT_MAX:
+                        r = wrap(r)
+                    stack[-1] = r
+                elif op == LT:
+                    b = pop()
+                    stack[-1] = stack[-1] < b
+                elif op == JUMP:
+                    pc = arg
+                elif op == INDEX:
+                    i = pop()
+                    c = stack[-1]
+                    t = type(c)
+                    if t is list:
+                        if i < 0:
+                            raise LorsRuntimeError(f"index {i} is outside a sequence of length {len(c)}")
+                        stack[-1] = c[i]
+                    elif t is str:
+                        stack[-1] = Char(char_code(c, i))
+                    else:
+                        if i not in c:
+                            c[i] = clone(consts[arg])
+                        stack[-1] = c[i]
+                elif op == LOAD_GLOBAL:
+                    push(globals_[arg])
+                elif op == STORE_GLOBAL:
+                    globals_[arg] = pop()
+                elif op == SUB:
+                    b = pop()
+                    r = stack[-1] - b
+                    if type(r) is int and not INT_MIN <= r <= INT_MAX:
+                        r = wrap(r)
+                    stack[-1] = r
+                elif op == MUL:
+                    b = pop()
+                    r = stack[-1] * b
+                    if type(r) is int and not INT_MIN <= r <= INT_MAX:
+                        r = wrap(r)
+                    stack[-1] = r
+                elif op == EQ:
+                    b = pop()
+                    stack[-1] = stack[-1] == b
+                elif op == NE:
+                    b = pop()
+                    stack[-1] = stack[-1] != b
+                elif op == LE:
+                    b = pop()
+                    stack[-1] = stack[-1] <= b
+                elif op == GT:
+                    b = pop()
+                    stack[-1] = stack[-1] > b
+                elif op == GE:
+                    b = pop()
+                    stack[-1] = stack[-1] >= b
+                elif op == DIV:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is float or type(b) is float:
+                        stack[-1] = a / b if b else float_divide(a, b)
+                    else:
+                        if not b:
+                            raise LorsRuntimeError("integer division by zero")
+                        q = a // b
+                        # C++ truncates towards zero
+                        if q < 0 and q * b != a:
+                            q += 1
+                        stack[-1] = wrap(q) if q > INT_MAX else q
+                elif op == MOD:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is float or type(b) is float:
+                        stack[-1] = math.fmod(a, b) if b else math.nan
+                    else:
+                        if not b:
+                            raise LorsRuntimeError("integer division by zero")
+                        r = a % b
+                        # The remainder takes the sign of the dividend
+                        if r and (a < 0) != (b < 0):
+                            r -= b
+                        stack[-1] = r
+                elif op == CALL:
+                    callee = functions[arg]
+                    n = callee.arity
+                    if n:
+                        args = stack[-n:]
+                        del stack[-n:]
+                    else:
+                        args = []
+                    if len(frames) >= MAX_CALL_DEPTH:
+                        raise LorsRuntimeError(f"stack overflow calling '{callee.name}'")
+                    frames.append((function, code, pc, locals_, stack))
+                    function = callee
+                    code = callee.code
+                    pc = 0
+                    args.extend([None] * (callee.slots - n))
+                    locals_ = args
+                    stack = []
+                    push = stack.append
+                    pop = stack.pop
+                elif op == RETURN:
+                    value = pop()
+                    if not frames:
+                        return value
+                    function, code, pc, locals_, stack = frames.pop()
+                    push = stack.append
+                    pop = stack.pop
+                    push(value)
+                elif op == INTRINSIC:
+                    fn, n = intrinsics[arg]
+                    if n == 1:
+                        stack[-1] = fn(stack[-1])
+                    elif n == 0:
+                        push(fn())
+                    else:
+                        args = stack[-n:]
+                        del stack[-n:]
+                        push(fn(*args))
+                elif op == MEMBER:
+                    stack[-1] = stack[-1].fields[consts[arg]]
+                elif op == CONVERT:
+                    stack[-1] = converters[arg](stack[-1])
+                elif op == CLONE:
+                    stack[-1] = clone(stack[-1])
+                elif op == POP:
+                    pop()
+                elif op == STORE_INDEX:
+                    value = pop()
+                    i = pop()
+                    c = pop()
+                    if type(c) is list and i < 0:
+                        raise LorsRuntimeError(f"index {i} is outside a sequence of length {len(c)}")
+                    c[i] = value
+                elif op == STORE_MEMBER:
+                    value = pop()
+                    record = pop()
+                    name = consts[arg]
+                    kind = record.layout.kinds[name]
+                    record.fields[name] = converters[kind](value) if kind and kind != 4 else value
+                elif op == MATRIX_GET:
+                    j = pop()
+                    i = pop()
+                    m = stack[-1]
+                    stack[-1] = m.data[i * m.cols + j]
+                elif op == MATRIX_SET:
+                    value = pop()
+                    j = pop()
+                    i = pop()
+                    m = pop()
+                    m.data[i * m.cols + j] = value
+                elif op == SET_CHAR:
+                    value = pop()
+                    i = pop()
+                    s = stack[-1]
+                    if not 0 <= i < len(s):
+                        raise LorsRuntimeError(f"index {i} is outside a series of length {len(s)}")
+                    stack[-1] = s[:i] + chr(value & 0xFF) + s[i + 1:]
+                elif op == LENGTH:
+                    stack[-1] = len(stack[-1])
+                elif op == NEG:
+                    stack[-1] = -stack[-1]
+                elif op == NOT:
+                    stack[-1] = not stack[-1]
+                elif op == TO_BOOL:
+                    stack[-1] = bool(stack[-1])
+                elif op == JUMP_IF_FALSE_KEEP:
+                    if not stack[-1]:
+                        pc = arg
+                    else:
+                        pop()
+                elif op == JUMP_IF_TRUE_KEEP:
+                    if stack[-1]:
+                        pc = arg
+                    else:
+                        pop()
+                elif op == MAKE_RECORD:
+                    layout = layouts[arg]
+                    n = len(layout.fields)
+                    values = stack[len(stack) - n:]
+                    del stack[len(stack) - n:]
+                    fields = {}
+                    for name, value in zip(layout.fields, values):
+                        kind = layout.kinds[name]
+                        fields[name] = converters[kind](value) if kind and kind != 4 else value
+                    push(Record(layout, fields))
+                elif op == MAKE_LIST:
+                    if arg:
+                        items = stack[-arg:]
+                        del stack[-arg:]
+                        push(items)
+                    else:
+                        push([])
+                elif op == REVEAL:
+                    if arg:
+                        values = stack[-arg:]
+                        del stack[-arg:]
+                        self.write("".join(map(show, values)) + "\n")
+                    else:
+                        self.write("\n")
+                elif op == INQUIRE:
+                    # std::cin is tied to std::cout
+                    self.out.flush()
+                    push(self.input.read(arg))
+                elif op == MEMO_CALL:
+                    # On a hit the result replaces the arguments and the CALL that follows is skipped
+                    n = functions[arg].arity
+                    found, value = functions[arg].memo.lookup(tuple(stack[len(stack) - n:]))
+                    if found:
+                        del stack[len(stack) - n:]
+                        push(value)
+                        pc += 2
+                elif op == MEMO_KEY:
+                    locals_[arg] = tuple(locals_[:function.arity])
+                elif op == MEMO_STORE:
+                    function.memo.store(locals_[arg], stack[-1])
+                else:
+                    raise LorsRuntimeError(f"bad opcode {op}")
+        except (LorsExit, KeyboardInterrupt):
+            raise
+        except LorsRuntimeError as e:
+            raise self.located(e, function, pc) from None
+        except IndexError:
+            raise self.located(LorsRuntimeError("index out of range"), function, pc) from None
+        except (KeyError, TypeError, ValueError, AttributeError, OverflowError, RecursionError, MemoryError) as e:
+            raise self.located(LorsRuntimeError(f"{type(e).__name__}: {e}"), function, pc) from None
+
+    def located(self, error: LorsRuntimeError, function: Function, pc: int) -> LorsRuntimeError:
+        if isinstance(error, MatrixError):
+            return error
+        return LorsRuntimeError(f"Runtime error in '{function.name}'{function.location(pc - 2)}: {error.args[0]}")
@@ -0,0 +1,307 @@
+"""Parallel test runner for the Lors test programs.
+
+Every program in lors/examples and lors/tests is compiled with each backend
+and run; backends and tests run concurrently in a pool of workers. Optional
+files next to a program describe how to run it:
+
+  test_x.args      command-line arguments (shell-style quoting)
+  test_x.stdin     text fed to standard input
+  test_x.expected  golden standard output; without it only the exit status counts
+  test_x.error     text of the compile error the program must be rejected with
+  test_x.backends  backends the program is meant for, one per line (default: all)
+  test_x.flags     compiler.py options, one set per line; the program is built and
+                   run once with each set, against the same golden (default: none)
+
+Backends:
+
+  cpp       compiler.py --backend cpp
+  llvm      compiler.py --backend llvm
+  twin      ./twin (self-hosted, via g++)
+  bootstrap ./lors_bootstrap
+  lors_lw   ./lors_lw, then clang (or llc and cc) on its IR
+  vm        compiler.py --run (bytecode VM; compiles and runs in one step)
+
+Compile and run times are appended to a history file; a test that got
+slower than the median of its previous runs by more than --threshold is
+reported. Each program is built and run in its own scratch directory, so
+tests that write files cannot interfere with each other.
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import shutil
+import difflib
+import argparse
+import tempfile
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_DIRS = ["lors/examples", "lors/tests"]
+BACKENDS = ["cpp", "llvm", "twin", "bootstrap", "lors_lw", "vm"]
+NATIVE_BINARIES = {"twin": "twin", "bootstrap": "lors_bootstrap", "lors_lw": "lors_lw"}
+# Keep this many runs in the history file
+HISTORY_RUNS = 20
+
+class TestCase:
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.name = os.path.relpath(self.path, REPO_DIR)
+        base = os.path.splitext(self.path)[0]
+        self.args = shlex.split(read_optional(base + ".args") or "")
+        self.stdin = read_optional(base + ".stdin") or ""
+        self.expected = read_optional(base + ".expected")
+        self.expected_path = base + ".expected"
+        error = read_optional(base + ".error")
+        self.error = error.strip() if error is not None else None
+        backends = read_optional(base + ".backends")
+        self.backends = backends.split() if backends is not None else None
+        flags = read_optional(base + ".flags")
+        self.flag_sets = [line.strip() for line in flags.splitlines()] if flags is not None else [""]
+
+def read_optional(path: str):
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def discover(paths: list) -> list:
+    if not paths:
+        paths = [os.path.join(REPO_DIR, d) for d in TEST_DIRS]
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            sources += sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".lr"))
+        else:
+            sources.append(path)
+    return [TestCase(s) for s in sources]
+
+def run(cmd: list, cwd: str, timeout: float, stdin: str = "") -> tuple:
+    """(exit status, stdout, stderr, seconds); a timeout is status None."""
+    start = time.perf_counter()
+    try:
+        proc = subprocess.run(cmd, cwd=cwd, input=stdin, capture_output=True, text=True,
+                              errors="replace", timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        output = e.stdout.decode(errors="replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+        return None, output, f"timed out after {timeout:g}s", time.perf_counter() - start
+    return proc.returncode, proc.stdout, proc.stderr, time.perf_counter() - start
+
+def compile_commands(backend: str, source: str, flags: list, bin_dir: str) -> list:
+    exe = os.path.splitext(source)[0]
+    if backend == "vm":
+        # Nothing to build: the program is compiled when it is run
+        return []
+    if backend in ("cpp", "llvm"):
+        return [[sys.executable, os.path.join(REPO_DIR, "compiler.py"), "--backend", backend]
+                + flags + [source]]
+    binary = os.path.join(bin_dir, NATIVE_BINARIES[backend])
+    if backend == "twin":
+        return [[binary, source, "-o", exe]]
+    if backend == "bootstrap":
+        return [[binary, source]]
+    # lors_lw writes LLVM IR next to the source
+    ir_file = exe + ".ll"
+    if shutil.which("clang"):
+        return [[binary, source], ["clang", ir_file, "-o", exe, "-lm"]]
+    return [[binary, source], ["llc", "-filetype=obj", "-relocation-model=pic", ir_file, "-o", exe + ".o"],
+            ["cc", exe + ".o", "-o", exe, "-lm"]]
+
+def missing_tool(backend: str, options):
+    if backend in NATIVE_BINARIES:
+        binary = os.path.join(options.bin_dir, NATIVE_BINARIES[backend])
+        if not os.access(binary, os.X_OK):
+            return binary
+    if backend == "lors_lw" and not shutil.which("clang") and not (shutil.which("llc") and shutil.which("cc")):
+        return "clang (or llc and cc)"
+    return None
+
+def run_test(test: TestCase, backend: str, variant: str, options) -> dict:
+    result = {"test": test.name, "backend": backend, "variant": variant, "status": "pass", "detail": ""}
+    flags = shlex.split(options.flags) + shlex.split(variant)
+    workdir = tempfile.mkdtemp(prefix="lors_test_")
+    try:
+        # Incorporated files are looked up next to the program
+        source_dir = os.path.dirname(test.path)
+        for entry in os.listdir(source_dir):
+            if entry.endswith((".lr", ".inc")):
+                os.symlink(os.path.join(source_dir, entry), os.path.join(workdir, entry))
+        source = os.path.join(workdir, os.path.basename(test.path))
+
+        compile_s = 0.0
+        for cmd in compile_commands(backend, source, flags, options.bin_dir):
+            status, out, err, seconds = run(cmd, workdir, options.timeout)
+            compile_s += seconds
+            if status != 0:
+                if test.error is not None:
+                    return check_rejected(result, test, out + err)
+                result.update(status="fail", detail=f"compile: {shlex.join(cmd)}\n{tail(out + err)}")
+                return result
+        result["compile_s"] = compile_s
+        if test.error is not None and backend != "vm":
+            result.update(status="fail", detail=f"compiled, but should be rejected with: {test.error}")
+            return result
+
+        # Relative, so that argv[0] is the same in every scratch directory
+        exe = "./" + os.path.splitext(os.path.basename(source))[0]
+        if backend == "vm":
+            cmd = [sys.executable, os.path.join(REPO_DIR, "compiler.py")] + flags + ["--run", os.path.basename(source)]
+        else:
+            cmd = [exe]
+        status, out, err, seconds = run(cmd + test.args, workdir, options.timeout, test.stdin)
+        result["run_s"] = seconds
+        result["stdout"] = out
+        if test.error is not None:
+            # The VM compiles the program when it is run
+            if status == 0:
+                result.update(status="fail", detail=f"ran, but should be rejected with: {test.error}")
+                return result
+            return check_rejected(result, test, out + err)
+        if status != 0:
+            result.update(status="fail", detail=f"exit status {status}\n{tail(err)}")
+        elif test.expected is not None and out != test.expected:
+            diff = difflib.unified_diff(test.expected.splitlines(), out.splitlines(),
+                                        "expected", "actual", lineterm="")
+            result.update(status="fail", detail=tail("\n".join(diff), 40))
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def check_rejected(result: dict, test: TestCase, output: str) -> dict:
+    if test.error not in output:
+        result.update(status="fail", detail=f"expected the error: {test.error}\n{tail(output)}")
+    return result
+
+def tail(text: str, lines: int = 20) -> str:
+    parts = text.rstrip("\n").split("\n")
+    if len(parts) > lines:
+        parts = [f"... ({len(parts) - lines} lines omitted)"] + parts[-lines:]
+    return "\n".join(parts)
+
+def load_history(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"runs": []}
+
+def label(result: dict) -> str:
+    """How a result is named in reports and in the history file."""
+    variant = f" {result['variant']}" if result["variant"] else ""
+    return f"{result['test']} [{result['backend']}{variant}]"
+
+def slowdowns(results: list, history: dict, threshold: float, window: int) -> list:
+    """Timings slower than the median of the previous runs by more than threshold."""
+    flagged = []
+    for result in results:
+        key = label(result)
+        for metric in ("compile_s", "run_s"):
+            if metric not in result:
+                continue
+            previous = [entry["timings"][key][metric] for entry in history["runs"][-window:]
+                        if metric in entry["timings"].get(key, {})]
+            if not previous:
+                continue
+            baseline = statistics.median(previous)
+            # Ignore noise on steps that take only a few milliseconds
+            if baseline > 0.005 and result[metric] > baseline * (1 + threshold):
+                flagged.append(f"{key} {metric[:-2]}: {baseline:.3f}s -> {result[metric]:.3f}s "
+                               f"(+{(result[metric] / baseline - 1) * 100:.0f}%)")
+    return flagged
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compile and run the Lors test programs with every backend")
+    arg_parser.add_argument("tests", nargs="*", help="programs or directories (default: lors/examples and lors/tests)")
+    arg_parser.add_argument("--backends", default="cpp,llvm",
+                            help=f"comma-separated, from {','.join(BACKENDS)} (default: cpp,llvm)")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                            help="tests compiled and run at once (default: all cores)")
+    arg_parser.add_argument("--flags", default="", help="extra compiler.py options for the cpp and llvm backends")
+    arg_parser.add_argument("--bin-dir", default=REPO_DIR, help="where twin, lors_bootstrap and lors_lw live")
+    arg_parser.add_argument("--timeout", type=float, default=120, help="seconds allowed per compile or run step")
+    arg_parser.add_argument("--history", default=os.path.join(REPO_DIR, "test_history.json"),
+                            help="timing history file (default: test_history.json)")
+    arg_parser.add_argument("--threshold", type=float, default=0.25,
+                            help="report tests slower than their recent median by this much (0.25 = 25%%)")
+    arg_parser.add_argument("--window", type=int, default=5, help="previous runs the median is taken over")
+    arg_parser.add_argument("--fail-on-slowdown", action="store_true", help="exit with an error if a test got slower")
+    arg_parser.add_argument("--update", action="store_true",
+                            help="write the output of the first backend as the .expected file of each test that passes")
+    options = arg_parser.parse_args()
+
+    backends = options.backends.split(",")
+    for backend in backends:
+        if backend not in BACKENDS:
+            arg_parser.error(f"unknown backend '{backend}' (choose from {', '.join(BACKENDS)})")
+    tests = discover(options.tests)
+    if options.update:
+        # Goldens are written from scratch rather than compared
+        for test in tests:
+            test.expected = None
+
+    jobs = []
+    skipped = []
+    for backend in backends:
+        missing = missing_tool(backend, options)
+        for test in tests:
+            if test.backends is not None and backend not in test.backends:
+                continue
+            if missing:
+                skipped.append(f"{test.name} [{backend}]: {missing} not found")
+            else:
+                jobs.extend((test, backend, variant) for variant in test.flag_sets)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, options.jobs)) as pool:
+        futures = [pool.submit(run_test, test, backend, variant, options) for test, backend, variant in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            timing = f"compile {result['compile_s']:.2f}s" if "compile_s" in result else ""
+            if "run_s" in result:
+                timing += f"  run {result['run_s']:.2f}s"
+            print(f"{result['status'].upper():<5} {label(result)}  {timing}", flush=True)
+
+    order = {backend: i for i, backend in enumerate(backends)}
+    results.sort(key=lambda r: (r["test"], order[r["backend"]], r["variant"]))
+    failed = [r for r in results if r["status"] == "fail"]
+    for result in failed:
+        print(f"\n=== {label(result)}\n{result['detail']}")
+    for line in skipped:
+        print(f"skipped {line}")
+
+    if options.update:
+        written = set()
+        for result in results:
+            test = next(t for t in tests if t.name == result["test"])
+            if result["status"] == "pass" and test.error is None and test.name not in written:
+                written.add(test.name)
+                with open(test.expected_path, "w") as f:
+                    f.write(result["stdout"])
+        print(f"\nwrote {len(written)} .expected files")
+
+    history = load_history(options.history)
+    slower = slowdowns(results, history, options.threshold, options.window)
+    history["runs"].append({
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "timings": {label(r): {k: r[k] for k in ("compile_s", "run_s") if k in r}
+                    for r in results},
+    })
+    history["runs"] = history["runs"][-HISTORY_RUNS:]
+    with open(options.history, "w") as f:
+        json.dump(history, f, indent=1)
+
+    if slower:
+        print(f"\n{len(slower)} timings more than {options.threshold * 100:.0f}% slower than their recent median:")
+        for line in slower:
+            print(f"  {line}")
+    passed = len(results) - len(failed)
+    print(f"\n{passed} passed, {len(failed)} failed, {len(skipped)} skipped")
+    sys.exit(1 if failed or (slower and options.fail_on_slowdown) else 0)
+
+if __name__ == "__main__":
+    main()